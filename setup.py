@@ -6,25 +6,38 @@ from distutils.extension import Extension
 from Cython.Distutils import build_ext
 
 # One might have to remove "libraries=["m"]" when building the code on windows
+# The extensions are optional: without them the kernels are compiled with
+# Numba, or run with NumPy, see biosim.kernels. They are compiled without
+# -ffast-math, so that they give the same results as the other backends.
 
 ext_modules = [
     Extension(
         "biosim.compute_fit",
         ["src/biosim/compute_fit.pyx"],
         # libraries=["m"],
-        extra_compile_args=["-ffast-math", "-O3"],
+        extra_compile_args=["-O3"],
+        optional=True,
     ),
     Extension(
         "biosim.weighted_prob",
         ["src/biosim/weighted_prob.pyx"],
         # libraries=["m"],
-        extra_compile_args=["-ffast-math", "-O3"],
+        extra_compile_args=["-O3"],
+        optional=True,
     ),
     Extension(
         "biosim.det_kill",
         ["src/biosim/det_kill.pyx"],
         # libraries=["m"],
-        extra_compile_args=["-ffast-math", "-O3"],
+        extra_compile_args=["-O3"],
+        optional=True,
+    ),
+    Extension(
+        "biosim.hunt",
+        ["src/biosim/hunt.pyx"],
+        # libraries=["m"],
+        extra_compile_args=["-O3"],
+        optional=True,
     ),
 ]
 
@@ -10,27 +10,50 @@ __email__ = "amar@nmbu.no, sebabeck@nmbu.no"
 # To system path. Contact me at amar@nmbu.no, if you have trouble
 # running the cython code on Mac or Windows.
 import math
+import weakref
 
-from numba import jit
 import numpy as np
-import random
-from .compute_fit import calculate_fitness
-from .det_kill import det_kill
+from . import kernels
+from .population import Population
+from .parameters import AnimalParameters, CarnivoreParameters
 
 
 class Animal:
     """
-    Animal class used as a base for Herbivore and Carnivore sub-classes
+    Animal class used as a base for Herbivore and Carnivore sub-classes.
+
+    The attributes of an animal are stored in a row of a
+    :class:`biosim.population.Population`, an instance of Animal is only a
+    lightweight view of that row. Animals created directly are stored in a
+    population shared by all such animals of the class, see
+    :meth:`_standalone_population`, and are moved into the population of a
+    cell when they are inserted into it. The row of an animal created
+    directly is removed when the animal is garbage-collected before it is
+    inserted into a cell.
+
+    All random numbers of a specie are drawn from the generator 'rng'. The
+    species of a map have generators of their own, spawned from the seed of
+    the map, see :meth:`with_parameters`. Animals which are not part of a
+    map share the generator of the class, which is not seeded, so they are
+    not reproducible under the seed of a map or of
+    :class:`biosim.simulation.BioSim`. For reproducible standalone animals,
+    create them from a subclass with a seeded generator, e.g.
+    ``Herbivore.with_parameters(rng=np.random.default_rng(seed))``.
     """
 
-    param = {}
+    __slots__ = ("_population", "_row", "_id", "_commits", "__weakref__")
+
+    param = AnimalParameters()
+    # Not seeded, see the docstring of the class
+    rng = np.random.default_rng()
     allowed_landscape = ["Jungle", "Desert", "Savannah"]
 
     @classmethod
     def update_parameters(cls, new_par_dict):
         """
         Updates the current parameters and also checks that no parameters are
-        negative.
+        negative. The parameters are immutable, so the class gets a new
+        parameter set, see :mod:`biosim.parameters`.
 
         Parameters
         ----------
@@ -39,24 +62,42 @@ class Animal:
                     be updated.
 
         """
-        for par in new_par_dict.keys():
-            if par not in cls.param:
-                raise ValueError(
-                    f"Invalid input: {par} is not a key in "
-                    f"class parameters"
-                )
-            if (
-                new_par_dict[par] <= 0
-                and par == "DeltaPhiMax"
-                and cls.__name__ == "Carnivore"
-            ):
-                raise ValueError(f"{par} must be strictly positive")
-            elif new_par_dict[par] < 0 and par != "DeltaPhiMax":
-                raise ValueError(f"{par} must be positive")
-            elif new_par_dict[par] > 1 and (par == "eta" or par == "p_sick"):
-                raise ValueError(f"{par} must be less or equal to 1")
-
-        cls.param.update(new_par_dict)
+        cls.param = cls.param.replace(new_par_dict)
+
+    @classmethod
+    def with_parameters(cls, new_par_dict=None, rng=None):
+        """
+        Creates a subclass of the specie with a parameter set of its own,
+        starting from the current parameters of the specie. Updating the
+        parameters of the subclass does not change the parameters of the
+        specie, so every simulation can have its own subclass.
+
+        Parameters
+        ----------
+        new_par_dict: dict [default=None]
+                    Parameters which differ from the current parameters of
+                    the specie
+        rng: numpy.random.Generator [default=None]
+                    Random number generator of the subclass, the generator
+                    of the specie is shared if None
+
+        Returns
+        -------
+        class
+            Subclass of the specie with the same name
+
+        """
+        return type(
+            cls.__name__,
+            (cls,),
+            {
+                "__slots__": (),
+                "__module__": cls.__module__,
+                "__qualname__": cls.__qualname__,
+                "param": cls.param.replace(new_par_dict or {}),
+                "rng": cls.rng if rng is None else rng,
+            },
+        )
 
     def __init__(self, weight=None, age=None):
         """
@@ -70,28 +111,211 @@ class Animal:
         weight: float or int [default=none]
             The weight of the animal to be initialised
         """
+        weight, age = self._initial_state(weight, age)
+        population = self._standalone_population()
+        self._bind(population, population.add(0, age, weight)[0])
+        # Nothing refers to the row once the view is gone, unless the animal
+        # has moved into a cell, which already removed the row
+        weakref.finalize(self, population.discard, self._id).atexit = False
+
+    @classmethod
+    def _standalone_population(cls):
+        """
+        Returns the population shared by the animals of the class which are
+        created on their own, outside of a cell. The rows left behind by
+        animals which have moved into a cell are deleted when they are more
+        than the animals still in the population.
+
+        Returns
+        -------
+        Population
+            The population of the standalone animals of the class
+        """
+        population = cls.__dict__.get("_standalone")
+        if population is None:
+            population = Population(cls)
+            cls._standalone = population
+        elif population.size > 2 * len(population) + 64:
+            population.commit()
+        return population
+
+    @classmethod
+    def _initial_state(cls, weight=None, age=None):
+        """
+
+        Checks the initial age and weight of a new animal, and draws the
+        weight from the birth weight distribution if it is not given.
+
+        Parameters
+        ----------
+        weight: float or int [default=none]
+            The weight of the animal to be initialised
+        age: int [default=none]
+            The age of the animal to be initialised
+
+        Returns
+        -------
+        float or int
+            The initial weight
+        int
+            The initial age
 
+        """
         if age is not None and ((age < 0) or (type(age) != int)):
             raise ValueError("Age cannot be lower than 0")
 
-        if age is not None:
-            self._age = age
-        else:
-            self._age = 0
+        if age is None:
+            age = 0
 
         if weight is not None and weight < 0:
             raise ValueError("Weight cannot be lower than 0")
-        elif weight is not None and weight > 0:
-            self._weight = weight
+        elif weight is None or weight == 0:
+            weight = cls._normal_weight()
+
+        return weight, age
+
+    @classmethod
+    def view(cls, population, row):
+        """
+
+        Creates an animal instance referring to an existing row of a
+        population, without adding a new animal.
+
+        Parameters
+        ----------
+        population: Population
+            The population the animal is stored in
+        row: int
+            Row of the animal in the population
+
+        Returns
+        -------
+        class instance
+            Animal class instance acting as a view of the row
+
+        """
+        animal = cls.__new__(cls)
+        animal._bind(population, row)
+        return animal
+
+    def _bind(self, population, row):
+        """
+        Points the view at a row of a population.
+
+        Parameters
+        ----------
+        population: Population
+            The population the animal is stored in
+        row: int
+            Row of the animal in the population
+        """
+        self._population = population
+        self._row = int(row)
+        self._id = int(population.ids[row])
+        self._commits = population.commits
+
+    @property
+    def population(self):
+        """The population the animal is stored in."""
+        return self._population
+
+    @property
+    def row(self):
+        """
+        The current row of the animal in its population. Rows change only
+        when the population is committed, so the row is looked up again
+        using the id of the animal after a commit.
+
+        """
+        population = self._population
+        if self._commits != population.commits:
+            row = self._row
+            if row >= population.size or population.ids[row] != self._id:
+                row = population.find(self._id)
+                if row < 0:
+                    raise ValueError("The animal is no longer alive")
+                self._row = row
+            self._commits = population.commits
+        return self._row
+
+    def relocate(self, population, index):
+        """
+        Moves the animal into a cell of a population, and updates the view
+        to refer to the new row.
+
+        Parameters
+        ----------
+        population: Population
+            The population the animal is moved to
+        index: int
+            Index of the destination cell in the population
+        """
+        if population is self._population:
+            population.move([self.row], index)
         else:
-            self._weight = self._normal_weight()
+            new_row = self._population.transfer([self.row], population, index)
+            self._bind(population, new_row[0])
+
+    def __eq__(self, other):
+        return isinstance(other, Animal) and self._id == other._id
+
+    def __hash__(self):
+        return hash(self._id)
+
+    @property
+    def _age(self):
+        return int(self._population.age[self.row])
+
+    @_age.setter
+    def _age(self, val):
+        self._population.age[self.row] = val
+
+    @property
+    def _weight(self):
+        return float(self._population.weight[self.row])
+
+    @_weight.setter
+    def _weight(self, val):
+        self._population.set_weight([self.row], val)
 
-        self.has_migrated = False
+    @property
+    def _fitness(self):
+        row = self.row
+        if self._population.stale[row]:
+            return None
+        return float(self._population.fitness[row])
+
+    @_fitness.setter
+    def _fitness(self, val):
+        row = self.row
+        self._population.fitness[row] = val
+        self._population.stale[row] = False
+
+    @property
+    def _should_update_fitness(self):
+        return bool(self._population.stale[self.row])
+
+    @_should_update_fitness.setter
+    def _should_update_fitness(self, val):
+        self._population.stale[self.row] = val
 
-        self._should_update_fitness = False
-        self._fitness = None
+    @property
+    def has_migrated(self):
+        """True if the animal has moved to another cell this year."""
+        return bool(self._population.has_migrated[self.row])
 
-        self.is_sick = False
+    @has_migrated.setter
+    def has_migrated(self, val):
+        self._population.has_migrated[self.row] = val
+
+    @property
+    def is_sick(self):
+        """True if the animal got sick the last time it ate."""
+        return bool(self._population.is_sick[self.row])
+
+    @is_sick.setter
+    def is_sick(self, val):
+        self._population.is_sick[self.row] = val
 
     @property
     def age(self):
@@ -181,7 +405,7 @@ class Animal:
 
         Calculates the fitness by using the 'calculate_fitness'
         function which uses the parameters from the class. 'calculate_fitness'
-        is a cythonized function.
+        is a compiled kernel, see :mod:`biosim.kernels`.
 
         .. math::
             \Phi =
@@ -205,17 +429,51 @@ class Animal:
             different sign values :math:`+`, and  :math:`-`
 
         """
-        a_half = cls.param["a_half"]
-        phi_age = cls.param["phi_age"]
-        w_half = cls.param["w_half"]
-        phi_weight = cls.param["phi_weight"]
+        a_half = cls.param.a_half
+        phi_age = cls.param.phi_age
+        w_half = cls.param.w_half
+        phi_weight = cls.param.phi_weight
         if weight == 0:
             return 0
         else:
-            return calculate_fitness(
+            return kernels.calculate_fitness(
                 age, a_half, phi_age, weight, w_half, phi_weight
             )
 
+    @classmethod
+    def _calculate_fitness_array(cls, weight, age):
+        """
+
+        Calculates the fitness of many animals in one pass, using the
+        'calculate_fitness_array' kernel. With the cython and numba
+        backends the result is bit-identical to calling '_calculate_fitness'
+        for each animal.
+
+        Parameters
+        ----------
+        weight: array
+            Weights of the animals
+        age: array
+            Ages of the animals
+
+        Returns
+        -------
+        array
+            The fitness of each animal
+
+        """
+        fitness = np.empty(len(weight))
+        kernels.calculate_fitness_array(
+            np.ascontiguousarray(age, dtype=np.int64),
+            cls.param.a_half,
+            cls.param.phi_age,
+            np.ascontiguousarray(weight, dtype=np.float64),
+            cls.param.w_half,
+            cls.param.phi_weight,
+            fitness,
+        )
+        return fitness
+
     def update_fitness(self):
         """
         Updates the 'self._fitness' variable using '_calculate_fitness'
@@ -244,10 +502,30 @@ class Animal:
             Returns True if Animal is to move, or false if it is not to move
 
         """
-        probability_move = self.fitness * self.param["mu"]
-        return np.random.random() < probability_move
+        probability_move = self._move_probability(self.fitness)
+        return bool(self._population.draws.next() < probability_move)
+
+    @classmethod
+    def _move_probability(cls, fitness):
+        r"""
+
+        Computes the probability to move, :math:`\mu \times \Phi`.
+
+        Parameters
+        ----------
+        fitness: float or array
+            Fitness of one or several animals
+
+        Returns
+        -------
+        float or array
+            The probability to move for each animal
+
+        """
+        return fitness * cls.param.mu
 
-    def compute_move_prob(self, neighbour_cells):
+    @classmethod
+    def compute_move_prob(cls, neighbour_cells):
         """
 
         Computes the probability to move to each neighbouring cell
@@ -270,7 +548,7 @@ class Animal:
         """
         cell_propensity = []
         for cell in neighbour_cells:
-            propensity_cell = self.propensity(cell)
+            propensity_cell = cls.propensity(cell)
             cell_propensity.append(propensity_cell)
 
         total_propensity = sum(cell_propensity)
@@ -284,7 +562,8 @@ class Animal:
             computed_propensities.append(prob)
         return computed_propensities
 
-    def propensity(self, cell):
+    @classmethod
+    def propensity(cls, cell):
         r"""
 
         Computes and returns the propensity to move, the relative abundance is
@@ -311,14 +590,62 @@ class Animal:
 
         """
         cell_name = type(cell).__name__
-        if cell_name not in self.allowed_landscape:
+        if cell_name not in cls.allowed_landscape:
             return 0
 
-        relative_abundance = self.compute_relative_abundance(cell)
-        lambda_specie = self.param["lambda"]
+        relative_abundance = cls.compute_relative_abundance(cell)
+        lambda_specie = cls.param.lambda_
 
         return math.exp(lambda_specie * relative_abundance)
 
+    @classmethod
+    def _relative_abundance(cls, food, amount_same_spec):
+        """
+        Computes the relative abundance from the available food and the
+        amount of animals of the same specie, for one cell or for arrays of
+        cells.
+
+        Parameters
+        ----------
+        food: float or array
+            Food available to the specie in the cell(s)
+        amount_same_spec: int or array
+            Amount of animals of the same specie in the cell(s)
+
+        Returns
+        -------
+        float or array
+            The relative abundance, zero where there is no food
+
+        """
+        return food / ((amount_same_spec + 1) * cls.param.F)
+
+    @classmethod
+    def _propensity_array(cls, food, amount_same_spec, habitable):
+        """
+        Computes the propensity to move into many cells at once, see
+        :meth:`propensity`.
+
+        Parameters
+        ----------
+        food: array
+            Food available to the specie in every cell
+        amount_same_spec: array
+            Amount of animals of the same specie in every cell
+        habitable: array
+            Boolean array, True for the cells the specie can move into
+
+        Returns
+        -------
+        array
+            The propensity to move into every cell
+
+        """
+        relative_abundance = cls._relative_abundance(food, amount_same_spec)
+        return np.where(
+            habitable, np.exp(cls.param.lambda_ * relative_abundance), 0
+        )
+
     @classmethod
     def compute_relative_abundance(cls, cell):
         r"""
@@ -355,7 +682,8 @@ class Animal:
         """
 
         Calculates the probability of death for the animal instance, uses that
-        probability and random.uniform function to return a bool value.
+        probability and a uniform number from the generator 'rng' to return
+        a bool value.
 
         Returns
         -------
@@ -364,20 +692,50 @@ class Animal:
             to die
 
         """
-        death_prob = 0
-        if self.fitness == 0:
+        death_prob = self._death_probability(self.fitness)
+        if death_prob == 1:
             return True
-        elif self.fitness > 0.01:
-            death_prob = self.param["omega"] * (1 - self.fitness)
+        return bool(self._population.draws.next() < death_prob)
 
-        return np.random.random() < death_prob
+    @classmethod
+    def _death_probability(cls, fitness):
+        r"""
+
+        Computes the probability of death given the fitness of one or several
+        animals.
+
+        .. math::
+            p =
+            \begin{cases}
+            1 & \text{if } \Phi = 0\\
+            \omega (1 - \Phi) & \text{if } \Phi > 0.01\\
+            0 & \text{otherwise}
+            \end{cases}
+
+        Parameters
+        ----------
+        fitness: float or array
+            Fitness of the animals
+
+        Returns
+        -------
+        float or array
+            Probability of death for each animal
+
+        """
+        fitness_array = np.ascontiguousarray(
+            np.atleast_1d(fitness), dtype=np.float64
+        )
+        death_prob = np.empty(len(fitness_array))
+        kernels.death_probability(fitness_array, cls.param.omega, death_prob)
+        return death_prob.reshape(np.shape(fitness))
 
     def determine_birth(self, nearby_animals):
         r"""
         Determines whether the animal is to give birth or not using
         the 'compute_prob_birth' function to gain a value. The function then
-        uses random.uniform to choose between True or False with fixed
-        probabilities.
+        uses a uniform number from the generator 'rng' to choose between True
+        or False with fixed probabilities.
 
           Computes the probability of birth for the animal, using the equation
 
@@ -396,16 +754,15 @@ class Animal:
             to give birth.
 
         """
-        gamma = self.param["gamma"]
-        zeta = self.param["zeta"]
-        w_birth = self.param["w_birth"]
-        sigma_birth = self.param["sigma_birth"]
-        xi = self.param["xi"]
+        xi = self.param.xi
 
-        if nearby_animals < 2 or self._weight < zeta * (w_birth + sigma_birth):
+        weight = self._weight
+        if nearby_animals < 2 or weight < self._min_birth_weight():
             return None
-        prob_birth = min(1, gamma * self.fitness * (nearby_animals - 1))
-        if np.random.random() < prob_birth:
+        prob_birth = self._birth_probability(
+            weight, self.fitness, nearby_animals
+        )
+        if self._population.draws.next() < prob_birth:
             child_weight = self._normal_weight()
             if xi * child_weight > self.weight:
                 return None
@@ -415,7 +772,52 @@ class Animal:
             return None
 
     @classmethod
-    def _normal_weight(cls):
+    def _min_birth_weight(cls):
+        r"""
+        Returns the weight an animal must have to be able to give birth,
+        :math:`\zeta (w_{birth} + \sigma_{birth})`.
+
+        Returns
+        -------
+        float
+            The minimum weight for giving birth
+
+        """
+        return cls.param.min_birth_weight
+
+    @classmethod
+    def _birth_probability(cls, weight, fitness, nearby_animals):
+        """
+        Computes the probability of giving birth for one or several animals
+        living in cells with 'nearby_animals' animals of the same specie.
+
+        Parameters
+        ----------
+        weight: float or array
+            Weight of the animals
+        fitness: float or array
+            Fitness of the animals
+        nearby_animals: int or array
+            The amount of animals of the same specie in the cell, either one
+            number for all animals or one for every animal
+
+        Returns
+        -------
+        float or array
+            Probability of birth for each animal, zero for animals which are
+            too light, or if they are alone.
+
+        """
+        prob_birth = np.minimum(
+            1, cls.param.gamma * fitness * (nearby_animals - 1)
+        )
+        no_birth = (weight < cls.param.min_birth_weight) | (
+            nearby_animals < 2
+        )
+        return np.where(no_birth, 0.0, prob_birth)
+
+    @classmethod
+    def _normal_weight(cls, size=None):
         r"""
         Class method which returns the birth weight using a Gaussian
         distribution, where it gets the mean and standard deviation from the
@@ -428,15 +830,20 @@ class Animal:
         Where :math:`w_{birth}` is the mean, and :math:`sigma_{birth}` is
         the standard deviation.
 
+        Parameters
+        ----------
+        size: int [default=None]
+            Number of weights to draw, a single value is returned if None
+
         Returns
         -------
-        start_weight = int or float
+        start_weight = int or float or array
             The birth weight value gotten from the normal distribution.
 
 
         """
-        start_weight = np.random.normal(
-            cls.param["w_birth"], cls.param["sigma_birth"]
+        start_weight = cls.rng.normal(
+            cls.param.w_birth, cls.param.sigma_birth, size
         )
         return start_weight
 
@@ -454,25 +861,52 @@ class Animal:
             The weight of the new-born child.
 
         """
-        xi = self.param["xi"]
+        xi = self.param.xi
         self._weight -= xi * child_weight
         self._should_update_fitness = True
 
     @classmethod
-    def _determine_sick(cls):
+    def _determine_sick(cls, uniform):
         """
 
         Determines if the animal is to become sick, using the 'p_sick'
-        parameter and random.uniform method.
+        parameter and uniform random numbers drawn for the animals.
+
+        Parameters
+        ----------
+        uniform: float or array
+            Uniform random numbers in [0, 1), one for every animal
 
         Returns
         -------
-        bool
+        bool or array
             True or False
 
         """
-        p_sick = cls.param["p_sick"]
-        return np.random.random() < p_sick
+        p_sick = cls.param.p_sick
+        return uniform < p_sick
+
+    @classmethod
+    def _eat_gain(cls, fodder, is_sick):
+        r"""
+        Computes the weight gained by eating, :math:`\beta` times the fodder,
+        reduced by the loss rate for sick animals.
+
+        Parameters
+        ----------
+        fodder: float or array
+            Amount of food eaten
+        is_sick: bool or array
+            Whether the animals are sick
+
+        Returns
+        -------
+        float or array
+            The weight gained
+
+        """
+        gain = cls.param.beta * fodder
+        return np.where(is_sick, gain * cls.param.loss_rate, gain)
 
     def increase_eat_weight(self, fodder):
         """
@@ -487,14 +921,8 @@ class Animal:
 
         """
 
-        self.is_sick = self._determine_sick()
-        beta = self.param["beta"]
-        loss_rate = self.param["loss_rate"]
-
-        if self.is_sick:
-            self._weight += beta * fodder * loss_rate
-        else:
-            self._weight += beta * fodder
+        self.is_sick = self._determine_sick(self._population.draws.next())
+        self._weight += float(self._eat_gain(fodder, self.is_sick))
         self._should_update_fitness = True
 
     def decrease_annual_weight(self):
@@ -504,7 +932,7 @@ class Animal:
         'update_fitness' method.
 
         """
-        eta = self.param["eta"]
+        eta = self.param.eta
         self._weight -= eta * self._weight
         self._should_update_fitness = True
 
@@ -515,26 +943,30 @@ class Herbivore(Animal):
     the attributes and methods from animal class.
     """
 
-    param = {
-        "w_birth": 8.0,
-        "sigma_birth": 1.5,
-        "beta": 0.9,
-        "eta": 0.05,
-        "a_half": 40.0,
-        "phi_age": 0.2,
-        "w_half": 10.0,
-        "phi_weight": 0.1,
-        "mu": 0.25,
-        "lambda": 1.0,
-        "gamma": 0.2,
-        "zeta": 3.5,
-        "xi": 1.2,
-        "omega": 0.4,
-        "F": 10.0,
-        "DeltaPhiMax": 0,
-        "p_sick": 0,
-        "loss_rate": 0.8,
-    }
+    __slots__ = ()
+
+    param = AnimalParameters(
+        {
+            "w_birth": 8.0,
+            "sigma_birth": 1.5,
+            "beta": 0.9,
+            "eta": 0.05,
+            "a_half": 40.0,
+            "phi_age": 0.2,
+            "w_half": 10.0,
+            "phi_weight": 0.1,
+            "mu": 0.25,
+            "lambda": 1.0,
+            "gamma": 0.2,
+            "zeta": 3.5,
+            "xi": 1.2,
+            "omega": 0.4,
+            "F": 10.0,
+            "DeltaPhiMax": 0,
+            "p_sick": 0,
+            "loss_rate": 0.8,
+        }
+    )
 
     def __init__(self, weight=None, age=None):
         """
@@ -550,17 +982,104 @@ class Herbivore(Animal):
         """
         super().__init__(weight, age)
 
+    @classmethod
+    def _portions(cls, fodder, rank):
+        r"""
+        Computes how much each herbivore eats, in closed form. The
+        herbivores of a cell eat one after the other, the fittest first.
+        With :math:`f` fodder in the cell, the first
+        :math:`\lfloor f / F \rfloor` herbivores eat their full appetite
+        :math:`F`, the next one eats what is left, and the others get
+        nothing.
+
+        Parameters
+        ----------
+        fodder: float or array
+            Fodder in the cell of each herbivore before any of them eat
+        rank: int or array
+            Position of each herbivore in the order of eating in its cell,
+            zero for the fittest
+
+        Returns
+        -------
+        array
+            True for the herbivores which eat
+        array
+            Amount of fodder each herbivore eats
+
+        """
+        appetite = cls.param.F
+        fodder = np.asarray(fodder, dtype=float)
+        if appetite > 0:
+            num_full = fodder // appetite
+            remainder = fodder - num_full * appetite
+        else:
+            # Without appetite every herbivore eats nothing, in full
+            num_full = np.full_like(fodder, np.inf)
+            remainder = np.zeros_like(fodder)
+        eats = (rank < num_full) | ((rank == num_full) & (remainder > 0))
+        eats &= fodder > 0
+        portions = np.where(rank < num_full, appetite, remainder)
+        return eats, np.where(eats, portions, 0.0)
+
+    @classmethod
+    def _fodder_left(cls, fodder, num_herbivores):
+        """
+        Computes the fodder left in cells after the herbivores have eaten,
+        see :meth:`_portions`.
+
+        Parameters
+        ----------
+        fodder: float or array
+            Fodder in the cells before the herbivores eat
+        num_herbivores: int or array
+            Number of herbivores in the cells
+
+        Returns
+        -------
+        float or array
+            Fodder left in the cells
+
+        """
+        appetite = cls.param.F
+        fodder = np.asarray(fodder, dtype=float)
+        return np.where(
+            num_herbivores * appetite < fodder,
+            fodder - num_herbivores * appetite,
+            0.0,
+        )
+
     @classmethod
     def compute_relative_abundance(cls, cell):
         animal_name = cls.__name__
-        amount_same_spec = len(cell.animal_classes[animal_name])
-        food_wanting = cls.param["F"]
+        amount_same_spec = cell.num_specie_per_cell(animal_name)
+        food_wanting = cls.param.F
         curr_fod = cell.current_fodder
         if curr_fod == 0:
             return 0
         else:
             return curr_fod / ((amount_same_spec + 1) * food_wanting)
 
+    @classmethod
+    def _available_food(cls, fodder, herbivore_biomass):
+        """
+        Selects the food a Herbivore looks for when migrating, which is the
+        fodder of the cells.
+
+        Parameters
+        ----------
+        fodder: array
+            Current fodder of every cell
+        herbivore_biomass: array
+            Total weight of the Herbivores in every cell
+
+        Returns
+        -------
+        array
+            The food available in every cell
+        """
+        return fodder
+
 
 class Carnivore(Animal):
     """
@@ -568,26 +1087,30 @@ class Carnivore(Animal):
     and specified attributes from Animal class.
     """
 
-    param = {
-        "w_birth": 6.0,
-        "sigma_birth": 1.0,
-        "beta": 0.75,
-        "eta": 0.125,
-        "a_half": 60.0,
-        "phi_age": 0.4,
-        "w_half": 4.0,
-        "phi_weight": 0.4,
-        "mu": 0.4,
-        "lambda": 1.0,
-        "gamma": 0.8,
-        "zeta": 3.5,
-        "xi": 1.1,
-        "omega": 0.9,
-        "F": 50.0,
-        "DeltaPhiMax": 10.0,
-        "p_sick": 0,
-        "loss_rate": 0.8,
-    }
+    __slots__ = ()
+
+    param = CarnivoreParameters(
+        {
+            "w_birth": 6.0,
+            "sigma_birth": 1.0,
+            "beta": 0.75,
+            "eta": 0.125,
+            "a_half": 60.0,
+            "phi_age": 0.4,
+            "w_half": 4.0,
+            "phi_weight": 0.4,
+            "mu": 0.4,
+            "lambda": 1.0,
+            "gamma": 0.8,
+            "zeta": 3.5,
+            "xi": 1.1,
+            "omega": 0.9,
+            "F": 50.0,
+            "DeltaPhiMax": 10.0,
+            "p_sick": 0,
+            "loss_rate": 0.8,
+        }
+    )
 
     def __init__(self, weight=None, age=None):
         """
@@ -665,18 +1188,41 @@ class Carnivore(Animal):
 
         """
 
-        delta_phi_max = self.param["DeltaPhiMax"]
-        return det_kill(self.fitness, min_fit_herb, delta_phi_max)
+        delta_phi_max = self.param.DeltaPhiMax
+        return kernels.det_kill(
+            self.fitness,
+            min_fit_herb,
+            delta_phi_max,
+            self._population.draws.next(),
+        )
 
     @classmethod
     def compute_relative_abundance(cls, cell):
         animal_name = cls.__name__
-        amount_same_spec = len(cell.animal_classes[animal_name])
-        food_wanting = cls.param["F"]
-        curr_food = sum(
-            herbivore.weight for herbivore in cell.animal_classes["Herbivore"]
-        )
+        amount_same_spec = cell.num_specie_per_cell(animal_name)
+        food_wanting = cls.param.F
+        curr_food = cell.specie_weight_per_cell("Herbivore")
         if curr_food == 0:
             return 0
         else:
             return curr_food / ((amount_same_spec + 1) * food_wanting)
+
+    @classmethod
+    def _available_food(cls, fodder, herbivore_biomass):
+        """
+        Selects the food a Carnivore looks for when migrating, which is the
+        weight of the Herbivores in the cells.
+
+        Parameters
+        ----------
+        fodder: array
+            Current fodder of every cell
+        herbivore_biomass: array
+            Total weight of the Herbivores in every cell
+
+        Returns
+        -------
+        array
+            The food available in every cell
+        """
+        return herbivore_biomass
@@ -3,12 +3,10 @@
 __author__ = "Amir Arfan, Sebastian Becker"
 __email__ = "amar@nmbu.no, sebabeck@nmbu.no"
 
-from numba import jit
-from .weighted_prob import weighted_prob
+from . import kernels
 from .animals import Animal, Herbivore, Carnivore
-import math
-import random
-import itertools
+from .population import IdCounter, Population
+from .parameters import LandscapeParameters
 import numpy as np
 
 
@@ -17,22 +15,141 @@ class Cell:
     Cell base class, which refers to a area or a square in a map. From this
     base class all cell types will be based upon, they will in other words
     be subclasses of Cell.
+
+    The animals of a cell are stored in one
+    :class:`biosim.population.Population` per specie. A cell on its own has
+    populations of its own, while the cells of a map share the island wide
+    populations of the map, and only refer to their own rows through the
+    index of the cell.
     """
 
-    param = {}
+    param = LandscapeParameters()
 
     def __init__(self):
         """
         Initialises the cell class
         """
-        self.animal_classes = {"Herbivore": [], "Carnivore": []}
         self.allowed_species = {"Herbivore": Herbivore, "Carnivore": Carnivore}
-        self.current_fodder = 0
+        self._index = 0
+        self._fodder = np.zeros(1)
+        self._populations = None
+        self._view_cache = None
+
+    @property
+    def populations(self):
+        """
+        Dictionary mapping each specie name to the population storing the
+        animals of the cell. Created on first use for cells without a map.
+
+        """
+        if self._populations is None:
+            id_counter = IdCounter()
+            self._populations = {
+                name: Population(specie, id_counter=id_counter)
+                for name, specie in self.allowed_species.items()
+            }
+        return self._populations
+
+    def attach_populations(self, populations, index):
+        """
+
+        Makes the cell use populations shared with other cells, where the
+        cell's animals are the ones with the given cell index.
+
+        Parameters
+        ----------
+        populations: dict
+                    Specie name mapped to the shared population
+        index: int
+            Index of this cell in the shared populations
+
+        """
+        self._populations = populations
+        self._index = index
+        self.allowed_species = {
+            name: population.species
+            for name, population in populations.items()
+        }
+        self._view_cache = None
+
+    def attach_fodder(self, fodder):
+        """
+
+        Makes the cell keep its fodder in an array shared with other cells,
+        at the index of the cell given to :meth:`attach_populations`. The
+        current fodder of the cell must already be stored in the array.
+
+        Parameters
+        ----------
+        fodder: array
+            Fodder of every cell, by index
+
+        """
+        self._fodder = fodder
+
+    @property
+    def current_fodder(self):
+        """
+        Amount of fodder in the cell. Cells of a map keep it in the fodder
+        array of the map, see :meth:`attach_fodder`.
+
+        """
+        return float(self._fodder[self._index])
+
+    @current_fodder.setter
+    def current_fodder(self, value):
+        self._fodder[self._index] = value
+
+    def _members(self, specie):
+        """
+        Returns the rows of the animals of a specie in this cell.
+
+        Parameters
+        ----------
+        specie: str
+            Name of the specie
+
+        Returns
+        -------
+        array
+            Row numbers in the population of the specie
+        """
+        return self.populations[specie].members(self._index)
+
+    def _settle(self):
+        """
+        Commits the changes made to the populations, unless a map is running
+        a batch over all cells.
+
+        """
+        for population in self.populations.values():
+            population.settle()
+
+    @property
+    def animal_classes(self):
+        """
+        Dictionary mapping each specie name to a list of the animals in the
+        cell. The animals are views of rows in the populations, and the lists
+        are kept until the populations change.
+
+        """
+        generation = tuple(
+            population.generation for population in self.populations.values()
+        )
+        if self._view_cache is None or self._view_cache[0] != generation:
+            views = {
+                name: population.views(population.members(self._index))
+                for name, population in self.populations.items()
+            }
+            self._view_cache = generation, views
+        return self._view_cache[1]
 
     @classmethod
     def update_parameters(cls, new_par_dict):
         """
-        Uses the new dictionary to update the current parameters set.
+        Uses the new dictionary to update the current parameters set. The
+        parameters are immutable, so the class gets a new parameter set, see
+        :mod:`biosim.parameters`.
 
         Parameters
         ----------
@@ -40,18 +157,37 @@ class Cell:
                     Dictionary containing new parameter values.
 
         """
-        for par in new_par_dict.keys():
-            if par not in cls.param:
-                raise ValueError(
-                    f"Invalid input: {par} is not a key in "
-                    f"class parameters"
-                )
+        cls.param = cls.param.replace(new_par_dict)
 
-            if new_par_dict[par] < 0:
-                raise ValueError(
-                    f"Invalid input: {par} is of non-positive value"
-                )
-        cls.param.update(new_par_dict)
+    @classmethod
+    def with_parameters(cls, new_par_dict=None):
+        """
+        Creates a subclass of the cell type with a parameter set of its own,
+        starting from the current parameters of the cell type. Updating the
+        parameters of the subclass does not change the parameters of the
+        cell type, so every map can have its own subclass.
+
+        Parameters
+        ----------
+        new_par_dict: dict [default=None]
+                    Parameters which differ from the current parameters of
+                    the cell type
+
+        Returns
+        -------
+        class
+            Subclass of the cell type with the same name
+
+        """
+        return type(
+            cls.__name__,
+            (cls,),
+            {
+                "__module__": cls.__module__,
+                "__qualname__": cls.__qualname__,
+                "param": cls.param.replace(new_par_dict or {}),
+            },
+        )
 
     def mating(self):
         """
@@ -65,26 +201,41 @@ class Cell:
 
 
         """
-        for animal_list in self.animal_classes.values():
-            children_born = [
-                child
-                for child in (
-                    creature.determine_birth(len(animal_list))
-                    for creature in animal_list
-                )
-                if child is not None
-            ]
-            animal_list.extend(children_born)
+        for population in self.populations.values():
+            specie = population.species
+            rows = population.members(self._index)
+            nearby_animals = len(rows)
+            if nearby_animals < 2:
+                continue
+
+            fitness = population.refresh_fitness(rows)
+            prob_birth = specie._birth_probability(
+                population.weight[rows], fitness, nearby_animals
+            )
+            mothers = rows[population.draws.by_rows(rows) < prob_birth]
+
+            child_weight = specie._normal_weight(len(mothers))
+            weight_loss = specie.param.xi * child_weight
+            can_give_birth = weight_loss <= population.weight[mothers]
+            mothers = mothers[can_give_birth]
+            weight_loss = weight_loss[can_give_birth]
+
+            population.set_weight(
+                mothers, population.weight[mothers] - weight_loss
+            )
+            population.add(self._index, 0, child_weight[can_give_birth])
+        self._settle()
 
     def annual_weight_loss(self):
         """
         Makes all animals in the current cell lose their annual weight.
 
         """
-        for animal_classes in itertools.chain.from_iterable(
-            self.animal_classes.values()
-        ):
-            animal_classes.decrease_annual_weight()
+        for population in self.populations.values():
+            rows = population.members(self._index)
+            eta = population.species.param.eta
+            weight = population.weight[rows]
+            population.set_weight(rows, weight - eta * weight)
 
     def eat_herbivore(self):
         r"""
@@ -109,25 +260,56 @@ class Cell:
 
         """
 
+        population = self.populations["Herbivore"]
+        rows = population.members(self._index)
+        fitness = population.refresh_fitness(rows)
+
         # The fittest herbivore is to eat first
-        sorted_herbivores = sorted(
-            self.animal_classes["Herbivore"],
-            key=lambda animal: animal.fitness,
-            reverse=True,
+        sorted_herbivores = rows[np.argsort(-fitness, kind="stable")]
+
+        specie = population.species
+        eats, portions = specie._portions(
+            self.current_fodder, np.arange(len(sorted_herbivores))
+        )
+        self.current_fodder = float(
+            specie._fodder_left(self.current_fodder, len(sorted_herbivores))
+        )
+        eaters = sorted_herbivores[eats]
+        self._feed(
+            population,
+            eaters,
+            portions[eats],
+            population.draws.by_rows(eaters),
         )
 
-        for animals in sorted_herbivores:
-            fodder_eat = animals.param["F"]
+    @staticmethod
+    def _feed(population, rows, fodder, uniform):
+        """
 
-            if self.current_fodder == 0:
-                break
+        Increases the weight of animals which have eaten, deciding whether
+        they got sick from the food. Works like 'increase_eat_weight' in
+        'animals.py' for several animals at once.
 
-            if fodder_eat <= self.current_fodder:
-                animals.increase_eat_weight(fodder_eat)
-                self.current_fodder -= fodder_eat
-            elif 0 < self.current_fodder < fodder_eat:
-                animals.increase_eat_weight(self.current_fodder)
-                self.current_fodder -= self.current_fodder
+        Parameters
+        ----------
+        population: Population
+            The population the animals are stored in
+        rows: array
+            Row numbers of the animals which have eaten
+        fodder: float or array
+            Amount of food eaten by each animal
+        uniform: float or array
+            Uniform random numbers in [0, 1) drawn for the animals
+
+        """
+        specie = population.species
+        is_sick = specie._determine_sick(uniform)
+        population.is_sick[rows] = is_sick
+        population.set_weight(
+            rows,
+            population.weight[rows]
+            + specie._eat_gain(np.asarray(fodder, dtype=float), is_sick),
+        )
 
     def eat_carnivore(self):
         r"""
@@ -140,28 +322,68 @@ class Cell:
         that it has eaten himself full of herbivores, i.e.
         :math:`\sum w_{herb-eaten} \geq F`
 
-
-
-        """
-        if len(self.animal_classes["Herbivore"]) > 0:
-            self.animal_classes["Carnivore"].sort(
-                key=lambda animal: animal.fitness, reverse=True
-            )
-            self.animal_classes["Herbivore"].sort(
-                key=lambda animal: animal.fitness
-            )
-            for car in self.animal_classes["Carnivore"]:
-                remove_herb = set()
-                food_des = car.param["F"]
-                current_food = 0
-                for index, herb in enumerate(self.animal_classes["Herbivore"]):
-                    if food_des <= current_food:
-                        break
-                    if car.determine_kill(herb.fitness):
-                        current_food += herb.weight
-                        car.increase_eat_weight(herb.weight)
-                        remove_herb.add(index)
-                self.remove_multiple_animals("Herbivore", remove_herb)
+        The hunt runs in the compiled 'hunt' kernel, which takes its random
+        numbers from the sequence of the carnivores, see
+        :meth:`biosim.draws.UniformDraws.reserve`.
+
+        """
+        herbivores = self.populations["Herbivore"]
+        carnivores = self.populations["Carnivore"]
+        herb_rows = herbivores.members(self._index)
+        carn_rows = carnivores.members(self._index)
+        if len(herb_rows) > 0 and len(carn_rows) > 0:
+            carn_fitness = carnivores.refresh_fitness(carn_rows)
+            order = np.argsort(-carn_fitness, kind="stable")
+            carn_rows = carn_rows[order]
+            carn_fitness = carn_fitness[order]
+            carn_weight = carnivores.weight[carn_rows]
+            carn_age = carnivores.age[carn_rows]
+            carn_sick = carnivores.is_sick[carn_rows].view(np.uint8)
+
+            herb_fitness = herbivores.refresh_fitness(herb_rows)
+            order = np.argsort(herb_fitness, kind="stable")
+            herb_rows = herb_rows[order]
+            herb_fitness = herb_fitness[order]
+            herb_weight = herbivores.weight[herb_rows]
+            killed = np.zeros(len(herb_rows), dtype=np.uint8)
+
+            param = carnivores.species.param
+            draws = carnivores.draws
+            uniforms, position = draws.reserve(0)
+            state = (0, 0, 0.0, -1)
+            while True:
+                position, *state = kernels.hunt(
+                    carn_fitness,
+                    carn_weight,
+                    carn_age,
+                    carn_sick,
+                    herb_fitness,
+                    herb_weight,
+                    killed,
+                    param.F,
+                    param.DeltaPhiMax,
+                    param.beta,
+                    param.loss_rate,
+                    param.p_sick,
+                    param.a_half,
+                    param.phi_age,
+                    param.w_half,
+                    param.phi_weight,
+                    uniforms,
+                    position,
+                    *state,
+                )
+                draws.seek(position)
+                if state[0] == len(carn_rows):
+                    break
+                uniforms, position = draws.reserve(1)
+
+            carnivores.is_sick[carn_rows] = carn_sick.view(bool)
+            carnivores.set_weight(carn_rows, carn_weight)
+            carnivores.fitness[carn_rows] = carn_fitness
+            carnivores.stale[carn_rows] = False
+            herbivores.remove(herb_rows[killed.view(bool)])
+        self._settle()
 
     def remove_multiple_animals(self, specie, animals_to_remove):
         """
@@ -178,13 +400,12 @@ class Cell:
         the cell list containing the animals.
 
         """
-        self.animal_classes[specie] = [
-            animal
-            for index, animal in enumerate(self.animal_classes[specie])
-            if index not in animals_to_remove
-        ]
+        rows = self._members(specie)
+        population = self.populations[specie]
+        population.remove(rows[sorted(animals_to_remove)])
+        population.settle()
 
-    def migration(self, neighbour_cells):
+    def migration(self, neighbour_cells, move_table=None):
         """
         Moves animals from one cell to another cell, whether the animal is to
         move is determined by the animal instance with the function
@@ -196,22 +417,78 @@ class Cell:
         ----------
         neighbour_cells: list
                         List of class instances containing neighbouring cells
-
-        """
-        for type_of_animal, animal_list in self.animal_classes.items():
-            remove_list = set()
-            for index, animal in enumerate(animal_list):
-                if animal.determine_to_move() and not animal.has_migrated:
-                    move_prob = animal.compute_move_prob(neighbour_cells)
+        move_table: MigrationTable [default=None]
+                        Table of precomputed move probabilities for the map
+                        the cell is part of. If None the move probabilities
+                        are computed for every animal. With a snapshot
+                        table, the destinations of all animals leaving the
+                        cell are chosen in one call.
+
+        """
+        for population in self.populations.values():
+            specie = population.species
+            rows = population.members(self._index)
+            fitness = population.refresh_fitness(rows)
+            to_move = population.draws.by_rows(rows) < (
+                specie._move_probability(fitness)
+            )
+            to_move &= ~population.has_migrated[rows]
+            movers = rows[to_move]
+            if move_table is None:
+                for row in movers:
+                    move_prob = specie.compute_move_prob(neighbour_cells)
                     if sum(move_prob) == 0:
                         break
-                    else:
-                        idx = weighted_prob(move_prob)
-                        chosen_cell = neighbour_cells[idx]
-                        chosen_cell.insert_animal([animal])
-                        animal.has_migrated = True
-                        remove_list.add(index)
-            self.remove_multiple_animals(type_of_animal, remove_list)
+                    idx = kernels.weighted_prob(
+                        move_prob, population.draws.next()
+                    )
+                    neighbour_cells[idx]._receive(population, [row])
+            elif move_table.sequential:
+                name = specie.__name__
+                for row in movers:
+                    if not move_table.can_move(name, self._index):
+                        break
+                    idx = move_table.choose_one(
+                        name, self._index, population.draws.next()
+                    )
+                    chosen_cell = neighbour_cells[idx]
+                    chosen_cell._receive(population, [row])
+                    move_table.moved(name, self._index, chosen_cell._index)
+            elif len(movers) > 0 and move_table.can_move(
+                specie.__name__, self._index
+            ):
+                choices = move_table.choose(
+                    specie.__name__,
+                    np.full(len(movers), self._index),
+                    population.draws.take(len(movers)),
+                )
+                for idx, chosen_cell in enumerate(neighbour_cells):
+                    chosen = movers[choices == idx]
+                    if len(chosen) > 0:
+                        chosen_cell._receive(population, chosen)
+        self._settle()
+
+    def _receive(self, population, rows):
+        """
+        Moves migrating animals into this cell, and marks them as having
+        migrated this year.
+
+        Parameters
+        ----------
+        population: Population
+            The population the animals are currently stored in
+        rows: list
+            Row numbers of the animals in 'population'
+
+        """
+        target = self.populations[population.species.__name__]
+        if target is population:
+            rows = population.move(rows, self._index)
+        else:
+            rows = population.transfer(rows, target, self._index)
+        target.has_migrated[rows] = True
+        if target is not population:
+            target.settle()
 
     # @staticmethod
     # @jit
@@ -229,13 +506,15 @@ class Cell:
         'remove_multiple_animals' function.
 
         """
-        for type_of_animal, animal_list in self.animal_classes.items():
-            remove_list = set()
-            for index, animal in enumerate(animal_list):
-                animal.has_migrated = False  # Prepares for the next cycle
-                if animal.determine_death():
-                    remove_list.add(index)
-            self.remove_multiple_animals(type_of_animal, remove_list)
+        for population in self.populations.values():
+            rows = population.members(self._index)
+            population.has_migrated[rows] = False  # Prepares for next cycle
+            fitness = population.refresh_fitness(rows)
+            specie = population.species
+            death_prob = specie._death_probability(fitness)
+            dies = population.draws.by_rows(rows) < death_prob
+            population.remove(rows[dies])
+        self._settle()
 
     # @staticmethod
     # def compute_move_prob(animal_type, neighbour_cells):
@@ -306,7 +585,7 @@ class Cell:
     #
     #     animal_name = type(animal_class).__name__
     #     amount_same_spec = len(self.animal_classes[animal_name])
-    #     food_wanting = animal_class.param["F"]
+    #     food_wanting = animal_class.param.F
     #     curr_fod = 0
     #     if animal_name == "Herbivore":
     #         curr_fod = self.current_fodder
@@ -356,7 +635,7 @@ class Cell:
     #         return 0
     #
     #     relative_abundance = self.compute_relative_abundance(specie)
-    #     lambda_specie = specie.param["lambda"]
+    #     lambda_specie = specie.param.lambda
     #
     #     return math.exp(lambda_specie * relative_abundance)
 
@@ -367,10 +646,10 @@ class Cell:
         'animals.py' to add one age.
 
         """
-        for animal_classes in itertools.chain.from_iterable(
-            self.animal_classes.values()
-        ):
-            animal_classes.add_age()
+        for population in self.populations.values():
+            rows = population.members(self._index)
+            population.age[rows] += 1
+            population.stale[rows] = True
 
     def delete_single_animal(self, animal):
         """
@@ -390,7 +669,16 @@ class Cell:
         if animal not in animal_classes_list:
             raise ValueError(f"Class {name_animal} is not in this cell")
 
+        population = self.populations[name_animal]
+        population.remove([animal.row])
+        population.settle()
+
+        # The cached list is updated in place, so it stays valid
         animal_classes_list.remove(animal)
+        generation = tuple(
+            population.generation for population in self.populations.values()
+        )
+        self._view_cache = generation, self._view_cache[1]
 
     def insert_animal(self, animal_list):
         """
@@ -407,9 +695,9 @@ class Cell:
         for animal_class in animal_list:
             if type(self).__name__ not in Animal.allowed_landscape:
                 raise TypeError(f"This cell is inhabitable.")
-            self.animal_classes[type(animal_class).__name__].append(
-                animal_class
-            )
+            population = self.populations[type(animal_class).__name__]
+            animal_class.relocate(population, self._index)
+        self._settle()
 
     def add_animal(self, list_animal_dicts):
         """
@@ -423,6 +711,7 @@ class Cell:
 
         """
         cell_name = type(self).__name__
+        new_animals = {name: ([], []) for name in self.allowed_species}
         for dicts in list_animal_dicts:
             animal_name = dicts["species"]
 
@@ -437,8 +726,16 @@ class Cell:
                     f"This cell is inhabitable for specie: {animal_name}"
                 )
 
-            current_class = self.allowed_species[animal_name](weight, age)
-            self.animal_classes[animal_name].append(current_class)
+            weight, age = self.allowed_species[animal_name]._initial_state(
+                weight, age
+            )
+            new_animals[animal_name][0].append(age)
+            new_animals[animal_name][1].append(weight)
+
+        for animal_name, (ages, weights) in new_animals.items():
+            if ages:
+                self.populations[animal_name].add(self._index, ages, weights)
+        self._settle()
 
     def num_animals_per_cell(self):
         """
@@ -452,7 +749,10 @@ class Cell:
             The total number of animals per cell
 
         """
-        return sum(len(lst) for lst in self.animal_classes.values())
+        return sum(
+            population.count(self._index)
+            for population in self.populations.values()
+        )
 
     def num_species_per_cell(self):
         """
@@ -469,10 +769,48 @@ class Cell:
 
 
         """
-        tot_herbivores = len(self.animal_classes["Herbivore"])
-        tot_carnivores = len(self.animal_classes["Carnivore"])
+        tot_herbivores = self.num_specie_per_cell("Herbivore")
+        tot_carnivores = self.num_specie_per_cell("Carnivore")
         return tot_herbivores, tot_carnivores
 
+    def num_specie_per_cell(self, specie):
+        """
+
+        Returns the amount of animals of a single specie in the cell.
+
+        Parameters
+        ----------
+        specie: str
+            Name of the specie
+
+        Returns
+        -------
+        int
+            The amount of animals of the specie in the cell
+
+        """
+        return self.populations[specie].count(self._index)
+
+    def specie_weight_per_cell(self, specie):
+        """
+
+        Returns the total weight of all animals of a specie in the cell. The
+        total is kept up to date by the population whenever animals arrive,
+        leave or change weight, so no summing is needed.
+
+        Parameters
+        ----------
+        specie: str
+            Name of the specie
+
+        Returns
+        -------
+        float
+            The sum of the weights of the animals
+
+        """
+        return float(self.populations[specie].biomass[self._index])
+
     def gen_fodder(self):
         """
 
@@ -481,11 +819,12 @@ class Cell:
         """
         pass
 
-    @staticmethod
-    def update_animal_parameters_in_cell(species, param_dict):
+    def update_animal_parameters_in_cell(self, species, param_dict):
         """
 
-        Updates the parameters for all instances of specified specie
+        Updates the parameters for all instances of specified specie. For a
+        cell which is part of a map, only the parameters of the map's
+        simulation are changed.
 
         Parameters
         ----------
@@ -498,7 +837,9 @@ class Cell:
         -------
 
         """
-        eval(species).update_parameters(param_dict)
+        if species not in self.allowed_species:
+            raise ValueError(f"{species} is not an allowed specie")
+        self.allowed_species[species].update_parameters(param_dict)
 
 
 class Ocean(Cell):
@@ -542,7 +883,7 @@ class Savannah(Cell):
     Savannah subclass, which inherits from the Cell superclass
     """
 
-    param = {"f_max": 300, "alpha": 0.3}
+    param = LandscapeParameters({"f_max": 300, "alpha": 0.3})
 
     def __init__(self):
         """
@@ -550,7 +891,7 @@ class Savannah(Cell):
         to f_max from parameters.
         """
         super().__init__()
-        self.current_fodder = self.param["f_max"]
+        self.current_fodder = self.param.f_max
 
     def gen_fodder(self):
         r"""
@@ -568,8 +909,8 @@ class Savannah(Cell):
 
 
         """
-        self.current_fodder = self.current_fodder + self.param["alpha"] * (
-            self.param["f_max"] - self.current_fodder
+        self.current_fodder = self.current_fodder + self.param.alpha * (
+            self.param.f_max - self.current_fodder
         )
 
 
@@ -578,7 +919,7 @@ class Jungle(Cell):
     Jungle subclass, which inherits from the Cell superclass
     """
 
-    param = {"f_max": 800, "alpha": 0}
+    param = LandscapeParameters({"f_max": 800, "alpha": 0})
 
     def __init__(self):
         """
@@ -587,7 +928,7 @@ class Jungle(Cell):
 
         """
         super().__init__()
-        self.current_fodder = self.param["f_max"]
+        self.current_fodder = self.param.f_max
 
     def gen_fodder(self):
         """
@@ -596,4 +937,4 @@ class Jungle(Cell):
 
 
         """
-        self.current_fodder = self.param["f_max"]
+        self.current_fodder = self.param.f_max
@@ -0,0 +1,11 @@
+from libc.math cimport exp
+
+cdef inline double _sigmoidal(double x, double x_half, double rate,
+                              int signum) nogil:
+    return 1 / (1 + exp(signum * rate * (x - x_half)))
+
+cdef inline double _fitness(double age, double a_half, double phi_age,
+                            double weight, double w_half,
+                            double phi_weight) nogil:
+    return _sigmoidal(age, a_half, phi_age, +1) * _sigmoidal(
+                weight, w_half, phi_weight, -1)
@@ -1,4 +1,4 @@
-from libc.math cimport exp
+cimport cython
 
 cpdef sigmoidal(double x, double x_half, double rate, int signum):
     r"""
@@ -26,15 +26,57 @@ cpdef sigmoidal(double x, double x_half, double rate, int signum):
             Sigmoid value given the inputs
 
     """
-    return 1 / (1 + exp(signum * rate * (x - x_half)))
+    return _sigmoidal(x, x_half, rate, signum)
 
 cpdef calculate_fitness(int age, double a_half, double phi_age, double weight,
                          double w_half,
                          double phi_weight):
     """
-    
+
     Calculates the fitness using sigmoidal function.
-    
+
+    """
+    return _fitness(age, a_half, phi_age, weight, w_half, phi_weight)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef void calculate_fitness_array(const long long[:] age, double a_half,
+                                   double phi_age,
+                                   const double[:] weight, double w_half,
+                                   double phi_weight, double[:] fitness):
+    """
+
+    Calculates the fitness of many animals in one pass, writing the result
+    into 'fitness'. Uses the same computation as 'calculate_fitness', so the
+    results are bit-identical, and animals with zero weight get zero fitness.
+
+    """
+    cdef Py_ssize_t i
+    with nogil:
+        for i in range(age.shape[0]):
+            if weight[i] == 0:
+                fitness[i] = 0
+            else:
+                fitness[i] = _fitness(age[i], a_half, phi_age, weight[i],
+                                      w_half, phi_weight)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef void death_probability(const double[:] fitness, double omega,
+                             double[:] death_prob):
+    """
+
+    Computes the probability of death of many animals, writing the result
+    into 'death_prob'. Animals with zero fitness die, and animals with a
+    fitness of at most 0.01 do not die.
+
     """
-    return sigmoidal(age, a_half, phi_age, +1) * sigmoidal(
-                weight, w_half, phi_weight, -1  )
+    cdef Py_ssize_t i
+    with nogil:
+        for i in range(fitness.shape[0]):
+            if fitness[i] == 0:
+                death_prob[i] = 1
+            elif fitness[i] > 0.01:
+                death_prob[i] = omega * (1 - fitness[i])
+            else:
+                death_prob[i] = 0
@@ -1,6 +1,5 @@
-import numpy as np
-
-cpdef det_kill(double fit_carn,  double fit_herb, double delta_phi_max):
+cpdef det_kill(double fit_carn,  double fit_herb, double delta_phi_max,
+               double uniform):
     r"""
     Computes probability of a Carnivore killing Herbivore which is
     determined through:
@@ -24,12 +23,14 @@ cpdef det_kill(double fit_carn,  double fit_herb, double delta_phi_max):
         Fitness of the Herbivore which is the prey
     delta_phi_max: int or float
         Parameter for Carnivore
+    uniform: float
+        Uniform random number in [0, 1) drawn for the decision
 
 
     Returns
     -------
-    float or int
-        The probability of the carnivore killing the herbivore
+    bool
+        True if the carnivore kills the herbivore
 
     """
     if fit_carn <= fit_herb:
@@ -39,5 +40,5 @@ cpdef det_kill(double fit_carn,  double fit_herb, double delta_phi_max):
     else:
         kill_prob = 1
 
-    return np.random.random()<kill_prob
+    return uniform<kill_prob
 
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Uniform random numbers drawn in blocks.
+
+Drawing a single random number from a NumPy generator costs about as much as
+drawing a few hundred at once, so the decisions made for single animals, e.g.
+whether an animal dies or a carnivore kills a herbivore, compare against
+random numbers drawn in advance. A ``UniformDraws`` object hands out uniform
+random numbers of one specie in two ways:
+
+* by row: during a phase of the annual cycle, see :meth:`UniformDraws.phase`,
+  one number is drawn for every row of the population at the start of the
+  phase, and the decision for the animal in row 'i' uses number 'i'. This
+  is used for decisions made at most once per animal and phase.
+* in sequence: numbers are taken one after the other from a block, which is
+  drawn again when it is used up. This is used where the number of
+  decisions is not known in advance, as when a carnivore hunts.
+
+The blocks are discarded at the end of every phase, so the state of the
+simulation between phases is given by the state of the generator alone.
+
+"""
+
+import contextlib
+import numpy as np
+
+
+class UniformDraws:
+    """
+    Uniform random numbers in [0, 1) of one specie, drawn in blocks from the
+    generator of the specie.
+    """
+
+    def __init__(self, rng, block_size=1024):
+        """
+        Parameters
+        ----------
+        rng: numpy.random.Generator
+            Generator the numbers are drawn from
+        block_size: int [default=1024]
+            Number of values drawn at once for the numbers handed out in
+            sequence
+        """
+        self.rng = rng
+        self.block_size = block_size
+        self._rows = None
+        self._block = np.empty(0)
+        self._position = 0
+
+    @contextlib.contextmanager
+    def phase(self, size):
+        """
+        Context manager which draws one number for every row of a population
+        at the start of a phase, and discards all drawn numbers at the end.
+
+        Parameters
+        ----------
+        size: int
+            Number of rows in the population
+        """
+        self._rows = self.rng.random(size)
+        try:
+            yield self
+        finally:
+            self._rows = None
+            self._block = np.empty(0)
+            self._position = 0
+
+    def by_rows(self, rows):
+        """
+        Returns the numbers of the given rows of the population. Outside a
+        phase, new numbers are drawn.
+
+        Parameters
+        ----------
+        rows: array
+            Row numbers of the animals
+
+        Returns
+        -------
+        array
+            One number for every row
+        """
+        if self._rows is None:
+            return self.rng.random(len(rows))
+        return self._rows[rows]
+
+    def next(self):
+        """
+        Returns
+        -------
+        float
+            The next number of the sequence
+        """
+        if self._position == len(self._block):
+            self._block = self.rng.random(self.block_size)
+            self._position = 0
+        value = float(self._block[self._position])
+        self._position += 1
+        return value
+
+    def reserve(self, size):
+        """
+        Makes sure that at least 'size' numbers of the sequence are drawn
+        and not yet used, so that compiled code can take them from the block
+        directly. The numbers left in the block are kept in front of the new
+        ones, and new numbers are drawn in whole blocks, so the sequence and
+        the state of the generator are the same as with :meth:`next`.
+
+        Parameters
+        ----------
+        size: int
+            Number of numbers needed
+
+        Returns
+        -------
+        tuple
+            The block, and the position of the next unused number in it.
+            Report the position after the last number used with
+            :meth:`seek`.
+        """
+        left = len(self._block) - self._position
+        if left < size:
+            num_blocks = -(-(size - left) // self.block_size)
+            self._block = np.concatenate(
+                (
+                    self._block[self._position :],
+                    self.rng.random(num_blocks * self.block_size),
+                )
+            )
+            self._position = 0
+        return self._block, self._position
+
+    def take(self, size):
+        """
+        Parameters
+        ----------
+        size: int
+            Number of numbers to take
+
+        Returns
+        -------
+        array
+            The next 'size' numbers of the sequence
+        """
+        block, position = self.reserve(size)
+        self._position = position + size
+        return block[position : self._position]
+
+    def seek(self, position):
+        """
+        Parameters
+        ----------
+        position: int
+            Position in the block of the next unused number, after numbers
+            have been taken from a block given by :meth:`reserve`
+        """
+        self._position = position
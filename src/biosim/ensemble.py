@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Running replicates of a simulation in parallel.
+
+The replicates are run in a pool of worker processes. Every replicate is a
+simulation with parameters of its own, see :mod:`biosim.parameters`, so the
+parameters of the ensemble never change the parameters of the workers or of
+the calling process. The workers are started fresh, not forked, so that they
+begin from the default parameters of the classes.
+
+"""
+
+import concurrent.futures
+import multiprocessing
+import numpy as np
+
+from .map import Map
+from .simulation import BioSim
+
+
+def _check_parameters(params):
+    """
+    Checks that all keys of 'params' are species names or landscape letters.
+
+    Parameters
+    ----------
+    params: dict
+        Species names and landscape letters mapped to parameters
+    """
+    for key in params:
+        if key not in Map.allowed_species and key not in Map.dict_cells:
+            raise ValueError(
+                f"{key} is neither a specie nor a landscape letter"
+            )
+
+
+def _run_replicate(island_map, ini_pop, params, seed, years):
+    """
+    Runs one replicate headless.
+
+    Parameters
+    ----------
+    island_map: str
+        Multi-line string specifying island geography
+    ini_pop: list
+        List of dictionaries specifying the initial population
+    params: dict
+        Species names and landscape letters mapped to the parameters to set
+    seed: int
+        Random number seed of the replicate
+    years: int
+        Number of years to simulate
+
+    Returns
+    -------
+    int
+        The seed of the replicate
+    dict
+        Species name mapped to the number of animals at the start of every
+        year, and after the last year
+    """
+    sim = BioSim(island_map, ini_pop, seed, params=params)
+    sim.simulate(years, vis_years=None)
+    history = sim.population_history
+    final = sim.num_animals_per_species
+    return (
+        seed,
+        {name: np.append(history[name], final[name]) for name in final},
+    )
+
+
+def _iter_replicates(island_map, ini_pop, seeds, params, years, workers):
+    """
+    Runs the replicates of :func:`iter_ensemble`, yielding the position of
+    each seed along with its result, so that replicates with the same seed
+    are kept apart.
+
+    Yields
+    ------
+    int
+        The position of the seed of a finished replicate in 'seeds'
+    int
+        The seed of the replicate
+    dict
+        Species name mapped to the number of animals of the replicate
+    """
+    params = {} if params is None else params
+    _check_parameters(params)
+
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=context
+    ) as executor:
+        futures = {
+            executor.submit(
+                _run_replicate, island_map, ini_pop, params, seed, years
+            ): index
+            for index, seed in enumerate(seeds)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            yield (futures[future], *future.result())
+
+
+def iter_ensemble(
+    island_map, ini_pop, seeds, params=None, years=100, workers=None
+):
+    """
+    Runs one replicate of a simulation for every seed in a pool of worker
+    processes, yielding the result of each replicate as soon as it is done.
+
+    Parameters
+    ----------
+    island_map: str
+        Multi-line string specifying island geography
+    ini_pop: list
+        List of dictionaries specifying the initial population
+    seeds: list
+        Random number seeds, one for every replicate
+    params: dict [default=None]
+        Species names and landscape letters mapped to the parameters to
+        set, e.g. ``{"Carnivore": {"F": 60}, "J": {"f_max": 700}}``
+    years: int [default=100]
+        Number of years to simulate
+    workers: int [default=None]
+        Number of worker processes, the number of processors if None
+
+    Yields
+    ------
+    int
+        The seed of a finished replicate
+    dict
+        Species name mapped to an array with the number of animals at the
+        start of every year, and after the last year
+    """
+    for _, seed, result in _iter_replicates(
+        island_map, ini_pop, seeds, params, years, workers
+    ):
+        yield seed, result
+
+
+def run_ensemble(
+    island_map, ini_pop, seeds, params=None, years=100, workers=None
+):
+    """
+    Runs one replicate of a simulation for every seed in a pool of worker
+    processes, see :func:`iter_ensemble`.
+
+    Parameters
+    ----------
+    island_map: str
+        Multi-line string specifying island geography
+    ini_pop: list
+        List of dictionaries specifying the initial population
+    seeds: list
+        Random number seeds, one for every replicate
+    params: dict [default=None]
+        Species names and landscape letters mapped to the parameters to set
+    years: int [default=100]
+        Number of years to simulate
+    workers: int [default=None]
+        Number of worker processes, the number of processors if None
+
+    Returns
+    -------
+    dict
+        'Seed' and 'Year' mapped to the seeds and years, and every specie
+        mapped to an array of shape (seeds, years + 1) with the number of
+        animals at the start of every year and after the last year
+    """
+    seeds = list(seeds)
+    ensemble = {"Seed": np.array(seeds), "Year": np.arange(years + 1)}
+    for name in Map.allowed_species:
+        ensemble[name] = np.empty((len(seeds), years + 1), dtype=np.int64)
+    for index, _, result in _iter_replicates(
+        island_map, ini_pop, seeds, params, years, workers
+    ):
+        for name in Map.allowed_species:
+            ensemble[name][index] = result[name]
+    return ensemble
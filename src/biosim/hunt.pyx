@@ -0,0 +1,206 @@
+cimport cython
+from biosim.compute_fit cimport _fitness
+
+
+cdef struct HuntParams:
+    double appetite
+    double delta_phi_max
+    double beta
+    double loss_rate
+    double p_sick
+    double a_half
+    double phi_age
+    double w_half
+    double phi_weight
+
+
+cdef inline double _kill_probability(double fit_carn, double fit_herb,
+                                     double delta_phi_max) nogil:
+    if fit_carn <= fit_herb:
+        return 0
+    elif 0 < fit_carn - fit_herb < delta_phi_max:
+        return (fit_carn - fit_herb) / delta_phi_max
+    return 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline void _eat(double[:] carn_fitness, double[:] carn_weight,
+                      const long long[:] carn_age,
+                      unsigned char[:] carn_sick, Py_ssize_t car,
+                      double fodder, double uniform,
+                      const HuntParams* param) nogil:
+    cdef double gain = param.beta * fodder
+    carn_sick[car] = uniform < param.p_sick
+    if carn_sick[car]:
+        gain = gain * param.loss_rate
+    carn_weight[car] = carn_weight[car] + gain
+    if carn_weight[car] == 0:
+        carn_fitness[car] = 0
+    else:
+        carn_fitness[car] = _fitness(carn_age[car], param.a_half,
+                                     param.phi_age, carn_weight[car],
+                                     param.w_half, param.phi_weight)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef bint _hunt(double[:] carn_fitness, double[:] carn_weight,
+                const long long[:] carn_age, unsigned char[:] carn_sick,
+                Py_ssize_t carn_stop, const double[:] herb_fitness,
+                const double[:] herb_weight, unsigned char[:] killed,
+                Py_ssize_t herb_start, Py_ssize_t herb_stop,
+                const HuntParams* param, const double[:] uniforms,
+                Py_ssize_t* position, Py_ssize_t* car, Py_ssize_t* herb,
+                double* current_food, Py_ssize_t* pending) nogil:
+    # Hunt of the carnivores car[0] to carn_stop on the herbivores
+    # herb_start to herb_stop, see 'hunt'. Returns True if it stopped
+    # because 'uniforms' is used up.
+    cdef Py_ssize_t index, num_alive = 0
+    cdef Py_ssize_t num_uniforms = uniforms.shape[0]
+
+    for index in range(herb_start, herb_stop):
+        if not killed[index]:
+            num_alive += 1
+
+    while car[0] < carn_stop:
+        if pending[0] >= 0:
+            if position[0] == num_uniforms:
+                return True
+            _eat(carn_fitness, carn_weight, carn_age, carn_sick, car[0],
+                 herb_weight[pending[0]], uniforms[position[0]], param)
+            position[0] += 1
+            pending[0] = -1
+        elif herb[0] == herb_start and num_alive == 0:
+            car[0] = carn_stop
+            return False
+
+        while herb[0] < herb_stop:
+            if killed[herb[0]]:
+                herb[0] += 1
+                continue
+            if param.appetite <= current_food[0]:
+                break
+            if position[0] == num_uniforms:
+                return True
+            position[0] += 1
+            if uniforms[position[0] - 1] < _kill_probability(
+                    carn_fitness[car[0]], herb_fitness[herb[0]],
+                    param.delta_phi_max):
+                killed[herb[0]] = 1
+                num_alive -= 1
+                current_food[0] += herb_weight[herb[0]]
+                if position[0] == num_uniforms:
+                    pending[0] = herb[0]
+                    herb[0] += 1
+                    return True
+                _eat(carn_fitness, carn_weight, carn_age, carn_sick, car[0],
+                     herb_weight[herb[0]], uniforms[position[0]], param)
+                position[0] += 1
+            herb[0] += 1
+
+        car[0] += 1
+        herb[0] = herb_start
+        current_food[0] = 0
+    return False
+
+
+cpdef tuple hunt(double[:] carn_fitness, double[:] carn_weight,
+                 const long long[:] carn_age, unsigned char[:] carn_sick,
+                 const double[:] herb_fitness, const double[:] herb_weight,
+                 unsigned char[:] killed, double appetite,
+                 double delta_phi_max, double beta, double loss_rate,
+                 double p_sick, double a_half, double phi_age, double w_half,
+                 double phi_weight, const double[:] uniforms,
+                 Py_ssize_t position, Py_ssize_t car, Py_ssize_t herb,
+                 double current_food, Py_ssize_t pending):
+    r"""
+
+    Lets the carnivores of a cell hunt the herbivores of the cell, one
+    carnivore after the other, in the same way as 'det_kill' and
+    'increase_eat_weight' do for a single carnivore and herbivore.
+
+    The carnivores must be sorted by fitness, fittest first, and the
+    herbivores by fitness, least fit first. Every carnivore tries to kill
+    the herbivores which are still alive in turn, until it has eaten at
+    least 'appetite'. Every attempt uses the next number of 'uniforms', and
+    every kill one more number to decide whether the carnivore got sick. The
+    weight, fitness and sickness of the carnivores are updated in place, and
+    killed herbivores are flagged in 'killed'.
+
+    When a number is needed and 'uniforms' is used up, the hunt stops and
+    returns its state, and continues where it stopped when it is called
+    again with this state and new numbers. A hunt starts with the state
+    (0, 0, 0, -1) and is over when the index of the carnivore equals the
+    number of carnivores.
+
+    Returns
+    -------
+    tuple
+        Position of the next unused number in 'uniforms', index of the
+        hunting carnivore, index of the next herbivore it hunts, the food it
+        has eaten, and the index of a killed herbivore whose sickness number
+        is still to be drawn, -1 if there is none
+
+    """
+    cdef HuntParams param = HuntParams(appetite, delta_phi_max, beta,
+                                       loss_rate, p_sick, a_half, phi_age,
+                                       w_half, phi_weight)
+    with nogil:
+        _hunt(carn_fitness, carn_weight, carn_age, carn_sick,
+              carn_fitness.shape[0], herb_fitness, herb_weight, killed, 0,
+              herb_fitness.shape[0], &param, uniforms, &position, &car,
+              &herb, &current_food, &pending)
+    return position, car, herb, current_food, pending
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef tuple hunt_island(double[:] carn_fitness, double[:] carn_weight,
+                        const long long[:] carn_age,
+                        unsigned char[:] carn_sick,
+                        const Py_ssize_t[:] carn_ptr,
+                        const double[:] herb_fitness,
+                        const double[:] herb_weight, unsigned char[:] killed,
+                        const Py_ssize_t[:] herb_ptr, double appetite,
+                        double delta_phi_max, double beta, double loss_rate,
+                        double p_sick, double a_half, double phi_age,
+                        double w_half, double phi_weight,
+                        const double[:] uniforms, Py_ssize_t position,
+                        Py_ssize_t cell, Py_ssize_t car, Py_ssize_t herb,
+                        double current_food, Py_ssize_t pending):
+    r"""
+
+    Lets the carnivores of every cell of an island hunt the herbivores of
+    their cell, cell by cell in increasing order, in the same way as
+    'hunt' does for a single cell.
+
+    The animals of cell 'i' are ``carn_ptr[i]`` to ``carn_ptr[i + 1]`` and
+    ``herb_ptr[i]`` to ``herb_ptr[i + 1]`` in the arrays, sorted within the
+    cell as for 'hunt'. The hunt stops when 'uniforms' is used up, as
+    'hunt' does, and starts with the state (0, 0, 0, 0, -1) for cell,
+    carnivore, herbivore, food and pending herbivore. The indices of
+    carnivores and herbivores are positions in the arrays of the island.
+
+    Returns
+    -------
+    tuple
+        Position of the next unused number in 'uniforms', and the state of
+        the hunt. The hunt is over when the cell equals the number of cells.
+
+    """
+    cdef HuntParams param = HuntParams(appetite, delta_phi_max, beta,
+                                       loss_rate, p_sick, a_half, phi_age,
+                                       w_half, phi_weight)
+    cdef Py_ssize_t num_cells = carn_ptr.shape[0] - 1
+    with nogil:
+        while cell < num_cells:
+            if _hunt(carn_fitness, carn_weight, carn_age, carn_sick,
+                     carn_ptr[cell + 1], herb_fitness, herb_weight, killed,
+                     herb_ptr[cell], herb_ptr[cell + 1], &param, uniforms,
+                     &position, &car, &herb, &current_food, &pending):
+                break
+            cell += 1
+            if cell < num_cells:
+                herb = herb_ptr[cell]
+    return position, cell, car, herb, current_food, pending
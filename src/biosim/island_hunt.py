@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Annual cycle with a fast path for the hunt.
+
+:meth:`biosim.map.Map.cycle` runs the phases of the year through the cells
+of the map. An ``IslandHuntCycle`` runs the same year, but replaces the
+phases which go cell by cell with island-wide ones:
+
+* the fodder of all cells, which the map keeps in one flat array, grows in
+  one vectorized step from the parameters of every landscape type,
+* the carnivores of all cells hunt in one call of the compiled
+  'hunt_island' kernel, see :mod:`biosim.kernels`, on the animals of both
+  species sorted by cell and fitness with one sort per specie.
+
+All other phases, i.e. the feeding of the herbivores, birth, migration,
+aging, weight loss and death, are the methods of the map, which are
+vectorized with NumPy over the island-wide populations. So the hunt is the
+only phase this engine runs differently from :meth:`biosim.map.Map.cycle`.
+
+The random numbers are drawn in the same order as by
+:meth:`biosim.map.Map.cycle`, so both give the same island for the same
+seed. The cells read and write their fodder in the array of the map, so
+they stay a valid view of the island for migration, statistics and
+checkpoints without copying the fodder between the array and the cells.
+
+"""
+
+from .cell import Jungle, Savannah
+from . import kernels
+import numpy as np
+
+
+class IslandHuntCycle:
+    """
+    Annual cycle of a map, with the fodder grown and the hunt run for the
+    whole island at once.
+    """
+
+    def __init__(self, island_map):
+        """
+        Parameters
+        ----------
+        island_map: Map
+            The map the cycle is run on
+        """
+        self.island_map = island_map
+        self._cells = list(island_map.map.flat)
+        cell_types = [type(cell) for cell in self._cells]
+        self._landscapes = {
+            cell_type: np.array([other is cell_type for other in cell_types])
+            for cell_type in set(cell_types)
+        }
+
+    def _landscape_arrays(self):
+        """
+        Collects the fodder parameters of every cell from the current
+        parameters of the landscape types of the map.
+
+        Returns
+        -------
+        tuple
+            Maximum fodder, growth rate and a mask of the cells whose fodder
+            grows to the maximum every year, one value per cell
+        """
+        f_max = np.zeros(len(self._cells))
+        alpha = np.zeros(len(self._cells))
+        refill = np.zeros(len(self._cells), dtype=bool)
+        for cell_type, cells in self._landscapes.items():
+            if issubclass(cell_type, Jungle):
+                refill[cells] = True
+                f_max[cells] = cell_type.param.f_max
+            elif issubclass(cell_type, Savannah):
+                f_max[cells] = cell_type.param.f_max
+                alpha[cells] = cell_type.param.alpha
+        return f_max, alpha, refill
+
+    def grow_fodder(self, fodder):
+        """
+        Lets the fodder of every cell grow, as 'gen_fodder' in 'cell.py'
+        does for a single cell.
+
+        Parameters
+        ----------
+        fodder: array
+            Fodder of every cell at the end of the previous year
+
+        Returns
+        -------
+        array
+            Fodder of every cell at the start of the year
+        """
+        f_max, alpha, refill = self._landscape_arrays()
+        return np.where(refill, f_max, fodder + alpha * (f_max - fodder))
+
+    def hunt(self):
+        """
+        Lets the carnivores of all cells hunt, in one call of the
+        'hunt_island' kernel. Works like 'eat_carnivore' in 'cell.py' for
+        every cell.
+        """
+        herbivores = self.island_map.populations["Herbivore"]
+        carnivores = self.island_map.populations["Carnivore"]
+        herbivores.commit()
+        carnivores.commit()
+        carn_fitness = carnivores.refresh_fitness()
+        carn_rows = np.lexsort((-carn_fitness, carnivores.cell))
+        carn_fitness = carn_fitness[carn_rows]
+        carn_weight = carnivores.weight[carn_rows]
+        carn_age = carnivores.age[carn_rows]
+        carn_sick = carnivores.is_sick[carn_rows].view(np.uint8)
+        herb_fitness = herbivores.refresh_fitness()
+        herb_rows = np.lexsort((herb_fitness, herbivores.cell))
+        herb_fitness = herb_fitness[herb_rows]
+        herb_weight = herbivores.weight[herb_rows]
+        killed = np.zeros(len(herb_rows), dtype=np.uint8)
+
+        # Every cell is a contiguous range of the sorted animals
+        carn_ptr = np.zeros(len(self._cells) + 1, dtype=np.intp)
+        carn_ptr[1:] = np.cumsum(carnivores.counts)
+        herb_ptr = np.zeros(len(self._cells) + 1, dtype=np.intp)
+        herb_ptr[1:] = np.cumsum(herbivores.counts)
+
+        param = carnivores.species.param
+        draws = carnivores.draws
+        uniforms, position = draws.reserve(0)
+        state = (0, 0, 0, 0.0, -1)
+        while True:
+            position, *state = kernels.hunt_island(
+                carn_fitness,
+                carn_weight,
+                carn_age,
+                carn_sick,
+                carn_ptr,
+                herb_fitness,
+                herb_weight,
+                killed,
+                herb_ptr,
+                param.F,
+                param.DeltaPhiMax,
+                param.beta,
+                param.loss_rate,
+                param.p_sick,
+                param.a_half,
+                param.phi_age,
+                param.w_half,
+                param.phi_weight,
+                uniforms,
+                position,
+                *state,
+            )
+            draws.seek(position)
+            if state[0] == len(self._cells):
+                break
+            uniforms, position = draws.reserve(1)
+
+        carnivores.is_sick[carn_rows] = carn_sick.view(bool)
+        carnivores.set_weight(carn_rows, carn_weight)
+        carnivores.fitness[carn_rows] = carn_fitness
+        carnivores.stale[carn_rows] = False
+        herbivores.remove(herb_rows[killed.view(bool)])
+
+    def cycle(self):
+        """
+        Simulates the annual cycle for all animals on the map, in the same
+        order of phases as :meth:`biosim.map.Map.cycle`.
+        """
+        island_map = self.island_map
+        fodder = island_map.fodder
+        fodder[:] = self.grow_fodder(fodder)
+        fodder[:] = island_map.feed_herbivores_on(fodder)
+
+        island_map.update_fitness_all_animals()
+        with island_map._batch(draws=True, by_rows=False):
+            self.hunt()
+
+        island_map.mate_all_animals()
+        island_map.move_all_animals()
+        island_map.age_and_weight_loss_all_animals()
+        island_map.annual_death_all_animals()
@@ -0,0 +1,621 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Kernels of the annual cycle, with a choice of backends.
+
+The inner loops of the simulation, i.e. the fitness of many animals, the
+probability of a kill, the choice of a destination, the hunt of the
+carnivores (who eat what they kill) and the probability of death, are
+available from three backends:
+
+* ``"cython"``: the cythonized modules 'compute_fit', 'det_kill',
+  'weighted_prob' and 'hunt', which must be built with a C compiler, see
+  'setup.py'.
+* ``"numba"``: the kernels written in Python in this module, compiled by
+  Numba when they are first called. The kernels working on arrays are
+  compiled in their loop form. The compiled code is cached on disk.
+* ``"numpy"``: the kernels written in Python in this module. The kernels
+  working on arrays are vectorized with NumPy, and the hunt runs in plain
+  Python. Needs nothing but NumPy.
+
+The herbivores eat in closed form with NumPy, see
+:meth:`biosim.map.Map.feed_herbivores_on`, so feeding has no kernel of its
+own besides the hunt.
+
+The kernels are module attributes, e.g. ``kernels.hunt``, which are replaced
+when another backend is chosen with :func:`use`. The other modules look them
+up when they are called, so a new backend is used from the next call on. The
+backend is chosen when a kernel is first looked up, not at import, so that
+importing biosim does not import Numba: the backend named in the environment
+variable 'BIOSIM_KERNELS', else the first available of cython, numba and
+numpy.
+
+All backends compute the exponential with the exp of the C library, so they
+give the same fitness to the last bit and make the same decisions from the
+same random numbers.
+
+"""
+
+import math
+import os
+import sys
+import numpy as np
+
+BACKENDS = ("cython", "numba", "numpy")
+
+KERNELS = (
+    "calculate_fitness",
+    "calculate_fitness_array",
+    "det_kill",
+    "weighted_prob",
+    "weighted_choice",
+    "weighted_choices",
+    "death_probability",
+    "hunt",
+    "hunt_island",
+)
+
+# Largest exponent whose exp is finite. Above it, exp in C gives infinity
+# and the sigmoid zero, while math.exp raises an OverflowError.
+_MAX_EXPONENT = math.log(sys.float_info.max)
+
+_loaded = {}
+
+
+def _sigmoidal(x, x_half, rate, signum):
+    exponent = signum * rate * (x - x_half)
+    if exponent > _MAX_EXPONENT:
+        return 0.0
+    return 1 / (1 + math.exp(exponent))
+
+
+def _sigmoidal_array(x, x_half, rate, signum):
+    # The exponents are computed with NumPy, and their exp with math.exp as
+    # in '_sigmoidal', as np.exp may differ from it in the last bit
+    exponent = signum * rate * (x - x_half)
+    exp = np.fromiter(
+        map(math.exp, np.minimum(exponent, _MAX_EXPONENT).tolist()),
+        dtype=np.float64,
+        count=len(exponent),
+    )
+    return np.where(exponent > _MAX_EXPONENT, 0.0, 1 / (1 + exp))
+
+
+def _fitness(age, a_half, phi_age, weight, w_half, phi_weight):
+    return _sigmoidal(age, a_half, phi_age, 1) * _sigmoidal(
+        weight, w_half, phi_weight, -1
+    )
+
+
+def _kill_probability(fit_carn, fit_herb, delta_phi_max):
+    if fit_carn <= fit_herb:
+        return 0.0
+    elif 0 < fit_carn - fit_herb < delta_phi_max:
+        return (fit_carn - fit_herb) / delta_phi_max
+    return 1.0
+
+
+def _choose(cumulative, start, stop, uniform):
+    if start == stop or cumulative[stop - 1] == 0:
+        return -1
+    i = start
+    while i < stop - 1 and cumulative[i] < uniform:
+        i += 1
+    return i - start
+
+
+def _calculate_fitness(age, a_half, phi_age, weight, w_half, phi_weight):
+    return _fitness(age, a_half, phi_age, weight, w_half, phi_weight)
+
+
+def _calculate_fitness_array(
+    age, a_half, phi_age, weight, w_half, phi_weight, fitness
+):
+    q_age = _sigmoidal_array(age, a_half, phi_age, 1)
+    q_weight = _sigmoidal_array(weight, w_half, phi_weight, -1)
+    fitness[:] = np.where(weight == 0, 0.0, q_age * q_weight)
+
+
+def _det_kill(fit_carn, fit_herb, delta_phi_max, uniform):
+    return uniform < _kill_probability(fit_carn, fit_herb, delta_phi_max)
+
+
+def _weighted_prob(weights, uniform):
+    cs = 0.0
+    i = 0
+    while cs < uniform and i < len(weights):
+        cs += weights[i]
+        i += 1
+    return i - 1
+
+
+def _weighted_choice(cumulative, start, stop, uniform):
+    return _choose(cumulative, start, stop, uniform)
+
+
+def _weighted_choices(cumulative, ptr, groups, uniforms, choices):
+    if len(cumulative) == 0:
+        choices[:] = -1
+        return
+    start = ptr[groups]
+    stop = ptr[groups + 1]
+    last = np.maximum(stop - 1, 0)
+    # The cumulative probabilities of a group never decrease, so the index
+    # chosen is the number of them below the uniform number, not counting
+    # the last one
+    choices[:] = 0
+    for offset in range(int(np.max(stop - start, initial=1)) - 1):
+        position = start + offset
+        choices += (position < last) & (
+            cumulative[np.minimum(position, last)] < uniforms
+        )
+    choices[(start == stop) | (cumulative[last] == 0)] = -1
+
+
+def _death_probability(fitness, omega, death_prob):
+    death_prob[:] = np.where(fitness > 0.01, omega * (1 - fitness), 0.0)
+    death_prob[fitness == 0] = 1.0
+
+
+def _calculate_fitness_loop(
+    age, a_half, phi_age, weight, w_half, phi_weight, fitness
+):
+    # Loop form of '_calculate_fitness_array', compiled by the numba backend
+    for i in range(len(age)):
+        if weight[i] == 0:
+            fitness[i] = 0.0
+        else:
+            fitness[i] = _fitness(
+                age[i], a_half, phi_age, weight[i], w_half, phi_weight
+            )
+
+
+def _weighted_choices_loop(cumulative, ptr, groups, uniforms, choices):
+    # Loop form of '_weighted_choices', compiled by the numba backend
+    for animal in range(len(groups)):
+        choices[animal] = _choose(
+            cumulative,
+            ptr[groups[animal]],
+            ptr[groups[animal] + 1],
+            uniforms[animal],
+        )
+
+
+def _eat(
+    carn_fitness,
+    carn_weight,
+    carn_age,
+    carn_sick,
+    car,
+    fodder,
+    uniform,
+    param,
+):
+    # 'param' is the tuple built by '_hunt' and '_hunt_island'
+    gain = param[2] * fodder
+    sick = uniform < param[4]
+    carn_sick[car] = 1 if sick else 0
+    if sick:
+        gain = gain * param[3]
+    carn_weight[car] = carn_weight[car] + gain
+    if carn_weight[car] == 0:
+        carn_fitness[car] = 0.0
+    else:
+        carn_fitness[car] = _fitness(
+            carn_age[car],
+            param[5],
+            param[6],
+            carn_weight[car],
+            param[7],
+            param[8],
+        )
+
+
+def _hunt_cells(
+    carn_fitness,
+    carn_weight,
+    carn_age,
+    carn_sick,
+    carn_stop,
+    herb_fitness,
+    herb_weight,
+    killed,
+    herb_start,
+    herb_stop,
+    param,
+    uniforms,
+    position,
+    car,
+    herb,
+    current_food,
+    pending,
+):
+    # Hunt of the carnivores 'car' to 'carn_stop' on the herbivores
+    # 'herb_start' to 'herb_stop', as '_hunt' in 'hunt.pyx'. Returns whether
+    # it stopped because 'uniforms' is used up, and the state of the hunt.
+    num_alive = 0
+    for index in range(herb_start, herb_stop):
+        if not killed[index]:
+            num_alive += 1
+    num_uniforms = len(uniforms)
+
+    while car < carn_stop:
+        if pending >= 0:
+            if position == num_uniforms:
+                return True, position, car, herb, current_food, pending
+            _eat(
+                carn_fitness,
+                carn_weight,
+                carn_age,
+                carn_sick,
+                car,
+                herb_weight[pending],
+                uniforms[position],
+                param,
+            )
+            position += 1
+            pending = -1
+        elif herb == herb_start and num_alive == 0:
+            return False, position, carn_stop, herb, current_food, pending
+
+        while herb < herb_stop:
+            if killed[herb]:
+                herb += 1
+                continue
+            if param[0] <= current_food:
+                break
+            if position == num_uniforms:
+                return True, position, car, herb, current_food, pending
+            position += 1
+            if uniforms[position - 1] < _kill_probability(
+                carn_fitness[car], herb_fitness[herb], param[1]
+            ):
+                killed[herb] = 1
+                num_alive -= 1
+                current_food += herb_weight[herb]
+                if position == num_uniforms:
+                    return True, position, car, herb + 1, current_food, herb
+                _eat(
+                    carn_fitness,
+                    carn_weight,
+                    carn_age,
+                    carn_sick,
+                    car,
+                    herb_weight[herb],
+                    uniforms[position],
+                    param,
+                )
+                position += 1
+            herb += 1
+
+        car += 1
+        herb = herb_start
+        current_food = 0.0
+    return False, position, car, herb, current_food, pending
+
+
+def _hunt(
+    carn_fitness,
+    carn_weight,
+    carn_age,
+    carn_sick,
+    herb_fitness,
+    herb_weight,
+    killed,
+    appetite,
+    delta_phi_max,
+    beta,
+    loss_rate,
+    p_sick,
+    a_half,
+    phi_age,
+    w_half,
+    phi_weight,
+    uniforms,
+    position,
+    car,
+    herb,
+    current_food,
+    pending,
+):
+    param = (
+        float(appetite),
+        float(delta_phi_max),
+        float(beta),
+        float(loss_rate),
+        float(p_sick),
+        float(a_half),
+        float(phi_age),
+        float(w_half),
+        float(phi_weight),
+    )
+    _, position, car, herb, current_food, pending = _hunt_cells(
+        carn_fitness,
+        carn_weight,
+        carn_age,
+        carn_sick,
+        len(carn_fitness),
+        herb_fitness,
+        herb_weight,
+        killed,
+        0,
+        len(herb_fitness),
+        param,
+        uniforms,
+        position,
+        car,
+        herb,
+        float(current_food),
+        pending,
+    )
+    return position, car, herb, current_food, pending
+
+
+def _hunt_island(
+    carn_fitness,
+    carn_weight,
+    carn_age,
+    carn_sick,
+    carn_ptr,
+    herb_fitness,
+    herb_weight,
+    killed,
+    herb_ptr,
+    appetite,
+    delta_phi_max,
+    beta,
+    loss_rate,
+    p_sick,
+    a_half,
+    phi_age,
+    w_half,
+    phi_weight,
+    uniforms,
+    position,
+    cell,
+    car,
+    herb,
+    current_food,
+    pending,
+):
+    param = (
+        float(appetite),
+        float(delta_phi_max),
+        float(beta),
+        float(loss_rate),
+        float(p_sick),
+        float(a_half),
+        float(phi_age),
+        float(w_half),
+        float(phi_weight),
+    )
+    current_food = float(current_food)
+    num_cells = len(carn_ptr) - 1
+    while cell < num_cells:
+        stopped, position, car, herb, current_food, pending = _hunt_cells(
+            carn_fitness,
+            carn_weight,
+            carn_age,
+            carn_sick,
+            carn_ptr[cell + 1],
+            herb_fitness,
+            herb_weight,
+            killed,
+            herb_ptr[cell],
+            herb_ptr[cell + 1],
+            param,
+            uniforms,
+            position,
+            car,
+            herb,
+            current_food,
+            pending,
+        )
+        if stopped:
+            break
+        cell += 1
+        if cell < num_cells:
+            herb = herb_ptr[cell]
+    return position, cell, car, herb, current_food, pending
+
+
+def _numpy_kernels():
+    """
+    Returns
+    -------
+    dict
+        The kernels of the numpy backend, by name
+    """
+    return {
+        "calculate_fitness": _calculate_fitness,
+        "calculate_fitness_array": _calculate_fitness_array,
+        "det_kill": _det_kill,
+        "weighted_prob": _weighted_prob,
+        "weighted_choice": _weighted_choice,
+        "weighted_choices": _weighted_choices,
+        "death_probability": _death_probability,
+        "hunt": _hunt,
+        "hunt_island": _hunt_island,
+    }
+
+
+def _numba_kernels():
+    """
+    Returns
+    -------
+    dict
+        The kernels of the numba backend, by name
+    """
+    from numba import njit
+    from numba.extending import register_jitable
+
+    # The helpers stay Python functions, and are compiled into the kernels
+    # which call them
+    for helper in (
+        _sigmoidal,
+        _fitness,
+        _kill_probability,
+        _choose,
+        _eat,
+        _hunt_cells,
+    ):
+        register_jitable(cache=True)(helper)
+
+    compiled = {
+        "calculate_fitness": _calculate_fitness,
+        "calculate_fitness_array": _calculate_fitness_loop,
+        "det_kill": _det_kill,
+        "weighted_choice": _weighted_choice,
+        "weighted_choices": _weighted_choices_loop,
+        "death_probability": _death_probability,
+        "hunt": _hunt,
+        "hunt_island": _hunt_island,
+    }
+    kernels = _numpy_kernels()
+    for name, kernel in compiled.items():
+        kernels[name] = njit(cache=True)(kernel)
+    return kernels
+
+
+def _cython_kernels():
+    """
+    Returns
+    -------
+    dict
+        The kernels of the cython backend, by name
+    """
+    from .compute_fit import (
+        calculate_fitness,
+        calculate_fitness_array,
+        death_probability,
+    )
+    from .det_kill import det_kill
+    from .hunt import hunt, hunt_island
+    from .weighted_prob import weighted_prob, weighted_choice, weighted_choices
+
+    kernels = _numpy_kernels()
+    kernels.update(
+        calculate_fitness=calculate_fitness,
+        calculate_fitness_array=calculate_fitness_array,
+        death_probability=death_probability,
+        det_kill=det_kill,
+        weighted_prob=weighted_prob,
+        weighted_choice=weighted_choice,
+        weighted_choices=weighted_choices,
+        hunt=hunt,
+        hunt_island=hunt_island,
+    )
+    return kernels
+
+
+_LOADERS = {
+    "cython": _cython_kernels,
+    "numba": _numba_kernels,
+    "numpy": _numpy_kernels,
+}
+
+
+def load(name):
+    """
+    Loads the kernels of a backend, once.
+
+    Parameters
+    ----------
+    name: str
+        Name of the backend, one of 'BACKENDS'
+
+    Returns
+    -------
+    dict
+        The kernels of the backend, by name
+
+    Raises
+    ------
+    ImportError
+        If the backend is not available
+    """
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown kernel backend {name!r}, use one of {BACKENDS}"
+        )
+    if name not in _loaded:
+        _loaded[name] = _LOADERS[name]()
+    return _loaded[name]
+
+
+def available():
+    """
+    Returns
+    -------
+    list
+        Names of the backends which can be used here, in order of preference
+    """
+    names = []
+    for name in BACKENDS:
+        try:
+            load(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def use(name):
+    """
+    Chooses the backend of the kernels. The kernels of the backend are used
+    from the next call on.
+
+    Parameters
+    ----------
+    name: str
+        Name of the backend, one of 'BACKENDS'
+
+    Raises
+    ------
+    ImportError
+        If the backend is not available
+    """
+    global backend
+    globals().update(load(name))
+    backend = name
+
+
+def _use_default():
+    """
+    Chooses the backend named in the environment variable 'BIOSIM_KERNELS',
+    else the first available of 'BACKENDS'.
+    """
+    name = os.environ.get("BIOSIM_KERNELS")
+    if name:
+        use(name)
+        return
+    for name in BACKENDS:
+        try:
+            use(name)
+        except ImportError:
+            continue
+        return
+
+
+def __getattr__(name):
+    """
+    Chooses the default backend when a kernel, or the name of the backend,
+    is looked up before a backend has been chosen.
+
+    Parameters
+    ----------
+    name: str
+        Name of the attribute
+
+    Returns
+    -------
+    object
+        The kernel of the chosen backend, or the name of the backend
+    """
+    if name not in KERNELS + ("backend",):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    _use_default()
+    return globals()[name]
@@ -3,12 +3,16 @@
 __author__ = "Amir Arfan, Sebastian Becker"
 __email__ = "amar@nmbu.no, sebabeck@nmbu.no"
 
-from biosim.cell import Ocean, Mountain, Desert, Savannah, Jungle
+from biosim.cell import Cell, Ocean, Mountain, Desert, Savannah, Jungle
 
 # noinspection PyUnresolvedReferences
 from .animals import Herbivore, Carnivore
+from .population import IdCounter, Population
+from .migration import MigrationTable
 import numpy as np
 import itertools
+import contextlib
+import functools
 
 
 class Map:
@@ -26,7 +30,11 @@ class Map:
 
     allowed_cells = ["Jungle", "Savannah", "Desert"]
 
-    def __init__(self, map_string):
+    allowed_species = {"Herbivore": Herbivore, "Carnivore": Carnivore}
+
+    def __init__(
+        self, map_string, migration="snapshot", params=None, seed=None
+    ):
         """
         Initialises the map class instance
 
@@ -34,7 +42,50 @@ class Map:
         ----------
         map_string: string
                     String representing a map of cells
+        migration: str [default="snapshot"]
+                    Semantics of the migration, either "snapshot" where all
+                    animals see the island as it was before the migration
+                    started, or "sequential" where every animal sees the
+                    moves made before it. See :mod:`biosim.migration`.
+        params: dict [default=None]
+                    Species names and landscape letters mapped to the
+                    parameters which differ from the current parameters of
+                    the classes, e.g.
+                    ``{"Carnivore": {"F": 60}, "J": {"f_max": 700}}``
+        seed: int [default=None]
+                    Seed of the random number generators of the map, which
+                    are seeded from the operating system if None
         """
+        if migration not in MigrationTable.semantics:
+            raise ValueError(
+                f"Migration must be one of {MigrationTable.semantics}"
+            )
+        self.migration = migration
+
+        # The map has its own subclass of every specie and landscape type,
+        # holding the parameters of this map only. Every specie draws from
+        # a random number stream of its own, spawned from the seed of the
+        # map, so the draws of one specie do not shift those of the other.
+        params = {} if params is None else params
+        for key in params:
+            if key not in self.allowed_species and key not in self.dict_cells:
+                raise ValueError(
+                    f"{key} is neither a specie nor a landscape letter"
+                )
+        self.seed_sequence = np.random.SeedSequence(seed)
+        streams = self.seed_sequence.spawn(len(self.allowed_species))
+        self.allowed_species = {
+            name: specie.with_parameters(
+                params.get(name), np.random.default_rng(stream)
+            )
+            for (name, specie), stream in zip(
+                self.allowed_species.items(), streams
+            )
+        }
+        self.dict_cells = {
+            letter: cell_type.with_parameters(params.get(letter))
+            for letter, cell_type in self.dict_cells.items()
+        }
 
         self._check_even_string(map_string)
 
@@ -53,6 +104,152 @@ class Map:
             if type(cell).__name__ != "Ocean":
                 raise ValueError(f"Outer Cell is not Ocean")
 
+        # All animals on the island are stored in one population per specie,
+        # the cells refer to their own animals through their flat index.
+        id_counter = IdCounter()
+        self.populations = {
+            name: Population(specie, self.map.size, id_counter=id_counter)
+            for name, specie in self.allowed_species.items()
+        }
+        # The fodder of all cells is kept in one flat array, which the cells
+        # read and write at their flat index.
+        self.fodder = np.array(
+            [cell.current_fodder for cell in self.map.flat], dtype=float
+        )
+        for index, cell in enumerate(self.map.flat):
+            cell.attach_populations(self.populations, index)
+            cell.attach_fodder(self.fodder)
+        self.deaths = {
+            name: np.zeros(self.map.size, dtype=np.int64)
+            for name in self.populations
+        }
+
+        self._build_neighbour_index()
+
+    def _build_neighbour_index(self):
+        """
+        Builds the static neighbour index of the map, in compressed sparse
+        row form over the flat cell indices. Only habitable cells have
+        neighbours, and only habitable neighbours are listed, ordered north,
+        south, west and east as in :meth:`get_neighbour`.
+
+        The neighbours of cell 'i' are
+        ``neighbour_indices[neighbour_ptr[i]:neighbour_ptr[i + 1]]``, and
+        ``neighbour_directions`` gives the position (0 to 3) each of them
+        has in that order. The index is built when the map is created, and
+        must be built again if the geography of the map is changed.
+
+        Also builds ``habitable_cells``, the flat indices of all cells
+        animals can live in, which the phases of the annual cycle loop over
+        instead of testing the type of every cell.
+
+        """
+        y_lim, x_lim = self.map.shape
+        cells = self._cells = list(self.map.flat)
+        self._habitable = np.array(
+            [type(cell).__name__ in self.allowed_cells for cell in cells]
+        )
+        self.habitable_cells = np.flatnonzero(self._habitable)
+
+        # Habitable cells never lie on the edge, which is all Ocean
+        offsets = (-x_lim, x_lim, -1, 1)
+        self._neighbour_lists = []
+        directions = []
+        for index in range(len(cells)):
+            neighbours = []
+            if self._habitable[index]:
+                for direction, offset in enumerate(offsets):
+                    if self._habitable[index + offset]:
+                        neighbours.append(index + offset)
+                        directions.append(direction)
+            self._neighbour_lists.append(neighbours)
+
+        self._neighbour_cells = [
+            [cells[neighbour] for neighbour in neighbours]
+            for neighbours in self._neighbour_lists
+        ]
+        self.neighbour_ptr = np.zeros(len(cells) + 1, dtype=np.intp)
+        self.neighbour_ptr[1:] = np.cumsum(
+            [len(neighbours) for neighbours in self._neighbour_lists]
+        )
+        self.neighbour_indices = np.array(
+            list(itertools.chain.from_iterable(self._neighbour_lists)),
+            dtype=np.intp,
+        )
+        self.neighbour_directions = np.array(directions, dtype=np.intp)
+
+    def occupied_cells(self, *species):
+        """
+        Finds the cells with animals in them. The populations keep the
+        occupied cells of every specie up to date as they are committed, see
+        :attr:`biosim.population.Population.occupied`, so this does not need
+        to look at the cells.
+
+        Parameters
+        ----------
+        species: str
+            Names of the species to look for, all species if none are given
+
+        Returns
+        -------
+        array
+            Flat indices of the cells holding at least one animal of the
+            given species, in increasing order
+        """
+        occupied = [
+            self.populations[name].occupied
+            for name in species or self.populations
+        ]
+        if len(occupied) == 1:
+            return occupied[0]
+        return functools.reduce(np.union1d, occupied)
+
+    def neighbours(self, index):
+        """
+        Looks up the habitable neighbours of a cell in the neighbour index.
+
+        Parameters
+        ----------
+        index: int
+            Flat index of the cell
+
+        Returns
+        -------
+        list
+            Flat indices of the habitable neighbouring cells, empty for
+            cells which are not habitable
+        """
+        return self._neighbour_lists[index]
+
+    @contextlib.contextmanager
+    def _batch(self, draws=False, by_rows=True):
+        """
+        Context manager which lets all cells change the populations during a
+        phase of the annual cycle, and commits the populations once at the
+        end of the phase.
+
+        Parameters
+        ----------
+        draws: bool [default=False]
+            If True, the random numbers of the phase are handed out by the
+            draws of the populations, see :class:`biosim.draws.UniformDraws`
+        by_rows: bool [default=True]
+            If True, one uniform random number is drawn for every animal at
+            the start of the phase. Phases which only take numbers in
+            sequence, as the hunt, do not need them.
+
+        """
+        with contextlib.ExitStack() as stack:
+            for population in self.populations.values():
+                stack.enter_context(population.batch())
+                if draws:
+                    stack.enter_context(
+                        population.draws.phase(
+                            population.size if by_rows else 0
+                        )
+                    )
+            yield
+
     @staticmethod
     def _check_even_string(map_string):
         """
@@ -69,8 +266,7 @@ class Map:
                 raise ValueError("The lines are not uniform")
             prev_line_length = line_length
 
-    @classmethod
-    def map_factory(cls, list_to_alter):
+    def map_factory(self, list_to_alter):
         """
         A map factory function which transforms a list containing strings into
         a list containing cell instances.
@@ -91,9 +287,9 @@ class Map:
         temp_list = []
         for letter in list_to_alter:
             # Only cell types which are allowed can be transformed
-            if letter not in cls.dict_cells.keys():
+            if letter not in self.dict_cells.keys():
                 raise ValueError(f"{letter} is not an allowed cell type")
-            temp_list.append(cls.dict_cells[letter]())
+            temp_list.append(self.dict_cells[letter]())
 
         return temp_list
 
@@ -158,71 +354,283 @@ class Map:
 
     def move_all_animals(self):
         """
-        Moves all animals in the map, using the migration function from
-        'cell.py'
+        Moves all animals in the map. The move probabilities of all cells
+        are computed once at the start of the migration, see
+        :class:`biosim.migration.MigrationTable`.
+
+        With snapshot semantics the migration is staged: the moves of all
+        animals of all species are decided first, see :meth:`stage_moves`,
+        and then applied with one move and one commit per specie. Which
+        animals move, and where, does not depend on the order of the cells.
+        With sequential semantics the animals move cell by cell, using the
+        migration function from 'cell.py'.
+
+        """
 
+        self.update_fitness_all_animals()
+        move_table = MigrationTable(self, self.migration)
+        if move_table.sequential:
+            with self._batch(draws=True):
+                for index in self.occupied_cells():
+                    self._cells[index].migration(
+                        self._neighbour_cells[index], move_table
+                    )
+            for population in self.populations.values():
+                population.has_migrated[:] = False
+            return
+
+        moves = {
+            name: self.stage_moves(name, move_table)
+            for name in self.populations
+        }
+        for name, (rows, destinations) in moves.items():
+            population = self.populations[name]
+            population.move(rows, destinations, commit=True)
+
+    def stage_moves(self, name, move_table):
         """
+        Decides which animals of a specie move, and where, without moving
+        them. One random number is drawn for every animal to decide whether
+        it moves, and one for every moving animal to choose its destination.
 
-        y_lim, x_lim = np.shape(self.map)
-        for y in range(y_lim):
-            for x in range(x_lim):
-                loc = y, x
-                self.map[loc].migration(self.get_neighbour((y, x)))
+        Parameters
+        ----------
+        name: str
+            Name of the specie
+        move_table: MigrationTable
+            Move probabilities of the map at the start of the migration
+
+        Returns
+        -------
+        tuple
+            Row numbers of the moving animals, and the flat index of the cell
+            each of them moves to
+        """
+        population = self.populations[name]
+        population.commit()
+        specie = population.species
+        rows = np.flatnonzero(
+            specie.rng.random(population.size)
+            < specie._move_probability(population.refresh_fitness())
+        )
+        destinations = move_table.destinations(
+            name, population.cell[rows], specie.rng.random(len(rows))
+        )
+        moving = destinations >= 0
+        return rows[moving], destinations[moving]
+
+    def update_fitness_all_animals(self):
+        """
+
+        Recomputes the fitness of every animal whose weight or age has
+        changed, one vectorized pass per specie. Called at the start of the
+        phases which use the fitness, so the cells find it up to date.
+
+        """
+        for population in self.populations.values():
+            population.refresh_fitness()
 
     def all_animals_eat(self):
         """
 
-        Feeds all animals on the map using eat_herbivore and eat_carnivore
-        functions from 'cell.py'
+        Feeds all animals on the map, the herbivores with
+        :meth:`feed_herbivores` and the carnivores using the eat_carnivore
+        function from 'cell.py'. The fodder grows in every habitable cell,
+        and the animals only eat in the cells they are in. All herbivores
+        eat before the carnivores hunt, which is the same as feeding cell by
+        cell, since the feeding in one cell does not affect the other cells.
+
+
+        """
+        for index in self.habitable_cells:
+            self._cells[index].gen_fodder()
+
+        self.feed_herbivores()
+
+        self.update_fitness_all_animals()
+        with self._batch(draws=True, by_rows=False):
+            for index in self.occupied_cells("Carnivore"):
+                self._cells[index].eat_carnivore()
+
+    def feed_herbivores(self):
+        """
+        Feeds the herbivores of all cells at once. Works like
+        'eat_herbivore' in 'cell.py' for every cell: the herbivores of every
+        cell are ranked by fitness with one sort of the whole population,
+        the portion of each herbivore follows in closed form from its rank
+        and the fodder of its cell, and the weight gain and sickness of all
+        eaters are applied in one vectorized step.
+
+        """
+        self.fodder[:] = self.feed_herbivores_on(self.fodder)
+
+    def feed_herbivores_on(self, fodder):
+        """
+        Feeds the herbivores of all cells at once from the given fodder, see
+        :meth:`feed_herbivores`, without reading or changing the fodder of
+        the cells.
 
+        Parameters
+        ----------
+        fodder: array
+            Fodder available in every cell of the map, by flat index
 
+        Returns
+        -------
+        array
+            Fodder left in every cell after the herbivores have eaten
         """
-        for cell in itertools.chain.from_iterable(self.map):
-            if type(cell).__name__ in self.allowed_cells:
-                cell.gen_fodder()
-                cell.eat_herbivore()
-                cell.eat_carnivore()
+        population = self.populations["Herbivore"]
+        population.commit()
+        specie = population.species
+        fitness = population.refresh_fitness()
+        cells = population.cell
+        counts = population.counts
+
+        # Sorted by cell, and the fittest first within each cell
+        order = np.lexsort((-fitness, cells))
+        starts = np.cumsum(counts) - counts
+        rank = np.empty(population.size, dtype=np.int64)
+        rank[order] = np.arange(population.size) - starts[cells[order]]
+
+        eats, portions = specie._portions(fodder[cells], rank)
+        uniform = specie.rng.random(population.size)
+
+        eaters = order[eats[order]]
+        Cell._feed(population, eaters, portions[eaters], uniform[eaters])
+        population.commit()
+        return specie._fodder_left(fodder, counts)
 
     def mate_all_animals(self):
         """
-        Mates all animals on the map using the mating function from 'cell.py'
+        Lets the animals of every specie give birth, for all animals of a
+        specie on the map at once. Works like 'mating' in 'cell.py' for every
+        cell: the probability of birth uses the number of animals of the
+        specie in the cell of each mother at the start of the phase, the
+        weights of all newborns are drawn in one call, mothers which would
+        lose more than their own weight do not give birth, and the newborns
+        are appended to the population in one batch.
 
 
         """
-        for cell in itertools.chain.from_iterable(self.map):
-            if type(cell).__name__ in self.allowed_cells:
-                cell.mating()
+        self.update_fitness_all_animals()
+        for population in self.populations.values():
+            specie = population.species
+            cells = population.cell
+            prob_birth = specie._birth_probability(
+                population.weight,
+                population.fitness,
+                population.counts[cells],
+            )
+            mothers = np.flatnonzero(
+                specie.rng.random(population.size) < prob_birth
+            )
+
+            child_weight = specie._normal_weight(len(mothers))
+            weight_loss = specie.param.xi * child_weight
+            can_give_birth = weight_loss <= population.weight[mothers]
+            mothers = mothers[can_give_birth]
+            weight_loss = weight_loss[can_give_birth]
+
+            population.set_weight(
+                mothers, population.weight[mothers] - weight_loss
+            )
+            population.add(cells[mothers], 0, child_weight[can_give_birth])
+            population.commit()
 
     def age_all_animals(self):
         """
 
-        Ages all animals with one year, using the aging function from 'cell.py'
+        Ages all animals with one year, one vectorized pass per specie, see
+        :meth:`biosim.population.Population.grow_older`.
 
         """
-        for cell in itertools.chain.from_iterable(self.map):
-            if type(cell).__name__ in self.allowed_cells:
-                cell.aging()
+        for population in self.populations.values():
+            population.grow_older(0.0)
 
     def annual_weight_loss_all_animals(self):
         """
 
-        Makes all animals lose their annual amount of weigh using
-        the annual_weight_loss function from 'cell.py'
+        Makes all animals lose their annual amount of weight, one vectorized
+        pass per specie, see :meth:`biosim.population.Population.grow_older`.
+
+        """
+        for population in self.populations.values():
+            population.grow_older(population.species.param.eta, years=0)
+
+    def age_and_weight_loss_all_animals(self):
+        """
+
+        Ages all animals with one year and makes them lose their annual
+        amount of weight, fused into a single pass per specie which also
+        recomputes the fitness, so the death phase finds it up to date.
 
         """
-        for cell in itertools.chain.from_iterable(self.map):
-            if type(cell).__name__ in self.allowed_cells:
-                cell.annual_weight_loss()
+        for population in self.populations.values():
+            population.grow_older(population.species.param.eta)
 
     def annual_death_all_animals(self):
         """
 
-        Checks all animals annual death, by using annual_death from 'cell.py'
+        Decides which animals die, for all animals of a specie on the map at
+        once. The probabilities of death are computed from the fitness of
+        the whole population, one random number is drawn for every animal,
+        and the survivors are compacted in one pass when the population is
+        committed. Works like 'annual_death' in 'cell.py' for every cell.
+
+        The number of animals which died in every cell is kept in 'deaths',
+        see :meth:`death_grid`.
+
+        """
+        self.update_fitness_all_animals()
+        for name, population in self.populations.items():
+            specie = population.species
+            death_prob = specie._death_probability(population.fitness)
+            dead = np.flatnonzero(
+                specie.rng.random(population.size) < death_prob
+            )
+            self.deaths[name] = np.bincount(
+                population.cell[dead], minlength=self.map.size
+            )
+            population.remove(dead)
+            population.commit()
+
+    def count_grid(self):
+        """
+
+        Gives the number of animals of every specie in every cell, read from
+        the per-cell counts the populations keep up to date.
+
+        Returns
+        -------
+        array
+            Integer array of shape (rows, columns, number of species), where
+            the last axis follows the order of 'allowed_species'
+
+        """
+        counts = np.stack(
+            [population.counts for population in self.populations.values()],
+            axis=-1,
+        )
+        return counts.reshape(self.map.shape + (len(self.populations),))
+
+    def death_grid(self):
+        """
+
+        Gives the number of animals of every specie which died in every cell
+        in the last death phase, see :meth:`annual_death_all_animals`.
+
+        Returns
+        -------
+        array
+            Integer array of shape (rows, columns, number of species), where
+            the last axis follows the order of 'allowed_species'
 
         """
-        for cell in itertools.chain.from_iterable(self.map):
-            if type(cell).__name__ in self.allowed_cells:
-                cell.annual_death()
+        deaths = np.stack(
+            [self.deaths[name] for name in self.populations], axis=-1
+        )
+        return deaths.reshape(self.map.shape + (len(self.populations),))
 
     def num_species_on_map(self):
         """
@@ -237,21 +645,15 @@ class Map:
             The amount of carnivores on the map
 
         """
-        # tot_herbivores = 0
-        # tot_carnivores = 0
-        # for cells in itertools.chain.from_iterable(self.map):
-        #     curr_herbivore, curr_carnivore = cells.num_species_per_cell()
-        #     tot_herbivores += curr_herbivore
-        #     tot_carnivores += curr_carnivore
+        tot_herbivores = len(self.populations["Herbivore"])
+        tot_carnivores = len(self.populations["Carnivore"])
+        return tot_herbivores, tot_carnivores
 
-        return (sum(x) for x in zip(*[cells.num_species_per_cell() for cells in itertools.chain.from_iterable(self.map)]))
-
-        # (sum(x) for x in zip(*[cells.num_species_per_cell() for cells in itertools.chain.from_iterable(self.map)]))
-    @staticmethod
-    def update_animal_params_all_cells(specie, params):
+    def update_animal_params_all_cells(self, specie, params):
         """
 
-        Updates parameters for specified specie in all cells.
+        Updates parameters for specified specie in all cells. Only the
+        parameters of this map are changed.
 
         Parameters
         ----------
@@ -262,13 +664,18 @@ class Map:
 
 
         """
-
-        eval(specie).update_parameters(params)
+        if specie not in self.allowed_species:
+            raise ValueError(f"{specie} is not an allowed specie")
+        self.allowed_species[specie].update_parameters(params)
+        # The fitness depends on the parameters
+        population = self.populations[specie]
+        population.stale[:] = True
 
     def update_param_all_cells(self, landscape, params):
         """
 
         Updates parameters for all cells which are specified to be updated.
+        Only the parameters of this map are changed.
 
         Parameters
         ----------
@@ -279,8 +686,9 @@ class Map:
 
 
         """
-        cell_type = self.dict_cells[landscape]
-        cell_type.update_parameters(params)
+        if landscape not in self.dict_cells:
+            raise ValueError(f"{landscape} is not an allowed cell type")
+        self.dict_cells[landscape].update_parameters(params)
 
     def cycle(self):
         """
@@ -290,6 +698,5 @@ class Map:
         self.all_animals_eat()
         self.mate_all_animals()
         self.move_all_animals()
-        self.age_all_animals()
-        self.annual_weight_loss_all_animals()
+        self.age_and_weight_loss_all_animals()
         self.annual_death_all_animals()
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Tables of migration probabilities for every cell of the island.
+
+Instead of computing the propensity of the neighbouring cells once for every
+animal which moves, a ``MigrationTable`` computes the probability to move from
+every cell to each of its habitable neighbours in one vectorized pass at the
+start of the migration. The probabilities are stored along the neighbour index
+of the map, see :meth:`biosim.map.Map._build_neighbour_index`, together with
+their cumulative sums for every cell. Destinations are chosen from the
+cumulative sums for many animals at once, see :meth:`MigrationTable.choose`.
+
+Two semantics are supported:
+
+* ``"snapshot"`` (default): the table is computed once from the island as it
+  is before the migration starts, and is not changed while the animals move.
+  The map decides the moves of all animals from the table before any animal
+  moves, see :meth:`MigrationTable.destinations`, and then moves them all at
+  once. The moves do not depend on the order the cells are visited in.
+* ``"sequential"``: the table follows the animals as they move. After
+  every move the propensity of the two cells involved, and the probabilities
+  of their neighbours, are marked as out of date, and are recomputed when an
+  animal next looks them up. Every animal sees the island exactly as it is
+  when it moves, as when computing the propensities for every animal, so the
+  moves are made cell by cell, see :meth:`biosim.cell.Cell.migration`.
+
+"""
+
+from . import kernels
+import itertools
+import numpy as np
+
+
+class MigrationTable:
+    """
+    Probability to move from every cell of a map to each of its habitable
+    neighbours, for every specie.
+
+    The probabilities of cell 'i' are stored in
+    ``probabilities[specie][ptr[i]:ptr[i + 1]]``, in the order of the
+    neighbours given by :meth:`biosim.map.Map.neighbours`, and their
+    cumulative sums in ``cumulative[specie][ptr[i]:ptr[i + 1]]``.
+    """
+
+    semantics = ("snapshot", "sequential")
+
+    def __init__(self, island_map, semantics="snapshot"):
+        """
+        Computes the table for the current state of the map.
+
+        Parameters
+        ----------
+        island_map: Map
+            The map the animals migrate on
+        semantics: str [default="snapshot"]
+            Either "snapshot" or "sequential", see the module documentation
+        """
+        if semantics not in self.semantics:
+            raise ValueError(
+                f"Migration semantics must be one of {self.semantics}"
+            )
+        self.sequential = semantics == "sequential"
+
+        self.shape = island_map.map.shape
+        self._cells = list(island_map.map.flat)
+        self._populations = island_map.populations
+        self._species = island_map.allowed_species
+        self._neighbours = island_map.neighbours
+        self._ptr = island_map.neighbour_ptr.tolist()
+        self._ptr_array = island_map.neighbour_ptr
+        self._indices = island_map.neighbour_indices
+        self._directions = island_map.neighbour_directions
+        self._rows = np.repeat(
+            np.arange(len(self._cells)), np.diff(island_map.neighbour_ptr)
+        )
+        self._fodder = island_map.fodder.copy()
+        cell_names = [type(cell).__name__ for cell in self._cells]
+
+        self._habitable = {}
+        self._propensity = {}
+        self.probabilities = {}
+        self.cumulative = {}
+        self._stale_propensity = {}
+        self._stale_probabilities = {}
+        for name, specie in self._species.items():
+            habitable = np.isin(cell_names, specie.allowed_landscape)
+            self._habitable[name] = habitable
+            propensity = self._compute_propensity(name)
+            self.probabilities[name] = self._probabilities(propensity)
+            self.cumulative[name] = self._cumulative(self.probabilities[name])
+            # Plain lists are faster than arrays for the lookups of single
+            # cells made while the animals move.
+            self._propensity[name] = propensity.tolist()
+            self._stale_propensity[name] = [False] * habitable.size
+            self._stale_probabilities[name] = [False] * habitable.size
+
+        # A move changes the counts of the moving specie, and a Herbivore
+        # also changes the food of the Carnivores.
+        self._depending_species = {
+            "Herbivore": list(self._species),
+            "Carnivore": ["Carnivore"],
+        }
+
+    def _compute_propensity(self, name, cells=slice(None)):
+        """
+        Computes the propensity of a specie to move into the given cells.
+
+        Parameters
+        ----------
+        name: str
+            Name of the specie
+        cells: array or slice [default=all cells]
+            Flat indices of the cells
+
+        Returns
+        -------
+        array
+            The propensity to move into each cell
+        """
+        specie = self._species[name]
+        food = specie._available_food(
+            self._fodder[cells], self._populations["Herbivore"].biomass[cells]
+        )
+        return specie._propensity_array(
+            food,
+            self._populations[name].counts[cells],
+            self._habitable[name][cells],
+        )
+
+    def _probabilities(self, propensity):
+        """
+        Computes the probabilities to move out of every cell from the
+        propensity of its neighbours.
+
+        Parameters
+        ----------
+        propensity: array
+            Propensity to move into every cell of the map
+
+        Returns
+        -------
+        array
+            The probability to move to every neighbour in the neighbour
+            index, zero for all neighbours of a cell if their propensities
+            sum to zero
+        """
+        neighbours = propensity[self._indices]
+        total = np.bincount(
+            self._rows, weights=neighbours, minlength=len(self._cells)
+        )[self._rows]
+        return np.divide(
+            neighbours,
+            total,
+            out=np.zeros_like(neighbours),
+            where=total > 0,
+        )
+
+    def _cumulative(self, probabilities):
+        """
+        Sums up the probabilities of every cell, adding them in the same
+        order as when summing up the probabilities of a single cell.
+
+        Parameters
+        ----------
+        probabilities: array
+            Probability to move to every neighbour in the neighbour index
+
+        Returns
+        -------
+        array
+            The cumulative probabilities of every cell
+        """
+        cumulative = probabilities.copy()
+        offsets = np.arange(len(cumulative)) - self._ptr_array[self._rows]
+        for offset in range(1, offsets.max(initial=0) + 1):
+            positions = np.flatnonzero(offsets == offset)
+            cumulative[positions] += cumulative[positions - 1]
+        return cumulative
+
+    def grid(self, name):
+        """
+        Returns the probabilities of a specie arranged as the map.
+
+        Parameters
+        ----------
+        name: str
+            Name of the specie
+
+        Returns
+        -------
+        array
+            Array of shape (rows, columns, 4) with the probability to move
+            from every cell to its neighbours to the north, south, west and
+            east, zero for cells which cannot be moved into
+        """
+        grid = np.zeros((len(self._cells), 4))
+        grid[self._rows, self._directions] = self.probabilities[name]
+        return grid.reshape(self.shape + (4,))
+
+    def move_probabilities(self, name, index):
+        """
+        Looks up the probability to move from a cell to each of its
+        habitable neighbours, recomputing it first if it is out of date.
+
+        Parameters
+        ----------
+        name: str
+            Name of the specie
+        index: int
+            Flat index of the cell
+
+        Returns
+        -------
+        list
+            Probability to move to each neighbouring cell
+        """
+        start, stop = self._ptr[index], self._ptr[index + 1]
+        if not self._stale_probabilities[name][index]:
+            return self.probabilities[name][start:stop].tolist()
+
+        propensity = self._propensity[name]
+        stale = self._stale_propensity[name]
+        specie = self._species[name]
+        cell_propensity = []
+        for neighbour in self._neighbours(index):
+            if stale[neighbour]:
+                propensity[neighbour] = specie.propensity(
+                    self._cells[neighbour]
+                )
+                stale[neighbour] = False
+            cell_propensity.append(propensity[neighbour])
+
+        total_propensity = sum(cell_propensity)
+        if total_propensity > 0:
+            move_prob = [prop / total_propensity for prop in cell_propensity]
+        else:
+            move_prob = [0.0] * len(cell_propensity)
+        self.probabilities[name][start:stop] = move_prob
+        self.cumulative[name][start:stop] = list(
+            itertools.accumulate(move_prob)
+        )
+        self._stale_probabilities[name][index] = False
+        return move_prob
+
+    def can_move(self, name, index):
+        """
+        Parameters
+        ----------
+        name: str
+            Name of the specie
+        index: int
+            Flat index of the cell
+
+        Returns
+        -------
+        bool
+            True if the animals in the cell can move to at least one of its
+            neighbours
+        """
+        if self._stale_probabilities[name][index]:
+            self.move_probabilities(name, index)
+        start, stop = self._ptr[index], self._ptr[index + 1]
+        return start < stop and self.cumulative[name][stop - 1] > 0
+
+    def choose_one(self, name, index, uniform):
+        """
+        Chooses the neighbour a single animal moves to, with the
+        compiled 'weighted_choice' kernel. Use :meth:`can_move` first to
+        make sure that the animal can move.
+
+        Parameters
+        ----------
+        name: str
+            Name of the specie
+        index: int
+            Flat index of the cell the animal is in
+        uniform: float
+            Uniform random number in [0, 1) drawn for the animal
+
+        Returns
+        -------
+        int
+            Position of the chosen cell among the neighbours of the cell
+        """
+        return kernels.weighted_choice(
+            self.cumulative[name],
+            self._ptr[index],
+            self._ptr[index + 1],
+            uniform,
+        )
+
+    def choose(self, name, cells, uniforms):
+        """
+        Chooses the neighbour every animal moves to, in one call of the
+        compiled 'weighted_choices' kernel. Probabilities which are out of
+        date are recomputed first.
+
+        Parameters
+        ----------
+        name: str
+            Name of the specie
+        cells: array
+            Flat index of the cell every animal is in
+        uniforms: array
+            Uniform random number in [0, 1) drawn for every animal
+
+        Returns
+        -------
+        array
+            Position of the chosen cell among the neighbours of the cell of
+            every animal, -1 for animals which cannot move
+        """
+        cells = np.asarray(cells, dtype=np.intp)
+        stale = self._stale_probabilities[name]
+        for index in set(cells.tolist()):
+            if stale[index]:
+                self.move_probabilities(name, index)
+
+        choices = np.empty(len(cells), dtype=np.intp)
+        kernels.weighted_choices(
+            self.cumulative[name],
+            self._ptr_array,
+            cells,
+            np.asarray(uniforms, dtype=float),
+            choices,
+        )
+        return choices
+
+    def moved(self, name, source, destination):
+        """
+        Marks the parts of the table which change when an animal moves from
+        one cell to another as out of date. Does nothing for snapshot
+        semantics.
+
+        Parameters
+        ----------
+        name: str
+            Name of the specie of the animal
+        source: int
+            Flat index of the cell the animal left
+        destination: int
+            Flat index of the cell the animal moved into
+        """
+        if not self.sequential:
+            return
+
+        for specie in self._depending_species[name]:
+            stale_propensity = self._stale_propensity[specie]
+            stale_probabilities = self._stale_probabilities[specie]
+            for cell in (source, destination):
+                stale_propensity[cell] = True
+                for neighbour in self._neighbours(cell):
+                    stale_probabilities[neighbour] = True
+
+    def destinations(self, name, cells, uniforms):
+        """
+        Chooses the cell every animal moves to, see :meth:`choose`.
+
+        Parameters
+        ----------
+        name: str
+            Name of the specie
+        cells: array
+            Flat index of the cell every animal is in
+        uniforms: array
+            Uniform random number in [0, 1) drawn for every animal
+
+        Returns
+        -------
+        array
+            Flat index of the cell every animal moves to, -1 for animals
+            which cannot move
+        """
+        cells = np.asarray(cells, dtype=np.intp)
+        choices = self.choose(name, cells, uniforms)
+        return np.where(
+            choices >= 0,
+            self._indices[self._ptr_array[cells] + np.maximum(choices, 0)],
+            -1,
+        )
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Immutable parameter sets for animals and landscapes.
+
+The parameters of a specie or a landscape are stored in a ``Parameters``
+object, which is validated when it is created and cannot be changed
+afterwards. Updating parameters creates a new object with :meth:`replace`, so
+an object which is shared, e.g. between the default parameters of a class and
+the parameters of a simulation, never changes behind the back of its users.
+
+The parameters are read as attributes, ``param.F``, in the annual cycle, and
+with their names, ``param["F"]``, elsewhere. Parameters whose names are Python
+keywords get an underscore appended as attribute, e.g. ``param.lambda_``.
+Constants derived from the parameters are computed once, when the object is
+created.
+
+"""
+
+import collections.abc
+import keyword
+
+
+class Parameters(collections.abc.Mapping):
+    """
+    Immutable, validated mapping of parameter names to values.
+    """
+
+    def __init__(self, values=None):
+        """
+        Parameters
+        ----------
+        values: dict [default=None]
+            Parameter names mapped to their values
+        """
+        values = {} if values is None else dict(values)
+        for name, value in values.items():
+            self._check(name, value)
+        object.__setattr__(self, "_values", values)
+        for name, value in values.items():
+            object.__setattr__(self, self.attribute_name(name), value)
+        for name, value in self._derived().items():
+            object.__setattr__(self, name, value)
+
+    @staticmethod
+    def attribute_name(name):
+        """
+        Parameters
+        ----------
+        name: str
+            Name of a parameter
+
+        Returns
+        -------
+        str
+            Name of the attribute holding the parameter
+        """
+        return name + "_" if keyword.iskeyword(name) else name
+
+    def _check(self, name, value):
+        """
+        Checks the value of a single parameter, raises a ValueError if it is
+        not allowed.
+
+        Parameters
+        ----------
+        name: str
+            Name of the parameter
+        value: int or float
+            Value of the parameter
+        """
+        if value < 0:
+            raise ValueError(f"Invalid input: {name} is of non-positive value")
+
+    def _derived(self):
+        """
+        Returns
+        -------
+        dict
+            Names mapped to the constants derived from the parameters
+        """
+        return {}
+
+    def replace(self, new_par_dict):
+        """
+        Creates a new parameter set where some of the parameters are
+        changed. The parameter set itself is not changed.
+
+        Parameters
+        ----------
+        new_par_dict: dict
+            Parameter names mapped to their new values, all names must be
+            parameters of this set
+
+        Returns
+        -------
+        Parameters
+            The new, validated parameter set
+        """
+        for par in new_par_dict:
+            if par not in self._values:
+                raise ValueError(
+                    f"Invalid input: {par} is not a key in class parameters"
+                )
+        return type(self)({**self._values, **new_par_dict})
+
+    def copy(self):
+        """
+        Returns
+        -------
+        dict
+            The parameters as a plain, mutable dictionary
+        """
+        return dict(self._values)
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} objects are immutable")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._values!r})"
+
+
+class LandscapeParameters(Parameters):
+    """
+    Parameters of a landscape type, all of which must be non-negative.
+    """
+
+
+class AnimalParameters(Parameters):
+    """
+    Parameters of an animal specie.
+
+    All parameters must be non-negative, except 'DeltaPhiMax' which is not
+    used by species which do not hunt, and 'eta' and 'p_sick' are at most
+    one. Derived constants:
+
+    * ``min_birth_weight``: :math:`\\zeta (w_{birth} + \\sigma_{birth})`, the
+      weight an animal must have to give birth.
+    """
+
+    _strictly_positive = ()
+    _at_most_one = ("eta", "p_sick")
+
+    def _check(self, name, value):
+        if name in self._strictly_positive:
+            if value <= 0:
+                raise ValueError(f"{name} must be strictly positive")
+        elif value < 0 and name != "DeltaPhiMax":
+            raise ValueError(f"{name} must be positive")
+        if value > 1 and name in self._at_most_one:
+            raise ValueError(f"{name} must be less or equal to 1")
+
+    def _derived(self):
+        if not {"zeta", "w_birth", "sigma_birth"} <= self._values.keys():
+            return {}
+        return {
+            "min_birth_weight": self.zeta * (self.w_birth + self.sigma_birth)
+        }
+
+
+class CarnivoreParameters(AnimalParameters):
+    """
+    Parameters of a hunting specie, where 'DeltaPhiMax' must be strictly
+    positive.
+    """
+
+    _strictly_positive = ("DeltaPhiMax",)
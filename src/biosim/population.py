@@ -0,0 +1,715 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Columnar storage for the animals on the island.
+
+All animals of one specie are stored in a single ``Population``, where every
+attribute is a NumPy array with one entry per animal. The rows are kept
+grouped by the cell they live in, so that a cell can address its animals as a
+contiguous range of rows.
+
+"""
+
+import contextlib
+import numpy as np
+
+from .draws import UniformDraws
+
+
+def _column(name, doc):
+    """
+    Creates a property giving access to the used part of a column.
+
+    Parameters
+    ----------
+    name: str
+        Name of the column
+    doc: str
+        Docstring of the property
+
+    Returns
+    -------
+    property
+        Property returning a view of the column, which can be written to
+
+    """
+
+    def getter(self):
+        return self._data[name][: self._size]
+
+    return property(getter, doc=doc)
+
+
+class IdCounter:
+    """
+    Hands out the unique ids of animals. The populations of a map share one
+    counter, so that the ids of a simulation do not depend on what else ran
+    in the same process, and animals keep their ids when they move between
+    the populations.
+    """
+
+    def __init__(self):
+        self.next_id = 0
+
+    def take(self, size):
+        """
+        Parameters
+        ----------
+        size: int
+            Number of ids to take
+
+        Returns
+        -------
+        int
+            The first of 'size' consecutive unused ids
+        """
+        first = self.next_id
+        self.next_id += size
+        return first
+
+
+class Population:
+    """
+    Structure-of-arrays store holding every animal of a single specie.
+
+    Removals and moves between cells are deferred, and are only applied to
+    the arrays when the population is committed. While the population is
+    inside a batch, see :meth:`batch`, committing is postponed until the
+    batch is finished, which lets a whole phase of the annual cycle run
+    before the rows are compacted and grouped by cell again.
+    """
+
+    _dtypes = {
+        "ids": np.int64,
+        "age": np.int64,
+        "weight": np.float64,
+        "fitness": np.float64,
+        "stale": np.bool_,
+        "has_migrated": np.bool_,
+        "is_sick": np.bool_,
+        "alive": np.bool_,
+        "cell": np.intp,
+    }
+
+    ids = _column("ids", "Unique identifier of every animal.")
+    age = _column("age", "Age of every animal.")
+    weight = _column("weight", "Weight of every animal.")
+    fitness = _column(
+        "fitness", "Last computed fitness, only valid where 'stale' is False."
+    )
+    stale = _column("stale", "True where the fitness must be recomputed.")
+    has_migrated = _column(
+        "has_migrated", "True for animals which have moved this year."
+    )
+    is_sick = _column("is_sick", "True for animals which got sick eating.")
+    alive = _column("alive", "False for removed rows awaiting compaction.")
+    cell = _column("cell", "Index of the cell every animal lives in.")
+
+    def __init__(self, species, n_cells=1, capacity=8, id_counter=None):
+        """
+        Initialises an empty population.
+
+        Parameters
+        ----------
+        species: class
+            The animal class (Herbivore or Carnivore) stored in the population
+        n_cells: int
+            Number of cells the animals can be spread over
+        capacity: int
+            Number of rows to allocate up front
+        id_counter: IdCounter [default=None]
+            Counter the ids of new animals are taken from, shared with other
+            populations, a counter of its own if None
+        """
+        self.species = species
+        self.n_cells = n_cells
+        self.id_counter = IdCounter() if id_counter is None else id_counter
+        self.generation = 0
+        # Counts the commits, which are the only changes moving rows
+        self.commits = 0
+        # Random numbers for the decisions made for single animals
+        self.draws = UniformDraws(species.rng)
+
+        self._data = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in self._dtypes.items()
+        }
+        self._size = 0
+        self._grouped = 0
+        self._offsets = np.zeros(n_cells + 1, dtype=np.intp)
+        self._counts = np.zeros(n_cells, dtype=np.int64)
+        self._biomass = np.zeros(n_cells, dtype=np.float64)
+        self._num_alive = 0
+        self._arrivals = {}
+        self._pending = False
+        self._moved = False
+        self._batch_depth = 0
+        self._id_index = None
+        self._occupied = None
+
+    def __len__(self):
+        """
+        Returns
+        -------
+        int
+            The number of living animals in the population
+        """
+        return self._num_alive
+
+    @property
+    def size(self):
+        """Number of used rows, including removed rows not yet compacted."""
+        return self._size
+
+    @property
+    def counts(self):
+        """Number of living animals in every cell, as an array."""
+        return self._counts
+
+    @property
+    def biomass(self):
+        """Total weight of the living animals in every cell, as an array."""
+        return self._biomass
+
+    @property
+    def occupied(self):
+        """
+        Flat indices of the cells holding living animals, in increasing
+        order. Computed by every commit, and again only if the animals
+        changed since then.
+        """
+        if self._occupied is None or self._occupied[0] != self.generation:
+            self._occupied = self.generation, np.flatnonzero(self._counts)
+        return self._occupied[1]
+
+    def count(self, index):
+        """
+        Returns the number of living animals in a cell.
+
+        Parameters
+        ----------
+        index: int
+            Index of the cell
+
+        Returns
+        -------
+        int
+            Amount of animals in the cell
+        """
+        return int(self._counts[index])
+
+    def _reserve(self, extra):
+        """
+        Makes sure there is room for 'extra' more rows, growing all columns
+        geometrically if needed.
+
+        Parameters
+        ----------
+        extra: int
+            Number of rows which are to be appended
+        """
+        capacity = len(self._data["ids"])
+        needed = self._size + extra
+        if needed <= capacity:
+            return
+        new_capacity = max(2 * capacity, needed)
+        for name, column in self._data.items():
+            grown = np.zeros(new_capacity, dtype=column.dtype)
+            grown[: self._size] = column[: self._size]
+            self._data[name] = grown
+
+    def _append(self, values, index):
+        """
+        Appends rows to the population.
+
+        Parameters
+        ----------
+        values: dict
+            Column name mapped to the values of the new rows. Columns which
+            are not given are set to zero, or False.
+        index: int or array
+            Index of the cell the new animals are placed in
+
+        Returns
+        -------
+        array
+            Row numbers of the new animals
+        """
+        num_new = len(values["ids"])
+        self._reserve(num_new)
+        rows = np.arange(self._size, self._size + num_new)
+        self._size += num_new
+        for name, column in self._data.items():
+            column[rows] = values.get(name, 0)
+        self.alive[rows] = True
+        self.cell[rows] = index
+        np.add.at(self._counts, self.cell[rows], 1)
+        np.add.at(self._biomass, self.cell[rows], self.weight[rows])
+        self._num_alive += num_new
+        self.generation += 1
+        self._id_index = None
+        return rows
+
+    def _append_one(self, values, index):
+        """
+        Appends a single row to the population, as :meth:`_append` does for
+        many rows, without the overhead of array operations.
+
+        Parameters
+        ----------
+        values: dict
+            Column name mapped to the value of the new row
+        index: int
+            Index of the cell the new animal is placed in
+
+        Returns
+        -------
+        array
+            Row number of the new animal
+        """
+        self._reserve(1)
+        row = self._size
+        self._size += 1
+        for name, column in self._data.items():
+            column[row] = values.get(name, 0)
+        self._data["alive"][row] = True
+        self._data["cell"][row] = index
+        self._counts[index] += 1
+        self._biomass[index] += self._data["weight"][row]
+        self._num_alive += 1
+        self.generation += 1
+        self._id_index = None
+        return np.array([row])
+
+    def add(self, index, ages, weights):
+        """
+        Adds new animals to a cell, or to several cells.
+
+        Parameters
+        ----------
+        index: int or array
+            Index of the cell the animals are added to, or one index for
+            every new animal
+        ages: int or array
+            Age of the new animals
+        weights: float or array
+            Weight of the new animals
+
+        Returns
+        -------
+        array
+            Row numbers of the new animals
+        """
+        if np.isscalar(index) and np.isscalar(ages) and np.isscalar(weights):
+            values = {
+                "ids": self.id_counter.take(1),
+                "age": ages,
+                "weight": weights,
+                "stale": True,
+            }
+            return self._append_one(values, index)
+
+        ages, weights = np.broadcast_arrays(
+            np.atleast_1d(ages), np.atleast_1d(weights)
+        )
+        num_new = len(ages)
+        first = self.id_counter.take(num_new)
+        ids = np.arange(first, first + num_new)
+        values = {"ids": ids, "age": ages, "weight": weights, "stale": True}
+        return self._append(values, index)
+
+    def remove(self, rows):
+        """
+        Marks animals as removed. The rows are deleted from the arrays the
+        next time the population is committed.
+
+        Parameters
+        ----------
+        rows: array
+            Row numbers of the animals to remove
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        rows = rows[self.alive[rows]]
+        if len(rows) == 0:
+            return
+        self.alive[rows] = False
+        self._leave_cells(rows)
+        self._num_alive -= len(rows)
+        self._pending = True
+        self.generation += 1
+
+    def discard(self, animal_id):
+        """
+        Removes the animal with the given id, if it is still in the
+        population.
+
+        Parameters
+        ----------
+        animal_id: int
+            Unique id of the animal
+        """
+        row = self.find(animal_id)
+        if row >= 0:
+            self.remove([row])
+
+    def _leave_cells(self, rows):
+        """
+        Takes animals out of the counts and biomass of the cells they are
+        in. The biomass of cells left empty is set to exactly zero, so that
+        no rounding errors remain.
+
+        Parameters
+        ----------
+        rows: array
+            Row numbers of the animals leaving their cells
+        """
+        cells = self.cell[rows]
+        np.subtract.at(self._counts, cells, 1)
+        np.subtract.at(self._biomass, cells, self.weight[rows])
+        emptied = cells[self._counts[cells] == 0]
+        self._biomass[emptied] = 0
+
+    def set_weight(self, rows, weights):
+        """
+        Changes the weight of animals, keeping the biomass of their cells up
+        to date and marking their fitness as stale.
+
+        Parameters
+        ----------
+        rows: array
+            Row numbers of the animals
+        weights: float or array
+            The new weight of each animal
+        """
+        change = weights - self.weight[rows]
+        self.weight[rows] = weights
+        np.add.at(self._biomass, self.cell[rows], change)
+        self.stale[rows] = True
+
+    def move(self, rows, index, commit=False):
+        """
+        Moves animals to another cell of this population, or to several
+        cells.
+
+        Parameters
+        ----------
+        rows: array
+            Row numbers of the animals to move
+        index: int or array
+            Index of the destination cell, or one index for every animal
+        commit: bool [default=False]
+            If True, the population is committed right after the move. The
+            cells the animals arrive in are then not kept track of, which
+            only :meth:`members` needs before the next commit.
+
+        Returns
+        -------
+        array
+            Row numbers of the moved animals, which are unchanged until the
+            population is committed.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        self._leave_cells(rows)
+        if np.ndim(index) == 0:
+            self._counts[index] += len(rows)
+            self._biomass[index] += self.weight[rows].sum()
+            if not commit:
+                self._arrivals.setdefault(index, []).extend(rows.tolist())
+        else:
+            index = np.asarray(index, dtype=np.intp)
+            np.add.at(self._counts, index, 1)
+            np.add.at(self._biomass, index, self.weight[rows])
+            if not commit:
+                order = np.argsort(index, kind="stable")
+                cells, starts = np.unique(index[order], return_index=True)
+                for cell, arrivals in zip(
+                    cells.tolist(), np.split(rows[order], starts[1:])
+                ):
+                    self._arrivals.setdefault(cell, []).extend(
+                        arrivals.tolist()
+                    )
+        self.cell[rows] = index
+        self._pending = True
+        self._moved = True
+        self.generation += 1
+        if commit:
+            self.commit()
+        return rows
+
+    def transfer(self, rows, other, index):
+        """
+        Moves animals from this population into another population. The
+        animals keep their ids if both populations share an id counter, and
+        get new ids from the counter of 'other' otherwise.
+
+        Parameters
+        ----------
+        rows: array
+            Row numbers of the animals to move
+        other: Population
+            The population which receives the animals
+        index: int
+            Index of the destination cell in 'other'
+
+        Returns
+        -------
+        array
+            Row numbers of the animals in 'other'
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(rows) == 1 and np.ndim(index) == 0:
+            values = {
+                name: column[rows[0]]
+                for name, column in self._data.items()
+                if name not in ("alive", "cell")
+            }
+            if other.id_counter is not self.id_counter:
+                values["ids"] = other.id_counter.take(1)
+            new_rows = other._append_one(values, index)
+        else:
+            values = {
+                name: column[rows]
+                for name, column in self._data.items()
+                if name not in ("alive", "cell")
+            }
+            if other.id_counter is not self.id_counter:
+                first = other.id_counter.take(len(rows))
+                values["ids"] = np.arange(first, first + len(rows))
+            new_rows = other._append(values, index)
+        self.remove(rows)
+        return new_rows
+
+    def members(self, index):
+        """
+        Finds the rows of the living animals in a cell.
+
+        Parameters
+        ----------
+        index: int
+            Index of the cell
+
+        Returns
+        -------
+        array
+            Row numbers of the animals in the cell
+        """
+        start, stop = self._offsets[index], self._offsets[index + 1]
+        rows = np.arange(start, stop)
+        if not self._pending:
+            return rows
+
+        present = (self.cell[start:stop] == index) & self.alive[start:stop]
+        rows = rows[present]
+        arrivals = self._arrivals.get(index)
+        if arrivals:
+            arrivals = np.unique(arrivals)
+            arrivals = arrivals[
+                ((arrivals < start) | (arrivals >= stop))
+                & (self.cell[arrivals] == index)
+                & self.alive[arrivals]
+            ]
+            rows = np.concatenate((rows, arrivals))
+        return rows
+
+    def find(self, animal_id):
+        """
+        Finds the row of the living animal with the given id.
+
+        Parameters
+        ----------
+        animal_id: int
+            Unique id of the animal
+
+        Returns
+        -------
+        int
+            Row number of the animal, or -1 if it is not in the population
+        """
+        # The ids sorted once after the rows change, so that every lookup
+        # is a binary search
+        if self._id_index is None:
+            order = np.argsort(self.ids, kind="stable")
+            self._id_index = self.ids[order], order
+        sorted_ids, order = self._id_index
+        start, stop = np.searchsorted(
+            sorted_ids, [animal_id, animal_id + 1]
+        ).tolist()
+        for row in order[start:stop].tolist():
+            if self.alive[row]:
+                return row
+        return -1
+
+    def refresh_fitness(self, rows=None):
+        """
+        Recomputes the fitness of the given animals where it is out of date,
+        in one vectorized pass.
+
+        Parameters
+        ----------
+        rows: array [default=None]
+            Row numbers of the animals, all animals if None
+
+        Returns
+        -------
+        array
+            The fitness of the animals
+        """
+        if rows is None:
+            stale_rows = np.flatnonzero(self.stale)
+        else:
+            stale_rows = rows[self.stale[rows]]
+
+        if len(stale_rows) == self._size:
+            self.fitness[:] = self.species._calculate_fitness_array(
+                self.weight, self.age
+            )
+            self.stale[:] = False
+        elif len(stale_rows) > 0:
+            self.fitness[stale_rows] = self.species._calculate_fitness_array(
+                self.weight[stale_rows], self.age[stale_rows]
+            )
+            self.stale[stale_rows] = False
+
+        if rows is None:
+            return self.fitness
+        return self.fitness[rows]
+
+    def grow_older(self, eta, years=1):
+        """
+        Ages all animals and reduces their weight by the fraction 'eta', in
+        one pass over the columns, and recomputes their fitness right away.
+        The biomass of the cells is summed afresh from the new weights.
+
+        Parameters
+        ----------
+        eta: float
+            Fraction of its weight every animal loses
+        years: int [default=1]
+            Number of years added to the age of every animal
+
+        """
+        self.commit()
+        age, weight = self.age, self.weight
+        age += years
+        weight -= eta * weight
+        self._biomass[:] = np.bincount(
+            self.cell, weights=weight, minlength=self.n_cells
+        )
+        self.fitness[:] = self.species._calculate_fitness_array(weight, age)
+        self.stale[:] = False
+        self.generation += 1
+
+    def views(self, rows):
+        """
+        Creates animal instances which refer to rows of the population.
+
+        Parameters
+        ----------
+        rows: array
+            Row numbers of the animals
+
+        Returns
+        -------
+        list
+            Animal class instances acting as views of the rows
+        """
+        return [self.species.view(self, row) for row in rows]
+
+    def to_arrays(self):
+        """
+        Packs the living animals into plain arrays, one per column, for
+        saving the population.
+
+        Returns
+        -------
+        dict
+            Column name mapped to a copy of the column, with the animals in
+            the order of their rows
+        """
+        self.commit()
+        return {
+            name: column[: self._size].copy()
+            for name, column in self._data.items()
+            if name != "alive"
+        }
+
+    def restore(self, columns):
+        """
+        Replaces all animals of the population by packed animals, see
+        :meth:`to_arrays`. The animals keep their ids, rows and attributes.
+
+        Parameters
+        ----------
+        columns: dict
+            Column name mapped to the values of every animal
+        """
+        self._size = 0
+        self._grouped = 0
+        self._counts[:] = 0
+        self._biomass[:] = 0
+        self._num_alive = 0
+        self._arrivals.clear()
+        self._pending = False
+        self._moved = False
+        self._append(dict(columns), columns["cell"])
+        self.commit()
+        if self._size:
+            self.id_counter.next_id = max(
+                self.id_counter.next_id, int(self.ids.max()) + 1
+            )
+
+    def commit(self):
+        """
+        Applies all deferred changes: removed rows are deleted, and the rows
+        are ordered by cell so that every cell is a contiguous range of rows.
+        """
+        if not self._pending and self._grouped == self._size:
+            return
+
+        keep = np.flatnonzero(self.alive)
+        if self._moved or self._grouped != self._size:
+            keep = keep[np.argsort(self.cell[keep], kind="stable")]
+        for column in self._data.values():
+            column[: len(keep)] = column[keep]
+        self._size = len(keep)
+
+        self._offsets[1:] = np.cumsum(
+            np.bincount(self.cell, minlength=self.n_cells)
+        )
+        # Summing afresh removes rounding errors from the incremental updates
+        self._biomass[:] = np.bincount(
+            self.cell, weights=self.weight, minlength=self.n_cells
+        )
+        self._grouped = self._size
+        self._arrivals.clear()
+        self._pending = False
+        self._moved = False
+        self.generation += 1
+        self.commits += 1
+        self._id_index = None
+        self._occupied = self.generation, np.flatnonzero(
+            self._offsets[1:] != self._offsets[:-1]
+        )
+
+    def settle(self):
+        """
+        Commits the population, unless it is inside a batch.
+        """
+        if self._batch_depth == 0:
+            self.commit()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Context manager which postpones committing the population until the
+        end of the with-block.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self.settle()
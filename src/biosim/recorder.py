@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Streaming recorder for statistics of long simulations.
+
+A ``StatsRecorder`` appends aggregates of every simulated year to NumPy files
+on disk. The files are preallocated in chunks of a fixed number of records and
+written through memory maps, so the cost of recording stays constant per year
+and the memory used does not grow with the length of the run.
+
+The directory holds two series of files:
+
+* ``stats_00000.npy``, ``stats_00001.npy``, ...: one record per year, with the
+  year, and for every specie the number of animals and the mean and
+  percentiles of their age, weight and fitness.
+* ``grids_00000.npy``, ...: the number of animals of every specie in every
+  cell, recorded every ``grid_years`` years.
+
+Unused records at the end of a chunk have year -1. The recorded data are read
+back with :meth:`StatsRecorder.load`.
+
+"""
+
+import glob
+import os
+import numpy as np
+
+
+class _ChunkedFile:
+    """
+    Series of preallocated, memory-mapped ``.npy`` files which records are
+    appended to.
+    """
+
+    def __init__(self, directory, prefix, dtype, chunk_size):
+        """
+        Parameters
+        ----------
+        directory: str
+            Directory the files are written to
+        prefix: str
+            Beginning of the file names
+        dtype: numpy.dtype
+            Structured data type of the records, with a 'year' field
+        chunk_size: int
+            Number of records in every file
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+        # Continues after the chunks of earlier recordings
+        self._number = len(self.paths(directory, prefix))
+        self._chunk = None
+        self._position = 0
+
+    @staticmethod
+    def paths(directory, prefix):
+        """
+        Finds the chunk files of a series, in the order they were written.
+
+        Parameters
+        ----------
+        directory: str
+            Directory of the files
+        prefix: str
+            Beginning of the file names
+
+        Returns
+        -------
+        list
+            Paths of the chunk files
+        """
+        return sorted(glob.glob(os.path.join(directory, f"{prefix}_*.npy")))
+
+    def append(self, values):
+        """
+        Appends one record, opening a new chunk when the current one is
+        full.
+
+        Parameters
+        ----------
+        values: dict
+            Field name mapped to the value of the field
+        """
+        if self._chunk is None or self._position == self.chunk_size:
+            self.close()
+            path = os.path.join(
+                self.directory, f"{self.prefix}_{self._number:05d}.npy"
+            )
+            self._chunk = np.lib.format.open_memmap(
+                path, mode="w+", dtype=self.dtype, shape=(self.chunk_size,)
+            )
+            self._chunk["year"] = -1
+            self._number += 1
+            self._position = 0
+
+        for name, value in values.items():
+            self._chunk[name][self._position] = value
+        self._position += 1
+
+    def flush(self):
+        """
+        Writes the records of the current chunk to disk.
+        """
+        if self._chunk is not None:
+            self._chunk.flush()
+
+    def close(self):
+        """
+        Writes the current chunk to disk and releases it.
+        """
+        self.flush()
+        self._chunk = None
+
+
+class StatsRecorder:
+    """
+    Records per-year statistics of a simulation to chunked NumPy files.
+    """
+
+    attributes = ("age", "weight", "fitness")
+
+    def __init__(
+        self,
+        directory,
+        grid_years=None,
+        chunk_size=1024,
+        percentiles=(5, 25, 50, 75, 95),
+    ):
+        """
+        Parameters
+        ----------
+        directory: str
+            Directory the files are written to, created if it does not exist
+        grid_years: int [default=None]
+            Years between the recorded count grids, no grids are recorded if
+            None
+        chunk_size: int [default=1024]
+            Number of records in every file
+        percentiles: tuple [default=(5, 25, 50, 75, 95)]
+            Percentiles of age, weight and fitness to record
+        """
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be at least 1")
+        if grid_years is not None and grid_years < 1:
+            raise ValueError("Years between grids must be at least 1")
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.grid_years = grid_years
+        self.chunk_size = chunk_size
+        self.percentiles = tuple(percentiles)
+        self._stats = None
+        self._grids = None
+
+    def _open(self, island_map):
+        """
+        Creates the files for the species and the size of a map.
+
+        Parameters
+        ----------
+        island_map: Map
+            The map which is recorded
+        """
+        fields = [("year", np.int64)]
+        for name in island_map.populations:
+            fields.append((f"{name}_count", np.int64))
+            for attribute in self.attributes:
+                fields.append((f"{name}_{attribute}_mean", np.float64))
+                fields.append(
+                    (
+                        f"{name}_{attribute}_percentiles",
+                        np.float64,
+                        (len(self.percentiles),),
+                    )
+                )
+        self._stats = _ChunkedFile(
+            self.directory, "stats", np.dtype(fields), self.chunk_size
+        )
+
+        grid_shape = island_map.map.shape + (len(island_map.populations),)
+        grid_dtype = np.dtype(
+            [("year", np.int64), ("counts", np.int64, grid_shape)]
+        )
+        self._grids = _ChunkedFile(
+            self.directory, "grids", grid_dtype, self.chunk_size
+        )
+
+    def record(self, year, island_map):
+        """
+        Records the statistics of a map for one year.
+
+        Parameters
+        ----------
+        year: int
+            The year which is recorded
+        island_map: Map
+            The map which is recorded
+        """
+        if self._stats is None:
+            self._open(island_map)
+
+        values = {"year": year}
+        for name, population in island_map.populations.items():
+            values[f"{name}_count"] = len(population)
+            columns = {
+                "age": population.age,
+                "weight": population.weight,
+                "fitness": population.refresh_fitness(),
+            }
+            for attribute in self.attributes:
+                column = columns[attribute]
+                if len(column) == 0:
+                    mean, percentiles = np.nan, np.nan
+                else:
+                    mean = column.mean()
+                    percentiles = np.percentile(column, self.percentiles)
+                values[f"{name}_{attribute}_mean"] = mean
+                values[f"{name}_{attribute}_percentiles"] = percentiles
+        self._stats.append(values)
+
+        if self.grid_years is not None and year % self.grid_years == 0:
+            self._grids.append(
+                {"year": year, "counts": island_map.count_grid()}
+            )
+
+    def flush(self):
+        """
+        Writes all recorded data to disk.
+        """
+        for chunked_file in (self._stats, self._grids):
+            if chunked_file is not None:
+                chunked_file.flush()
+
+    def close(self):
+        """
+        Writes all recorded data to disk and releases the files. Recording
+        again afterwards continues in new chunk files.
+        """
+        for chunked_file in (self._stats, self._grids):
+            if chunked_file is not None:
+                chunked_file.close()
+        self._stats = None
+        self._grids = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def load(directory, kind="stats"):
+        """
+        Reads recorded data back from disk.
+
+        Parameters
+        ----------
+        directory: str
+            Directory the files were written to
+        kind: str [default="stats"]
+            Either "stats" for the per-year statistics, or "grids" for the
+            count grids
+
+        Returns
+        -------
+        numpy.ndarray
+            Structured array with one element per recorded year
+        """
+        if kind not in ("stats", "grids"):
+            raise ValueError("kind must be 'stats' or 'grids'")
+
+        chunks = [
+            np.load(path, mmap_mode="r")
+            for path in _ChunkedFile.paths(directory, kind)
+        ]
+        if not chunks:
+            raise FileNotFoundError(f"No {kind} recorded in {directory}")
+        data = np.concatenate(chunks)
+        return data[data["year"] >= 0]
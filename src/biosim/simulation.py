@@ -6,16 +6,19 @@ __email__ = "amar@nmbu.no, sebabeck@nmbu.no"
 """
 Simulation of the Island with visualization
 
+Matplotlib, pandas and subprocess are imported by the methods which need
+them, so that importing this module, e.g. in a worker process which only
+simulates, does not pay for the graphics and DataFrame libraries.
+
 """
 
 from .map import Map
+from .island_hunt import IslandHuntCycle
+from .population import Population
+import bisect
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import subprocess
-import random
 import os
+import json
 import textwrap
 
 _FFMPEG_BINARY = "ffmpeg"
@@ -39,6 +42,12 @@ class BioSim:
         "D": (1.0, 1.0, 0.5),
     }
 
+    # Engines mapped to a function making the annual cycle of a map
+    engines = {
+        "map": lambda island_map: island_map.cycle,
+        "island_hunt": lambda island_map: IslandHuntCycle(island_map).cycle,
+    }
+
     def __init__(
         self,
         island_map,
@@ -48,6 +57,8 @@ class BioSim:
         cmax_animals=None,
         img_base=None,
         img_fmt="png",
+        params=None,
+        engine="map",
     ):
         """
         :param island_map: Multi-line string specifying island geography
@@ -57,6 +68,13 @@ class BioSim:
         :param cmax_animals: Dict specifying color-code limits for animal densities
         :param img_base: String with beginning of file name for figures, including path
         :param img_fmt: String with file type for figures, e.g. 'png'
+        :param params: Dict mapping species names and landscape letters to
+            parameters which differ from the defaults, e.g.
+            {'Carnivore': {'F': 60}, 'J': {'f_max': 700}}
+        :param engine: String naming the engine which runs the annual cycle,
+            'map' to run it through the cells of the map, or 'island_hunt'
+            to grow the fodder and run the hunt for the whole island at
+            once, see :mod:`biosim.island_hunt`
 
         If ymax_animals is None, the y-axis limit should be adjusted automatically.
 
@@ -73,7 +91,12 @@ class BioSim:
         img_base should contain a path and beginning of a file name.
         """
 
-        self._map = Map(island_map)
+        if engine not in self.engines:
+            raise ValueError(f"Engine must be one of {tuple(self.engines)}")
+        self._geography = island_map
+        self._map = Map(island_map, params=params, seed=seed)
+        self._engine = engine
+        self._cycle = self.engines[engine](self._map)
 
         self.map_rgb = [
             [self.rgb_value[column] for column in row]
@@ -81,14 +104,14 @@ class BioSim:
         ]
 
         self._map.add_animals(ini_pop)
-        np.random.seed(seed)
-        random.seed(seed)
 
         self._year = 0
         self._final_year = None
         self._num_animals = 0
         self._num_animals_per_species = {}
         self._animal_distribution = None
+        self._history = {"Year": [], "Herbivore": [], "Carnivore": []}
+        self._recorded_distributions = []
 
         self.img_fmt = img_fmt
         self.img_count = 0
@@ -100,6 +123,7 @@ class BioSim:
         self._mean_ax = None
         self._herb_line = None
         self._carn_line = None
+        self._drawn_years = 0
 
         self.herb_heat = None
         self.carn_heat = None
@@ -139,40 +163,128 @@ class BioSim:
 
         self._map.update_param_all_cells(landscape, params)
 
-    def simulate(self, num_years, vis_years=1, img_years=None):
+    def simulate(
+        self, num_years, vis_years=1, img_years=None, recorder=None
+    ):
         """
         Run simulation while visualizing the result.
 
         :param num_years: number of years to simulate
-        :param vis_years: years between visualization updates
+        :param vis_years: years between visualization updates, or None to
+            run headless without any graphics
         :param img_years: years between visualizations saved to files (default: vis_years)
+        :param recorder: StatsRecorder which the statistics of every year are
+            streamed to, see :mod:`biosim.recorder`
 
         Image files will be numbered consecutively.
+
+        The number of animals per species is recorded every year, see
+        :attr:`population_history`. When running headless, no figure is
+        created, and the animal distribution is instead recorded every
+        img_years, so that the images can be made afterwards with
+        :meth:`render`.
         """
 
         if img_years is None:
             img_years = vis_years
 
+        headless = vis_years is None
         self._final_year = self.year + num_years
-        self._setup_graphics()
+        if not headless:
+            self._setup_graphics()
 
         while self._year < self._final_year:
-            if self._year % vis_years == 0:
-                self._update_graphics()
+            self._record_year()
+            if recorder is not None:
+                recorder.record(self._year, self._map)
+
+            if headless:
+                if img_years is not None and self._year % img_years == 0:
+                    self._record_distribution()
+            else:
+                if self._year % vis_years == 0:
+                    self._update_graphics()
 
-            if self._year % img_years == 0:
-                self._save_graphics()
+                if self._year % img_years == 0:
+                    self._save_graphics()
 
-            self._map.cycle()
+            self._cycle()
 
             self._year += 1
 
+        if recorder is not None:
+            recorder.flush()
+
+    def _record_year(self):
+        """
+
+        Records the number of animals per species in the current year.
+
+        """
+        self._history["Year"].append(self._year)
+        for specie, amount in zip(
+            ("Herbivore", "Carnivore"), self._map.num_species_on_map()
+        ):
+            self._history[specie].append(amount)
+
+    def _record_distribution(self):
+        """
+
+        Records the number of animals per species in every cell in the
+        current year, for drawing it later with 'render'.
+
+        """
+        herb_array, carn_array = np.moveaxis(self._map.count_grid(), -1, 0)
+        self._recorded_distributions.append(
+            (self._year, herb_array, carn_array)
+        )
+
+    @property
+    def population_history(self):
+        """Number of animals per species at the start of every simulated
+        year, as dictionary of arrays with the keys 'Year', 'Herbivore' and
+        'Carnivore'."""
+        return {
+            key: np.array(values) for key, values in self._history.items()
+        }
+
+    def render(self, img_base=None, img_fmt=None):
+        """
+        Draw the visualization for the years recorded while simulating
+        headless, and save one image for each of them.
+
+        :param img_base: String with beginning of file name for figures,
+            including path (default: img_base given to the constructor)
+        :param img_fmt: String with file type for figures (default: img_fmt
+            given to the constructor)
+
+        Image files are numbered consecutively, continuing the numbering of
+        images already saved.
+        """
+
+        if img_base is not None:
+            self.img_base = img_base
+        if img_fmt is not None:
+            self.img_fmt = img_fmt
+        if self.img_base is None:
+            raise RuntimeError("No filename defined.")
+
+        if not self._recorded_distributions:
+            return
+
+        self._setup_graphics()
+        for year, herb_array, carn_array in self._recorded_distributions:
+            self._draw_year(year, herb_array, carn_array)
+            self._save_graphics()
+        self._recorded_distributions.clear()
+
     def _setup_graphics(self):
         """
 
         Sets up plots and axes for the Simulation to be visualized
 
         """
+        import matplotlib.pyplot as plt
 
         if self._fig is None:
             self._fig = plt.figure(figsize=(10, 8))
@@ -221,21 +333,32 @@ class BioSim:
         Updates the plots with new data
 
         """
-        pop_df = self.animal_distribution
+        import matplotlib.pyplot as plt
 
-        rows, cols = np.shape(self._map.map)
+        herb_array, carn_array = np.moveaxis(self._map.count_grid(), -1, 0)
+        self._draw_year(self._year, herb_array, carn_array)
+        plt.pause(1e-6)
+
+    def _draw_year(self, year, herb_array, carn_array):
+        """
 
-        herb_count = pop_df.Herbivore
-        herb_array = np.array(herb_count).reshape(rows, cols)
+        Draws the population lines up to a year, and the animal distribution
+        of that year.
 
-        carn_count = pop_df.Carnivore
-        carn_array = np.array(carn_count).reshape(rows, cols)
+        Parameters
+        ----------
+        year: int
+            The year to draw
+        herb_array: array
+            Number of Herbivores in every cell
+        carn_array: array
+            Number of Carnivores in every cell
 
-        self._update_specie_lines()
+        """
+        self._update_specie_lines(year)
         self._update_herb_heatmap(herb_array)
         self._update_carn_heatmap(carn_array)
-        self.txt.set_text(self.year_format.format(self.year))
-        plt.pause(1e-6)
+        self.txt.set_text(self.year_format.format(year))
 
     def _save_graphics(self):
         """
@@ -243,6 +366,7 @@ class BioSim:
         Saves the plots as a specified file type.
 
         """
+        import matplotlib.pyplot as plt
 
         if self.img_base is None:
             return
@@ -268,6 +392,7 @@ class BioSim:
         Creates map plot out of RGB colors and map string.
 
         """
+        import matplotlib.patches as mpatches
 
         self._island_map = self._fig.add_subplot(2, 2, 4)
         self._island_map.set_title("Island Map")
@@ -301,6 +426,8 @@ class BioSim:
                 np.full(self._final_year, np.nan),
             )
             self._herb_line = herb_plot[0]
+            # New lines hold no years yet, e.g. after resuming a checkpoint
+            self._drawn_years = 0
         else:
             xdata, ydata = self._herb_line.get_data()
             xnew = np.arange(xdata[-1] + 1, self._final_year)
@@ -393,21 +520,27 @@ class BioSim:
             labels=(range(1, 1 + len(self.map_rgb))), fontdict={"fontsize": 6}
         )
 
-    def _update_specie_lines(self):
+    def _update_specie_lines(self, year):
         """
 
-        Updates the population lines for Herbivore and Carnivore
+        Updates the population lines for Herbivore and Carnivore with the
+        recorded number of animals, up to and including the given year.
+        Only the years recorded since the last update are written into the
+        lines.
 
         """
-        herb_amount = self.num_animals_per_species["Herbivore"]
-        ydata_herb = self._herb_line.get_ydata()
-        ydata_herb[self._year] = herb_amount
-        self._herb_line.set_ydata(ydata_herb)
-
-        carn_amount = self.num_animals_per_species["Carnivore"]
-        ydata_carn = self._carn_line.get_ydata()
-        ydata_carn[self._year] = carn_amount
-        self._carn_line.set_ydata(ydata_carn)
+        start = self._drawn_years
+        stop = bisect.bisect_right(self._history["Year"], year, lo=start)
+        if stop > start:
+            years = self._history["Year"][start:stop]
+            for line, specie in (
+                (self._herb_line, "Herbivore"),
+                (self._carn_line, "Carnivore"),
+            ):
+                ydata = line.get_ydata()
+                ydata[years] = self._history[specie][start:stop]
+                line.set_ydata(ydata)
+            self._drawn_years = stop
 
         self._mean_ax.legend(["Herbivore", "Carnivore"], prop={"size": 6})
 
@@ -429,7 +562,6 @@ class BioSim:
     def num_animals(self):
         """Total number of animals on island."""
         self._num_animals = sum(self._map.num_species_on_map())
-        print(self._num_animals)
         return self._num_animals
 
     @property
@@ -445,31 +577,153 @@ class BioSim:
     def animal_distribution(self):
         """Pandas DataFrame with animal count per species for each cell on
         island. """
-        list_of_dicts = []
-        y_lim, x_lim = np.shape(self._map.map)
-        for y in range(y_lim):
-            for x in range(x_lim):
-                curr_cell = self._map.map[(y, x)]
-                (
-                    curr_herbivores,
-                    curr_carnivores,
-                ) = curr_cell.num_species_per_cell()
-                curr_dict = {
-                    "Row": y,
-                    "Col": x,
-                    "Herbivore": curr_herbivores,
-                    "Carnivore": curr_carnivores,
-                }
-                list_of_dicts.append(curr_dict)
+        import pandas as pd
+
+        count_grid = self._map.count_grid()
+        rows, cols = np.indices(count_grid.shape[:2])
+        columns = {"Row": rows.ravel(), "Col": cols.ravel()}
+        for index, specie in enumerate(self._map.populations):
+            columns[specie] = count_grid[..., index].ravel()
+
+        return pd.DataFrame(
+            columns, columns=["Row", "Col", "Herbivore", "Carnivore"]
+        )
 
-        df = pd.DataFrame(
-            list_of_dicts, columns=["Row", "Col", "Herbivore", "Carnivore"]
+    def save_checkpoint(self, path):
+        """
+        Save the state of the simulation to a directory, so that it can be
+        resumed with :meth:`from_checkpoint`.
+
+        :param path: String with the name of the directory, which is created
+            if missing
+
+        The directory holds 'checkpoint.json' with the geography, the animal
+        and landscape parameters, the year, the recorded number of animals
+        and the state of the random number generators, and one '.npy' file
+        for each array: the attributes of all animals as packed columns, the
+        fodder and the number of deaths of every cell, and the animal
+        distributions recorded for :meth:`render`. The '.npy' files can be
+        memory-mapped with ``np.load(..., mmap_mode="r")``.
+        """
+
+        os.makedirs(path, exist_ok=True)
+        metadata = {
+            "geography": self._geography,
+            "year": self._year,
+            "migration": self._map.migration,
+            "engine": self._engine,
+            "animal_params": {
+                name: dict(specie.param)
+                for name, specie in self._map.allowed_species.items()
+            },
+            "landscape_params": {
+                letter: dict(cell_class.param)
+                for letter, cell_class in self._map.dict_cells.items()
+            },
+            "rng_states": {
+                name: specie.rng.bit_generator.state
+                for name, specie in self._map.allowed_species.items()
+            },
+            "history": self._history,
+            "drawn_years": self._drawn_years,
+            "distribution_years": [
+                year for year, _, _ in self._recorded_distributions
+            ],
+            "ymax_animals": self.ymax_animals,
+            "cmax_animals": self.cmax_animals,
+            "img_base": self.img_base,
+            "img_fmt": self.img_fmt,
+            "img_count": self.img_count,
+        }
+
+        arrays = {
+            "fodder": self._map.fodder,
+            "distributions": np.array(
+                [
+                    (herb_array, carn_array)
+                    for _, herb_array, carn_array in (
+                        self._recorded_distributions
+                    )
+                ],
+                dtype=np.int64,
+            ).reshape((-1, 2) + self._map.map.shape),
+        }
+        for name, population in self._map.populations.items():
+            arrays[f"{name}_deaths"] = self._map.deaths[name]
+            for column, values in population.to_arrays().items():
+                arrays[f"{name}_{column}"] = values
+
+        for name, values in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), values)
+        with open(os.path.join(path, "checkpoint.json"), "w") as json_file:
+            json.dump(metadata, json_file)
+
+    @classmethod
+    def from_checkpoint(cls, path):
+        """
+        Create a simulation from a directory written by
+        :meth:`save_checkpoint`. Simulating further continues exactly as the
+        saved simulation would have.
+
+        :param path: String with the name of the directory
+        :return: BioSim instance with the saved state
+
+        The arrays are memory-mapped, and copied into the new simulation.
+        The saved animal and landscape parameters are set for the new
+        simulation only, as with :meth:`set_animal_parameters`.
+        """
+
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        with open(os.path.join(path, "checkpoint.json")) as json_file:
+            metadata = json.load(json_file)
+        sim = cls(
+            metadata["geography"],
+            ini_pop=[],
+            seed=0,
+            ymax_animals=metadata["ymax_animals"],
+            cmax_animals=metadata["cmax_animals"],
+            img_base=metadata["img_base"],
+            img_fmt=metadata["img_fmt"],
+            engine=metadata["engine"],
         )
 
-        return df
+        for name, params in metadata["animal_params"].items():
+            sim.set_animal_parameters(name, params)
+        for letter, params in metadata["landscape_params"].items():
+            sim.set_landscape_parameters(letter, params)
+        sim._map.migration = metadata["migration"]
+
+        sim._map.fodder[:] = load("fodder")
+        for name, population in sim._map.populations.items():
+            sim._map.deaths[name] = np.array(load(f"{name}_deaths"))
+            population.restore(
+                {
+                    column: np.array(load(f"{name}_{column}"))
+                    for column in Population._dtypes
+                    if column != "alive"
+                }
+            )
+        sim._recorded_distributions = [
+            (year, np.array(herb_array), np.array(carn_array))
+            for year, (herb_array, carn_array) in zip(
+                metadata["distribution_years"], load("distributions")
+            )
+        ]
+
+        for name, state in metadata["rng_states"].items():
+            sim._map.allowed_species[name].rng.bit_generator.state = state
+
+        sim._year = metadata["year"]
+        sim._history = metadata["history"]
+        sim._drawn_years = metadata["drawn_years"]
+        sim.img_count = metadata["img_count"]
+        return sim
 
     def make_movie(self, movie_fmt=_DEFAULT_MOVIE_FORMAT):
         """Create MPEG4 movie from visualization images saved."""
+        import subprocess
 
         if self.img_base is None:
             raise RuntimeError("No filename defined.")
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+"""
+Parameter sweeps over a fixed island.
+
+A ``ParameterSweep`` runs a simulation for every point of a grid, or of a
+Latin hypercube, of animal and landscape parameters, and for every seed. The
+number of animals per specie at the start of every year, and after the last
+year, is written to a single result cube on disk with the axes
+
+    parameter axes x seed x year x specie
+
+where a grid has one axis per parameter, and a Latin hypercube has a single
+axis of sample points. The cube is stored as ``cube.npy`` in the directory of
+the sweep, next to ``sweep.json`` describing the axes. Unfinished runs are
+marked with -1, so a sweep which was interrupted continues with the runs
+which are missing when it is run again.
+
+The points run headless in a pool of worker processes, which are sent the
+geography, the initial population and the fixed parameters once, and which
+never import the graphics libraries.
+
+"""
+
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import numpy as np
+
+from .map import Map
+
+_worker = {}
+
+
+def _parameter_classes():
+    """
+    Returns
+    -------
+    dict
+        Species names and landscape letters mapped to their class
+    """
+    classes = dict(Map.dict_cells)
+    classes.update(Map.allowed_species)
+    return classes
+
+
+def _init_worker(island_map, ini_pop, params, years):
+    """
+    Sets up a worker process for running points of a sweep.
+
+    Parameters
+    ----------
+    island_map: str
+        Multi-line string specifying island geography
+    ini_pop: list
+        List of dictionaries specifying the initial population
+    params: dict
+        Fixed parameters, species names and landscape letters mapped to
+        the parameters to set
+    years: int
+        Number of years to simulate
+    """
+    _worker["params"] = params
+    _worker["island_map"] = island_map
+    _worker["ini_pop"] = ini_pop
+    _worker["years"] = years
+
+
+def _run_point(names, values, seed):
+    """
+    Runs one simulation in a worker process.
+
+    Parameters
+    ----------
+    names: list
+        (specie or landscape letter, parameter name) of every swept
+        parameter
+    values: list
+        Value of every swept parameter
+    seed: int
+        Random number seed
+
+    Returns
+    -------
+    array
+        Number of animals per specie at the start of every year, and after
+        the last year, of shape (years + 1, species)
+    """
+    params = {key: dict(values) for key, values in _worker["params"].items()}
+    for (key, name), value in zip(names, values):
+        params.setdefault(key, {})[name] = float(value)
+
+    island = Map(_worker["island_map"], params=params, seed=seed)
+    island.add_animals(_worker["ini_pop"])
+
+    counts = np.zeros((_worker["years"] + 1, len(island.populations)), int)
+    for year in range(_worker["years"]):
+        counts[year] = island.num_species_on_map()
+        island.cycle()
+    counts[-1] = island.num_species_on_map()
+    return counts
+
+
+class ParameterSweep:
+    """
+    Sweep over animal and landscape parameters, writing the results to a
+    resumable result cube on disk.
+    """
+
+    def __init__(
+        self,
+        island_map,
+        ini_pop,
+        names,
+        points,
+        axes_shape,
+        seeds,
+        years,
+        directory,
+        params=None,
+    ):
+        """
+        Use :meth:`grid` or :meth:`latin_hypercube` to create a sweep.
+
+        Parameters
+        ----------
+        island_map: str
+            Multi-line string specifying island geography
+        ini_pop: list
+            List of dictionaries specifying the initial population
+        names: list
+            (specie or landscape letter, parameter name) of every swept
+            parameter
+        points: array
+            Values of the swept parameters, one row for every point
+        axes_shape: tuple
+            Shape of the parameter axes of the result cube
+        seeds: list
+            Random number seeds, every point is run once for every seed
+        years: int
+            Number of years to simulate
+        directory: str
+            Directory the result cube is written to
+        params: dict [default=None]
+            Fixed parameters, species names and landscape letters mapped to
+            the parameters to set for all points
+        """
+        classes = _parameter_classes()
+        for key, name in names:
+            if key not in classes or name not in classes[key].param:
+                raise ValueError(f"{key} has no parameter {name}")
+        params = {} if params is None else params
+        for key in params:
+            if key not in classes:
+                raise ValueError(
+                    f"{key} is neither a specie nor a landscape letter"
+                )
+        # Checks the geography before any worker is started
+        Map(island_map)
+
+        self.island_map = island_map
+        self.ini_pop = ini_pop
+        self.names = [tuple(name) for name in names]
+        self.points = np.asarray(points, dtype=float)
+        self.axes_shape = tuple(axes_shape)
+        self.seeds = [int(seed) for seed in seeds]
+        self.years = years
+        self.directory = directory
+        self.params = params
+        self.species = list(Map.allowed_species)
+
+    @classmethod
+    def grid(
+        cls, island_map, ini_pop, axes, seeds, years, directory, params=None
+    ):
+        """
+        Creates a sweep over every combination of the given values.
+
+        Parameters
+        ----------
+        island_map: str
+            Multi-line string specifying island geography
+        ini_pop: list
+            List of dictionaries specifying the initial population
+        axes: dict
+            (specie or landscape letter, parameter name) mapped to the
+            values of the parameter, e.g.
+            ``{("Carnivore", "F"): [40, 50], ("J", "f_max"): [500, 800]}``
+        seeds: list
+            Random number seeds
+        years: int
+            Number of years to simulate
+        directory: str
+            Directory the result cube is written to
+        params: dict [default=None]
+            Fixed parameters for all points
+
+        Returns
+        -------
+        ParameterSweep
+            Sweep with one cube axis per parameter
+        """
+        names = list(axes)
+        values = [list(axes[name]) for name in names]
+        points = list(itertools.product(*values))
+        return cls(
+            island_map,
+            ini_pop,
+            names,
+            points,
+            [len(axis) for axis in values],
+            seeds,
+            years,
+            directory,
+            params,
+        )
+
+    @classmethod
+    def latin_hypercube(
+        cls,
+        island_map,
+        ini_pop,
+        ranges,
+        num_points,
+        seeds,
+        years,
+        directory,
+        params=None,
+        sample_seed=None,
+    ):
+        """
+        Creates a sweep over a Latin hypercube sample of the given ranges,
+        where every range is split into 'num_points' equal intervals, and
+        every interval is sampled exactly once.
+
+        Parameters
+        ----------
+        island_map: str
+            Multi-line string specifying island geography
+        ini_pop: list
+            List of dictionaries specifying the initial population
+        ranges: dict
+            (specie or landscape letter, parameter name) mapped to the
+            (lowest, highest) value of the parameter
+        num_points: int
+            Number of sample points
+        seeds: list
+            Random number seeds
+        years: int
+            Number of years to simulate
+        directory: str
+            Directory the result cube is written to
+        params: dict [default=None]
+            Fixed parameters for all points
+        sample_seed: int [default=None]
+            Seed for drawing the sample points
+
+        Returns
+        -------
+        ParameterSweep
+            Sweep with a single cube axis of sample points
+        """
+        rng = np.random.default_rng(sample_seed)
+        names = list(ranges)
+        points = np.empty((num_points, len(names)))
+        for column, name in enumerate(names):
+            low, high = ranges[name]
+            strata = rng.permutation(num_points) + rng.random(num_points)
+            points[:, column] = low + strata / num_points * (high - low)
+        return cls(
+            island_map,
+            ini_pop,
+            names,
+            points,
+            (num_points,),
+            seeds,
+            years,
+            directory,
+            params,
+        )
+
+    @property
+    def shape(self):
+        """Shape of the result cube."""
+        return self.axes_shape + (
+            len(self.seeds),
+            self.years + 1,
+            len(self.species),
+        )
+
+    def _description(self):
+        """
+        Returns
+        -------
+        dict
+            Description of the sweep, stored next to the result cube
+        """
+        return {
+            "names": [list(name) for name in self.names],
+            "points": self.points.tolist(),
+            "axes_shape": list(self.axes_shape),
+            "seeds": self.seeds,
+            "years": self.years,
+            "species": self.species,
+            "params": self.params,
+        }
+
+    def _open_cube(self):
+        """
+        Opens the result cube, creating it if the sweep has not been run
+        before.
+
+        Returns
+        -------
+        numpy.memmap
+            The result cube, with -1 for the runs which are not finished
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        description_path = os.path.join(self.directory, "sweep.json")
+        cube_path = os.path.join(self.directory, "cube.npy")
+
+        if os.path.exists(description_path):
+            with open(description_path) as description_file:
+                if json.load(description_file) != self._description():
+                    raise ValueError(
+                        f"{self.directory} holds a different sweep"
+                    )
+            return np.lib.format.open_memmap(cube_path, mode="r+")
+
+        cube = np.lib.format.open_memmap(
+            cube_path, mode="w+", dtype=np.int64, shape=self.shape
+        )
+        cube[:] = -1
+        cube.flush()
+        with open(description_path, "w") as description_file:
+            json.dump(self._description(), description_file)
+        return cube
+
+    def run(self, workers=None):
+        """
+        Runs all points of the sweep which are not finished yet, writing
+        every result to the cube as soon as it is done.
+
+        Parameters
+        ----------
+        workers: int [default=None]
+            Number of worker processes, the number of processors if None
+
+        Returns
+        -------
+        numpy.memmap
+            The result cube
+        """
+        cube = self._open_cube()
+        # Points are numbered in the order of the flattened parameter axes
+        flat_cube = cube.reshape((-1,) + cube.shape[len(self.axes_shape) :])
+        missing = [
+            (point, seed)
+            for point in range(len(self.points))
+            for seed in range(len(self.seeds))
+            if flat_cube[point, seed, 0, 0] < 0
+        ]
+        if not missing:
+            return cube
+
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.island_map, self.ini_pop, self.params, self.years),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _run_point,
+                    self.names,
+                    self.points[point].tolist(),
+                    self.seeds[seed],
+                ): (point, seed)
+                for point, seed in missing
+            }
+            for future in concurrent.futures.as_completed(futures):
+                point, seed = futures[future]
+                flat_cube[point, seed] = future.result()
+                cube.flush()
+        return cube
+
+    @staticmethod
+    def load(directory):
+        """
+        Reads the result cube of a sweep.
+
+        Parameters
+        ----------
+        directory: str
+            Directory the sweep was written to
+
+        Returns
+        -------
+        numpy.memmap
+            The result cube, read-only
+        dict
+            Description of the sweep, with the swept parameter names, the
+            parameter values of every point, the seeds, the number of years
+            and the species
+        """
+        with open(os.path.join(directory, "sweep.json")) as description_file:
+            description = json.load(description_file)
+        cube = np.load(os.path.join(directory, "cube.npy"), mmap_mode="r")
+        return cube, description
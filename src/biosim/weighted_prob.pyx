@@ -1,14 +1,100 @@
-from numpy.random import rand
+cimport cython
 
-cpdef weighted_prob(list weights):
+cpdef weighted_prob(list weights, double uniform):
+    """
+    Chooses an index with the given probabilities.
+
+    Parameters
+    ----------
+    weights: list
+        Probability of every index, summing to one
+    uniform: float
+        Uniform random number in [0, 1) drawn for the choice
+
+    Returns
+    -------
+    int
+        The chosen index
+    """
     cdef double cs
-    cdef double random
-    cpdef int length
+    cdef int length
     length = len(weights)
-    random = rand()
     cs = 0.0
     i = 0
-    while cs < random and i < length:
+    while cs < uniform and i < length:
         cs += weights[i]
         i += 1
-    return i-1
\ No newline at end of file
+    return i-1
+
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline Py_ssize_t _choose(const double[:] cumulative, Py_ssize_t start,
+                               Py_ssize_t stop, double uniform) nogil:
+    cdef Py_ssize_t i = start
+    if start == stop or cumulative[stop - 1] == 0:
+        return -1
+    while i < stop - 1 and cumulative[i] < uniform:
+        i += 1
+    return i - start
+
+
+cpdef Py_ssize_t weighted_choice(const double[:] cumulative, Py_ssize_t start,
+                                 Py_ssize_t stop, double uniform):
+    """
+    Chooses an index from a part of a table of cumulative probabilities.
+    Gives the same choice as 'weighted_prob' for every uniform number larger
+    than zero.
+
+    Parameters
+    ----------
+    cumulative: array
+        Table of cumulative probabilities
+    start: int
+        Position in the table of the cumulative probability of index 0
+    stop: int
+        Position in the table after the last index
+    uniform: float
+        Uniform random number in [0, 1) drawn for the choice
+
+    Returns
+    -------
+    int
+        The chosen index, -1 if the probabilities are all zero
+    """
+    return _choose(cumulative, start, stop, uniform)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef void weighted_choices(const double[:] cumulative,
+                            const Py_ssize_t[:] ptr,
+                            const Py_ssize_t[:] groups,
+                            const double[:] uniforms, Py_ssize_t[:] choices):
+    """
+    Chooses an index for many animals in one call, in the same way as
+    'weighted_choice'.
+
+    Parameters
+    ----------
+    cumulative: array
+        Cumulative probabilities of the groups one after the other, the
+        probabilities of group 'g' are summed up in
+        ``cumulative[ptr[g]:ptr[g + 1]]``
+    ptr: array
+        Start of every group in 'cumulative', and the end of the last group
+    groups: array
+        Group every animal chooses in
+    uniforms: array
+        Uniform random number in [0, 1) drawn for every animal
+    choices: array
+        Filled with the chosen index within the group of every animal, -1 if
+        the probabilities of the group are all zero
+    """
+    cdef Py_ssize_t animal
+    with nogil:
+        for animal in range(groups.shape[0]):
+            choices[animal] = _choose(cumulative, ptr[groups[animal]],
+                                      ptr[groups[animal] + 1],
+                                      uniforms[animal])
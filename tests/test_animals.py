@@ -7,6 +7,7 @@ from biosim.animals import Herbivore, Carnivore
 import pytest
 from scipy.stats import normaltest
 from scipy.stats import shapiro
+import numpy as np
 
 
 @pytest.fixture
@@ -391,3 +392,95 @@ def test_sick_herbivores_eat(mocker):
     sick_herb.increase_eat_weight(10)
 
     assert healthy_herb.weight > sick_herb.weight
+
+
+@pytest.mark.parametrize(
+    "fodder, appetite", [(35.5, 10), (30, 10), (0, 10), (300, 10), (5, 0)]
+)
+def test_portions_closed_form(fodder, appetite):
+    """
+    Tests that the closed form portions of herbivores eating one after the
+    other are the same as letting them eat one at a time.
+
+    Parameters
+    ----------
+    fodder: float
+        Fodder in the cell
+    appetite: float
+        Value of the parameter F
+    """
+    specie = Herbivore.with_parameters({"F": appetite})
+    num_herbivores = 6
+    expected = []
+    left = fodder
+    for _ in range(num_herbivores):
+        if left == 0:
+            break
+        portion = min(appetite, left)
+        expected.append(portion)
+        left -= portion
+
+    eats, portions = specie._portions(fodder, np.arange(num_herbivores))
+    assert list(portions[eats]) == expected
+    assert not portions[~eats].any()
+    assert specie._fodder_left(fodder, num_herbivores) == left
+
+
+def test_standalone_animals_share_population():
+    """
+    Tests that animals created on their own share one population per
+    specie, and keep their attributes when the population is compacted
+    after many of them have moved into a cell.
+    """
+    from biosim.cell import Jungle
+
+    specie = Herbivore.with_parameters()
+    herbivores = [specie(age=2, weight=10 + i) for i in range(300)]
+    assert herbivores[0].population is herbivores[-1].population
+    assert Herbivore(age=2, weight=10).population is not (
+        herbivores[0].population
+    )
+
+    Jungle().insert_animal(herbivores[:250])
+    herbivores.append(specie(age=3, weight=5))
+    standalone = herbivores[250:]
+    assert standalone[0].population.size == len(standalone)
+    assert [animal.weight for animal in standalone] == [
+        10 + i for i in range(250, 300)
+    ] + [5]
+    assert [animal.weight for animal in herbivores[:250]] == [
+        10 + i for i in range(250)
+    ]
+
+
+def test_seeded_standalone_animals():
+    """
+    Tests that standalone animals of a subclass with a seeded generator get
+    the same birth weights for the same seed.
+    """
+    weights = []
+    for _ in range(2):
+        specie = Herbivore.with_parameters(rng=np.random.default_rng(7))
+        weights.append([specie().weight for _ in range(5)])
+    assert weights[0] == weights[1]
+
+
+def test_dropped_standalone_animals_are_released():
+    """
+    Tests that the rows of standalone animals are removed when the animals
+    are garbage-collected, but not those of animals inserted into a cell.
+    """
+    from biosim.cell import Jungle
+
+    specie = Herbivore.with_parameters()
+    for _ in range(1000):
+        specie(age=1, weight=10)
+    population = specie._standalone_population()
+    assert len(population) == 0
+    assert population.size < 100
+
+    cell = Jungle()
+    animal = specie(age=1, weight=10)
+    cell.insert_animal([animal])
+    del animal
+    assert cell.num_animals_per_cell() == 1
@@ -5,6 +5,10 @@ __email__ = "amar@nmbu.no, sebabeck@nmbu.no"
 
 from biosim.cell import Mountain, Ocean, Savannah, Jungle, Desert
 from biosim.animals import Herbivore, Carnivore
+from biosim.compute_fit import calculate_fitness
+from biosim.det_kill import det_kill
+from biosim.draws import UniformDraws
+import numpy as np
 import pytest
 
 
@@ -867,3 +871,121 @@ def test_mating(plain_savannah):
         animal.update_parameters({"gamma": 1})
     plain_savannah.mating()
     assert (len(plain_savannah.animal_classes["Carnivore"])) > 2
+
+
+def test_herbivore_biomass_after_annual_phases(populated_jungle):
+    """
+    Tests that the herbivore biomass kept by the cell equals the sum of the
+    herbivore weights after eating, mating, weight loss and death.
+
+    Parameters
+    ----------
+    populated_jungle: cls
+                    Populated jungle class from fixture
+
+    """
+    populated_jungle.eat_herbivore()
+    populated_jungle.eat_carnivore()
+    populated_jungle.mating()
+    populated_jungle.annual_weight_loss()
+    populated_jungle.annual_death()
+    herb_weights = sum(
+        herb.weight for herb in populated_jungle.animal_classes["Herbivore"]
+    )
+    assert populated_jungle.specie_weight_per_cell(
+        "Herbivore"
+    ) == pytest.approx(herb_weights)
+
+
+def hunt_reference(herbivores, carnivores, uniforms):
+    """
+    Hunt of the carnivores of a cell written with plain loops, 'det_kill'
+    and 'calculate_fitness', taking the random numbers from 'uniforms' in
+    sequence.
+
+    Parameters
+    ----------
+    herbivores: list
+        (fitness, weight) of every herbivore, least fit first
+    carnivores: list
+        (fitness, weight, age) of every carnivore, fittest first
+    uniforms: iterator
+        Uniform random numbers
+
+    Returns
+    -------
+    tuple
+        The weights of the carnivores and the number of herbivores left
+    """
+    param = Carnivore.param
+    weights = []
+    for fitness, weight, age in carnivores:
+        eaten = 0
+        survivors = []
+        for fit_herb, herb_weight in herbivores:
+            if param.F <= eaten or not det_kill(
+                fitness, fit_herb, param.DeltaPhiMax, next(uniforms)
+            ):
+                survivors.append((fit_herb, herb_weight))
+                continue
+            eaten += herb_weight
+            gain = param.beta * herb_weight
+            if next(uniforms) < param.p_sick:
+                gain *= param.loss_rate
+            weight += gain
+            fitness = calculate_fitness(
+                age,
+                param.a_half,
+                param.phi_age,
+                weight,
+                param.w_half,
+                param.phi_weight,
+            )
+        herbivores = survivors
+        weights.append(weight)
+    return weights, len(herbivores)
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 1024])
+def test_eat_carnivore_like_reference(block_size):
+    """
+    Tests that the hunt in the compiled kernel kills the same herbivores and
+    gives the carnivores the same weights as the reference hunt, however the
+    random numbers are split into blocks.
+
+    Parameters
+    ----------
+    block_size: int
+        Number of random numbers drawn at once
+    """
+    rng = np.random.default_rng(7)
+    desert_cell = Desert()
+    desert_cell.insert_animal(
+        [Herbivore(age=age, weight=10) for age in range(30)]
+    )
+    desert_cell.insert_animal(
+        [Carnivore(age=age % 5, weight=20 + age) for age in range(10)]
+    )
+    herbivores = desert_cell.populations["Herbivore"]
+    carnivores = desert_cell.populations["Carnivore"]
+    carnivores.draws = UniformDraws(np.random.default_rng(3), block_size)
+
+    herb_fitness = herbivores.refresh_fitness()
+    herb_order = np.argsort(herb_fitness, kind="stable")
+    carn_fitness = carnivores.refresh_fitness()
+    carn_order = np.argsort(-carn_fitness, kind="stable")
+    weights, num_left = hunt_reference(
+        list(zip(herb_fitness[herb_order], herbivores.weight[herb_order])),
+        list(
+            zip(
+                carn_fitness[carn_order],
+                carnivores.weight[carn_order],
+                carnivores.age[carn_order],
+            )
+        ),
+        iter(np.random.default_rng(3).random(10000)),
+    )
+
+    desert_cell.eat_carnivore()
+    assert len(desert_cell.animal_classes["Herbivore"]) == num_left
+    assert carnivores.weight[carn_order].tolist() == weights
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim.draws import UniformDraws
+import numpy as np
+
+
+def test_rows_drawn_once_per_phase():
+    """
+    Tests that during a phase every row keeps the number drawn for it at the
+    start of the phase.
+    """
+    draws = UniformDraws(np.random.default_rng(1))
+    with draws.phase(10):
+        first = draws.by_rows(np.array([2, 5]))
+        second = draws.by_rows(np.array([5, 2]))
+        assert first[0] == second[1] and first[1] == second[0]
+        assert len(draws.by_rows(np.arange(10))) == 10
+
+
+def test_rows_outside_phase():
+    """
+    Tests that new numbers are drawn for every request outside a phase.
+    """
+    draws = UniformDraws(np.random.default_rng(1))
+    first = draws.by_rows(np.arange(3))
+    second = draws.by_rows(np.arange(3))
+    assert len(first) == 3
+    assert (first != second).all()
+
+
+def test_sequence_matches_generator():
+    """
+    Tests that the numbers handed out in sequence are the numbers of the
+    generator, drawn in blocks.
+    """
+    draws = UniformDraws(np.random.default_rng(3), block_size=4)
+    values = [draws.next() for _ in range(10)]
+    expected = np.random.default_rng(3).random(12)[:10]
+    assert values == expected.tolist()
+    assert all(0 <= value < 1 for value in values)
+
+
+def test_reserve_keeps_sequence():
+    """
+    Tests that numbers taken from a reserved block continue the sequence,
+    that the numbers left are kept in front of the new ones, and that new
+    numbers are drawn in whole blocks.
+    """
+    draws = UniformDraws(np.random.default_rng(3), block_size=4)
+    values = [draws.next() for _ in range(3)]
+    block, position = draws.reserve(6)
+    assert len(block) - position >= 6
+    values.extend(block[position : position + 6].tolist())
+    draws.seek(position + 6)
+    values.append(draws.next())
+    values.extend(draws.take(5).tolist())
+    expected = np.random.default_rng(3).random(17)
+    assert values == expected[:15].tolist()
+    assert draws.rng.random() == expected[16]
+
+
+def test_phase_discards_numbers():
+    """
+    Tests that the numbers left at the end of a phase are discarded, so the
+    next phase starts from the state of the generator.
+    """
+    rng = np.random.default_rng(5)
+    draws = UniformDraws(rng, block_size=8)
+    with draws.phase(3):
+        draws.next()
+    state = rng.bit_generator.state
+    with draws.phase(0):
+        value = draws.next()
+
+    rng.bit_generator.state = state
+    assert value == rng.random(8)[0]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim.ensemble import run_ensemble, iter_ensemble, _iter_replicates
+from biosim.animals import Herbivore
+import numpy as np
+import pytest
+
+ISLAND = "OOOOO\nOJJSO\nOOOOO"
+INI_POP = [
+    {
+        "loc": (1, 1),
+        "pop": [
+            {"species": "Herbivore", "age": 5, "weight": 20}
+            for _ in range(20)
+        ],
+    }
+]
+
+
+def test_run_ensemble_shapes():
+    """
+    Tests that the ensemble gives the number of animals of every replicate
+    for every year, and that replicates with the same seed are equal.
+    """
+    ensemble = run_ensemble(ISLAND, INI_POP, [3, 4, 3], years=6, workers=2)
+    assert list(ensemble["Seed"]) == [3, 4, 3]
+    assert list(ensemble["Year"]) == list(range(7))
+    assert ensemble["Herbivore"].shape == (3, 7)
+    assert list(ensemble["Herbivore"][:, 0]) == [20, 20, 20]
+    assert not ensemble["Carnivore"].any()
+    assert np.array_equal(ensemble["Herbivore"][0], ensemble["Herbivore"][2])
+
+
+def test_parameters_are_isolated():
+    """
+    Tests that the parameters of an ensemble are used by the workers, and
+    leave the parameters of the calling process unchanged.
+    """
+    omega = Herbivore.param["omega"]
+    ensemble = run_ensemble(
+        ISLAND,
+        INI_POP,
+        [1],
+        params={"Herbivore": {"omega": 1e6}},
+        years=1,
+        workers=1,
+    )
+    assert ensemble["Herbivore"][0, 1] == 0
+    assert Herbivore.param["omega"] == omega
+
+
+def test_unknown_parameter_key():
+    """
+    Tests that parameters for unknown species or landscapes are rejected.
+    """
+    with pytest.raises(ValueError):
+        list(iter_ensemble(ISLAND, INI_POP, [1], params={"Fox": {}}))
+
+
+def test_same_seed_keeps_every_replicate():
+    """
+    Tests that every replicate is yielded with its own position, also when
+    seeds are repeated.
+    """
+    replicates = list(_iter_replicates(ISLAND, INI_POP, [5, 5], None, 2, 2))
+    assert sorted(index for index, _, _ in replicates) == [0, 1]
+    assert [seed for _, seed, _ in replicates] == [5, 5]
+
+
+def test_ensemble_without_seeds():
+    """
+    Tests that an ensemble without replicates still has one row per seed
+    and one column per year.
+    """
+    ensemble = run_ensemble(ISLAND, INI_POP, [], years=4)
+    assert ensemble["Herbivore"].shape == (0, 5)
+    assert ensemble["Carnivore"].shape == (0, 5)
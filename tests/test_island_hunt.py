@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim.island_hunt import IslandHuntCycle
+from biosim.map import Map
+from biosim.simulation import BioSim
+import numpy as np
+import pytest
+
+ISLAND = "OOOOOO\nOJJSSO\nOJDJSO\nOSJJMO\nOOOOOO"
+
+
+def populated_island(seed, params=None):
+    """
+    Creates a small island with herbivores and carnivores.
+
+    Parameters
+    ----------
+    seed: int
+        Seed of the map
+    params: dict [default=None]
+        Parameters of the map
+
+    Returns
+    -------
+    Map
+        Map with 40 Herbivores and 10 Carnivores in cell (2, 3)
+    """
+    island = Map(ISLAND, params=params, seed=seed)
+    island.add_animals(
+        [
+            {
+                "loc": (2, 3),
+                "pop": [{"species": "Herbivore", "age": 5, "weight": 20}]
+                * 40
+                + [{"species": "Carnivore", "age": 5, "weight": 20}] * 10,
+            }
+        ]
+    )
+    return island
+
+
+def test_grow_fodder_like_cells():
+    """
+    Tests that the fodder of all cells grows as the fodder of every cell
+    grows on its own, also after the landscape parameters are changed.
+    """
+    island = populated_island(0, params={"S": {"alpha": 0.5}})
+    engine = IslandHuntCycle(island)
+    island.update_param_all_cells("J", {"f_max": 500})
+    fodder = np.arange(island.map.size, dtype=float) * 7
+    for cell, cell_fodder in zip(island.map.flat, fodder):
+        cell.current_fodder = cell_fodder
+        cell.gen_fodder()
+
+    grown = engine.grow_fodder(fodder)
+    assert grown.tolist() == [cell.current_fodder for cell in island.map.flat]
+    assert grown[island.map.size // 2] == 500
+
+
+def test_same_island_as_map_cycle():
+    """
+    Tests that the cycle gives the same island as the cycle of the map,
+    year by year, for the same seed.
+    """
+    reference = populated_island(4)
+    island = populated_island(4)
+    engine = IslandHuntCycle(island)
+    for _ in range(15):
+        reference.cycle()
+        engine.cycle()
+        assert (reference.count_grid() == island.count_grid()).all()
+        for name, population in reference.populations.items():
+            other = island.populations[name]
+            assert population.weight.tolist() == other.weight.tolist()
+        assert [cell.current_fodder for cell in reference.map.flat] == [
+            cell.current_fodder for cell in island.map.flat
+        ]
+
+
+def test_biosim_engine():
+    """
+    Tests that the engine of a simulation can be chosen, and that both
+    engines give the same simulation for the same seed.
+    """
+    ini_pop = [
+        {
+            "loc": (2, 3),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20}] * 20,
+        }
+    ]
+    sims = [
+        BioSim(ISLAND, ini_pop, seed=3, engine=engine)
+        for engine in BioSim.engines
+    ]
+    for sim in sims:
+        sim.simulate(5, vis_years=None)
+    assert sims[0].num_animals == sims[1].num_animals > 0
+
+    with pytest.raises(ValueError):
+        BioSim(ISLAND, ini_pop, seed=3, engine="gpu")
+
+
+def test_cells_share_fodder_with_cycle():
+    """
+    Tests that the cells read the fodder the cycle leaves in the flat
+    array of the map, and that fodder set on a cell is the fodder the next
+    year starts from.
+    """
+    island = populated_island(1)
+    engine = IslandHuntCycle(island)
+    engine.cycle()
+    assert [cell.current_fodder for cell in island.map.flat] == (
+        island.fodder.tolist()
+    )
+
+    savannah = island.map[1, 3]
+    savannah.current_fodder = 0
+    assert island.fodder[savannah._index] == 0
+    engine.cycle()
+    assert savannah.current_fodder <= savannah.param.alpha * (
+        savannah.param.f_max
+    )
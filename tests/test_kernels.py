@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim import kernels
+from biosim.map import Map
+import numpy as np
+import pytest
+
+BACKENDS = kernels.available()
+
+
+@pytest.fixture
+def restore_backend():
+    """
+    Chooses the backend used before the test again after the test.
+    """
+    backend = kernels.backend
+    yield
+    kernels.use(backend)
+
+
+def hunt_inputs(seed):
+    """
+    Creates animals of an island with three cells, sorted for the hunt.
+
+    Parameters
+    ----------
+    seed: int
+        Seed of the animals
+
+    Returns
+    -------
+    list
+        Arguments of 'hunt_island' besides the parameters and the state
+    """
+    rng = np.random.default_rng(seed)
+    carn_ptr = np.array([0, 4, 4, 9], dtype=np.intp)
+    herb_ptr = np.array([0, 10, 15, 15], dtype=np.intp)
+    carn_fitness = np.concatenate(
+        [-np.sort(-rng.random(4)), -np.sort(-rng.random(5))]
+    )
+    herb_fitness = np.concatenate(
+        [np.sort(rng.random(10)) * 0.5, np.sort(rng.random(5)) * 0.5]
+    )
+    return [
+        carn_fitness,
+        rng.uniform(10, 40, 9),
+        rng.integers(0, 15, 9).astype(np.int64),
+        np.zeros(9, dtype=np.uint8),
+        carn_ptr,
+        herb_fitness,
+        rng.uniform(5, 30, 15),
+        np.zeros(15, dtype=np.uint8),
+        herb_ptr,
+    ]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_fitness_and_death_probability(backend):
+    """
+    Tests that every backend gives the same fitness and probability of
+    death as the numpy backend, to the last bit.
+    """
+    reference = kernels.load("numpy")
+    chosen = kernels.load(backend)
+    age = np.arange(8, dtype=np.int64) * 10
+    weight = np.array([0, 0.5, 3, 10, 20, 40, 80, 1e5])
+    expected = np.empty(8)
+    params = (40, 0.2, weight, 10, 0.1)
+    reference["calculate_fitness_array"](age, *params, expected)
+    fitness = np.empty(8)
+    chosen["calculate_fitness_array"](age, *params, fitness)
+    assert fitness.tolist() == expected.tolist()
+    assert fitness[0] == 0
+    assert chosen["calculate_fitness"](10000, 40, 0.2, 10, 10, 0.1) == 0
+    assert chosen["calculate_fitness"](30, 40, 0.2, 10, 10, 0.1) == (
+        expected[3]
+    )
+    assert [
+        reference["calculate_fitness"](a, 40, 0.2, w, 10, 0.1)
+        for a, w in zip(age[1:], weight[1:])
+    ] == expected[1:].tolist()
+
+    fitness = np.array([0, 0.005, 0.01, 0.3, 1])
+    death_prob = np.empty(5)
+    chosen["death_probability"](fitness, 0.4, death_prob)
+    expected = np.empty(5)
+    reference["death_probability"](fitness, 0.4, expected)
+    assert death_prob.tolist() == expected.tolist()
+    assert death_prob == pytest.approx([1, 0, 0, 0.28, 0])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_choices(backend):
+    """
+    Tests that every backend makes the same kills and choices as the numpy
+    backend, also for groups with no probabilities.
+    """
+    reference = kernels.load("numpy")
+    chosen = kernels.load(backend)
+    for fit_carn, fit_herb, uniform in [(0.6, 0.2, 0.99), (0.6, 0.4, 0.1)]:
+        args = (fit_carn, fit_herb, 10, uniform)
+        assert chosen["det_kill"](*args) == reference["det_kill"](*args)
+    assert chosen["weighted_prob"]([0.2, 0.5, 0.3], 0.6) == 1
+
+    cumulative = np.array([0.25, 0.5, 0.75, 1, 0, 0, 0.1, 0.1, 1])
+    ptr = np.array([0, 4, 6, 6, 9], dtype=np.intp)
+    rng = np.random.default_rng(2)
+    groups = rng.integers(0, 4, 50).astype(np.intp)
+    uniforms = rng.random(50)
+    expected = np.empty(50, dtype=np.intp)
+    reference["weighted_choices"](cumulative, ptr, groups, uniforms, expected)
+    choices = np.empty(50, dtype=np.intp)
+    chosen["weighted_choices"](cumulative, ptr, groups, uniforms, choices)
+    assert choices.tolist() == expected.tolist()
+    assert set(choices[groups == 0]) <= {0, 1, 2, 3}
+    assert (choices[(groups == 1) | (groups == 2)] == -1).all()
+    assert 1 not in choices[groups == 3]
+    assert [
+        chosen["weighted_choice"](cumulative, ptr[g], ptr[g + 1], u)
+        for g, u in zip(groups, uniforms)
+    ] == expected.tolist()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("block_size", [1, 3, 1000])
+def test_hunt_island(backend, block_size):
+    """
+    Tests that the hunt of every backend kills the same herbivores as the
+    hunt of the numpy backend, also when it has to be resumed with new
+    random numbers.
+    """
+    params = (50, 10, 0.75, 0.5, 0.3, 40, 0.3, 4, 0.4)
+    results = []
+    for name in ["numpy", backend]:
+        arrays = hunt_inputs(5)
+        uniforms = np.random.default_rng(6).random(block_size * 40)
+        state = (0, 0, 0, 0.0, -1)
+        position = 0
+        while state[0] < 3:
+            position, *state = kernels.load(name)["hunt_island"](
+                *arrays,
+                *params,
+                uniforms[: position - position % block_size + block_size],
+                position,
+                *state,
+            )
+        results.append((arrays, position))
+
+    (expected, expected_position), (arrays, position) = results
+    assert position == expected_position
+    assert arrays[7].sum() > 0
+    for array, expected_array in zip(arrays, expected):
+        assert array.tolist() == expected_array.tolist()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_island_with_every_backend(backend, restore_backend):
+    """
+    Tests that an island simulated with every backend is the same as with
+    the numpy backend, to the last bit of the weights.
+    """
+    weights = []
+    for name in ["numpy", backend]:
+        kernels.use(name)
+        island = Map("OOOO\nOJSO\nOJJO\nOOOO", seed=3)
+        island.add_animals(
+            [
+                {
+                    "loc": (2, 2),
+                    "pop": [{"species": "Herbivore", "age": 5, "weight": 20}]
+                    * 30
+                    + [{"species": "Carnivore", "age": 5, "weight": 20}] * 5,
+                }
+            ]
+        )
+        for _ in range(10):
+            island.cycle()
+        weights.append(
+            [
+                population.weight.tolist()
+                for population in island.populations.values()
+            ]
+        )
+    assert weights[0] == weights[1]
+    assert kernels.backend == backend
+
+
+def test_unknown_backend():
+    """
+    Tests that choosing an unknown backend raises a ValueError, and that
+    the numpy backend is always available.
+    """
+    with pytest.raises(ValueError):
+        kernels.use("fortran")
+    assert "numpy" in BACKENDS
@@ -8,6 +8,7 @@ from biosim.cell import Mountain, Ocean, Savannah, Jungle, Desert
 from biosim.animals import Herbivore, Carnivore
 import pytest
 import textwrap
+import numpy as np
 
 
 @pytest.fixture
@@ -292,19 +293,292 @@ def test_num_animals_per_species(populated_island):
 
 def test_update_params_animals(populated_island):
     island = populated_island
+    default_f = Herbivore.param["F"]
     island.update_animal_params_all_cells("Herbivore", {"F": 15})
-    assert Herbivore.param["F"] == 15
+    assert island.allowed_species["Herbivore"].param["F"] == 15
+    assert island.populations["Herbivore"].species.param.F == 15
+    assert Herbivore.param["F"] == default_f
 
     island.update_animal_params_all_cells("Carnivore", {"DeltaPhiMax": 5})
-    assert Carnivore.param["DeltaPhiMax"] == 5
+    for animal in island.map[(5, 5)].animal_classes["Carnivore"]:
+        assert animal.param["DeltaPhiMax"] == 5
+
+    with pytest.raises(ValueError):
+        island.update_animal_params_all_cells("Herbivore", {"F": -1})
 
 
 def test_update_params_cell(populated_island):
     island = populated_island
+    default_f_max = Jungle.param["f_max"]
     island.update_param_all_cells("J", {"f_max": 500})
-    assert Jungle.param["f_max"] == 500
+    assert island.dict_cells["J"].param["f_max"] == 500
+    assert Jungle.param["f_max"] == default_f_max
+
+    for cell in island.map.flat:
+        cell.gen_fodder()
+        if type(cell).__name__ == "Jungle":
+            assert cell.current_fodder == 500
+
+
+def test_params_per_map():
+    """
+    Tests that maps created with different parameters do not change each
+    other's parameters.
+    """
+    first = Map("OOO\nOJO\nOOO", params={"Herbivore": {"F": 20}})
+    second = Map("OOO\nOJO\nOOO", params={"J": {"f_max": 100}})
+    assert first.allowed_species["Herbivore"].param.F == 20
+    assert second.allowed_species["Herbivore"].param.F == Herbivore.param.F
+    assert first.map[(1, 1)].current_fodder == Jungle.param.f_max
+    assert second.map[(1, 1)].current_fodder == 100
+    with pytest.raises(ValueError):
+        Map("OOO\nOJO\nOOO", params={"Unicorn": {"F": 20}})
 
 
 def test_cycle_runs(populated_island):
     island = populated_island
     island.cycle()
+
+
+def test_neighbour_index(standard_map):
+    """
+    Tests that the neighbour index lists the habitable neighbours of
+    habitable cells only, in the order of 'get_neighbour'.
+
+    Parameters
+    ----------
+    standard_map: str
+                Map string from fixture
+    """
+    island = Map(standard_map)
+    y_lim, x_lim = island.map.shape
+    for index, cell in enumerate(island.map.flat):
+        loc = divmod(index, x_lim)
+        neighbours = [island.map.flat[i] for i in island.neighbours(index)]
+        if type(cell).__name__ in island.allowed_cells:
+            expected = [
+                neighbour
+                for neighbour in island.get_neighbour(loc)
+                if type(neighbour).__name__ in island.allowed_cells
+            ]
+        else:
+            expected = []
+        assert neighbours == expected
+
+    start, stop = island.neighbour_ptr[x_lim + 8 : x_lim + 10]
+    assert list(island.neighbour_indices[start:stop]) == [2 * x_lim + 8]
+    assert list(island.neighbour_directions[start:stop]) == [1]
+
+
+def test_habitable_and_occupied_cells(standard_map, populated_island):
+    """
+    Tests that the habitable cells are all Jungle, Savannah and Desert
+    cells, and that the occupied cells follow the animals as they move and
+    die.
+
+    Parameters
+    ----------
+    standard_map: str
+                Map string from fixture
+    populated_island: Map
+                    Map instance from fixture
+    """
+    island = populated_island
+    habitable = [island.map.flat[index] for index in island.habitable_cells]
+    assert len(habitable) == sum(map(standard_map.count, "JSD"))
+    for cell in habitable:
+        assert type(cell).__name__ in island.allowed_cells
+
+    start = np.ravel_multi_index((5, 5), island.map.shape)
+    assert list(island.occupied_cells()) == [start]
+    assert list(island.occupied_cells("Carnivore")) == [start]
+
+    island.move_all_animals()
+    occupied = island.occupied_cells("Herbivore")
+    assert start in occupied
+    assert len(occupied) > 1
+    assert set(occupied) <= set(island.habitable_cells)
+
+    cell = island.map[(5, 5)]
+    remaining = cell.num_specie_per_cell("Herbivore")
+    cell.remove_multiple_animals("Herbivore", range(remaining))
+    assert start not in island.occupied_cells("Herbivore")
+
+
+def test_count_grid(populated_island):
+    """
+    Tests that the count grid gives the number of animals of every specie
+    in every cell, and follows the animals as they move.
+
+    Parameters
+    ----------
+    populated_island: Map
+                    Map instance from fixture
+    """
+    island = populated_island
+    grid = island.count_grid()
+    assert grid.shape == island.map.shape + (2,)
+    assert list(grid[(5, 5)]) == [150, 150]
+    assert grid.sum() == 300
+
+    island.move_all_animals()
+    grid = island.count_grid()
+    for loc, cell in np.ndenumerate(island.map):
+        assert tuple(grid[loc]) == cell.num_species_per_cell()
+
+
+def test_seeded_maps_are_reproducible(standard_map):
+    """
+    Tests that maps with the same seed give the same result, also when they
+    are simulated side by side in the same process, and that every specie
+    has a random number stream of its own.
+
+    Parameters
+    ----------
+    standard_map: str
+                String of the map from fixture
+    """
+    ini_pop = [
+        {
+            "loc": (5, 5),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20}] * 50
+            + [{"species": "Carnivore", "age": 5, "weight": 20}] * 10,
+        }
+    ]
+    islands = [Map(standard_map, seed=seed) for seed in (7, 7, 8)]
+    for island in islands:
+        island.add_animals(ini_pop)
+    for _ in range(5):
+        for island in islands:
+            island.cycle()
+
+    first, second, other = (island.count_grid() for island in islands)
+    assert (first == second).all()
+    assert (first != other).any()
+
+    species = islands[0].allowed_species
+    assert species["Herbivore"].rng is not species["Carnivore"].rng
+
+
+def test_death_grid(populated_island):
+    """
+    Tests that the deaths counted per cell add up to the animals which
+    died, and that they are counted in the cell the animals lived in.
+
+    Parameters
+    ----------
+    populated_island: Map
+                    Map from fixture
+    """
+    island = populated_island
+    island.allowed_species["Herbivore"].update_parameters({"omega": 1})
+    before = island.count_grid()
+    island.annual_death_all_animals()
+    after = island.count_grid()
+
+    deaths = island.death_grid()
+    assert deaths.shape == before.shape
+    assert (deaths == before - after).all()
+    assert deaths[(5, 5)][0] > 0
+    assert len(island.populations["Herbivore"]) == after[..., 0].sum()
+
+
+def test_mating_batch_places_newborns():
+    """
+    Tests that the batched births put the newborns, aged zero, in the cells
+    of their mothers, that lone animals do not give birth, and that the
+    mothers lose 'xi' times the weight of their child.
+    """
+    island = Map("OOOOO\nOJJJO\nOOOOO", seed=3)
+    island.allowed_species["Herbivore"].update_parameters(
+        {"gamma": 1, "sigma_birth": 0}
+    )
+    island.add_animals(
+        [
+            {
+                "loc": (1, 1),
+                "pop": [{"species": "Herbivore", "age": 5, "weight": 50}] * 4,
+            },
+            {
+                "loc": (1, 3),
+                "pop": [{"species": "Herbivore", "age": 5, "weight": 50}],
+            },
+        ]
+    )
+    island.mate_all_animals()
+
+    herbivores = island.populations["Herbivore"]
+    counts = island.count_grid()[..., 0]
+    assert counts[(1, 3)] == 1
+    assert counts[(1, 1)] > 4
+    newborns = herbivores.age == 0
+    assert (herbivores.cell[newborns] == 6).all()
+    param = island.allowed_species["Herbivore"].param
+    assert (herbivores.weight[newborns] == param.w_birth).all()
+    mothers = herbivores.weight == 50 - param.xi * param.w_birth
+    assert mothers.sum() == newborns.sum()
+
+
+def test_feed_herbivores_like_cells(standard_map):
+    """
+    Tests that feeding the herbivores of the whole map at once gives every
+    herbivore the same portion as feeding cell by cell.
+
+    Parameters
+    ----------
+    standard_map: str
+                String of the map from fixture
+    """
+    ini_pop = [
+        {
+            "loc": loc,
+            "pop": [
+                {"species": "Herbivore", "age": age, "weight": 10 + age}
+                for age in range(num)
+            ],
+        }
+        for loc, num in [((5, 5), 90), ((2, 7), 30), ((10, 10), 3)]
+    ]
+    island_params = {"Herbivore": {"p_sick": 0}}
+    islands = [Map(standard_map, params=island_params) for _ in range(2)]
+    for island in islands:
+        island.add_animals(ini_pop)
+
+    islands[0].feed_herbivores()
+    with islands[1]._batch(draws=True):
+        for index in islands[1].occupied_cells("Herbivore"):
+            islands[1].map.flat[index].eat_herbivore()
+
+    first, second = (island.populations["Herbivore"] for island in islands)
+    assert (first.weight == second.weight).all()
+    for index in range(islands[0].map.size):
+        assert (
+            islands[0].map.flat[index].current_fodder
+            == islands[1].map.flat[index].current_fodder
+        )
+
+
+def test_hunt_draws_only_what_it_uses(standard_map):
+    """
+    Tests that carnivores with nothing to hunt use no random numbers of
+    their specie, since the hunt takes its numbers in sequence only.
+
+    Parameters
+    ----------
+    standard_map: str
+                String of the map from fixture
+    """
+    island = Map(standard_map, seed=2)
+    island.add_animals(
+        [
+            {
+                "loc": (5, 5),
+                "pop": [{"species": "Carnivore", "age": 5, "weight": 20}]
+                * 10,
+            }
+        ]
+    )
+    rng = island.populations["Carnivore"].species.rng
+    state = rng.bit_generator.state
+    island.all_animals_eat()
+    assert rng.bit_generator.state == state
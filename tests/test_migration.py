@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim.map import Map
+from biosim.migration import MigrationTable
+from biosim.weighted_prob import weighted_prob
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def small_island():
+    """
+    Pytest fixture with a small island holding Herbivores and Carnivores
+    in two neighbouring cells.
+
+    Returns
+    -------
+    Map
+        Map instance with animals in cell (1, 1) and (1, 2)
+    """
+    island = Map("OOOOO\nOJSDO\nOJMJO\nOOOOO")
+    island.add_animals(
+        [
+            {"loc": (1, 1), "pop": [{"species": "Herbivore"}] * 5},
+            {"loc": (1, 2), "pop": [{"species": "Herbivore"}] * 3},
+            {"loc": (1, 2), "pop": [{"species": "Carnivore"}] * 2},
+        ]
+    )
+    return island
+
+
+def scalar_probabilities(island, name, loc):
+    """
+    Computes the move probabilities of a cell with the per animal method,
+    for the habitable neighbours of the cell.
+
+    Parameters
+    ----------
+    island: Map
+        The map the cell is part of
+    name: str
+        Name of the specie
+    loc: tuple
+        Location of the cell
+
+    Returns
+    -------
+    list
+        Probability to move to each neighbouring cell
+    """
+    specie = island.allowed_species[name]
+    index = np.ravel_multi_index(loc, island.map.shape)
+    neighbour_cells = [island.map.flat[i] for i in island.neighbours(index)]
+    return specie.compute_move_prob(neighbour_cells)
+
+
+def test_table_matches_scalar_propensity(small_island):
+    """
+    Tests that the vectorized table gives the same probabilities as
+    computing them for a single animal, for every habitable cell.
+
+    Parameters
+    ----------
+    small_island: Map
+                Map from fixture
+    """
+    table = MigrationTable(small_island)
+    for name in small_island.allowed_species:
+        grid = table.grid(name)
+        assert grid.shape == (4, 5, 4)
+        for loc in [(1, 1), (1, 2), (1, 3), (2, 1), (2, 3)]:
+            full_probabilities = small_island.allowed_species[
+                name
+            ].compute_move_prob(small_island.get_neighbour(loc))
+            assert list(grid[loc]) == pytest.approx(full_probabilities)
+        assert not grid[(0, 0)].any()
+        assert not grid[(2, 2)].any()
+
+
+def test_sequential_table_follows_moves(small_island):
+    """
+    Tests that a sequential table gives the probabilities of the island as
+    it is after an animal has moved.
+
+    Parameters
+    ----------
+    small_island: Map
+                Map from fixture
+    """
+    table = MigrationTable(small_island, "sequential")
+    population = small_island.populations["Herbivore"]
+    population.move(population.members(6)[:1], 7)
+    table.moved("Herbivore", 6, 7)
+    for name in small_island.allowed_species:
+        assert table.move_probabilities(name, 6) == pytest.approx(
+            scalar_probabilities(small_island, name, (1, 1))
+        )
+
+
+def test_snapshot_table_ignores_moves(small_island):
+    """
+    Tests that a snapshot table keeps the probabilities from before the
+    migration started.
+
+    Parameters
+    ----------
+    small_island: Map
+                Map from fixture
+    """
+    table = MigrationTable(small_island, "snapshot")
+    before = table.move_probabilities("Herbivore", 6)
+    population = small_island.populations["Herbivore"]
+    population.move(population.members(6)[:1], 7)
+    table.moved("Herbivore", 6, 7)
+    assert table.move_probabilities("Herbivore", 6) == before
+    assert before != scalar_probabilities(small_island, "Herbivore", (1, 1))
+
+
+def test_choose_like_weighted_prob(small_island):
+    """
+    Tests that choosing destinations for many animals at once from the
+    cumulative table gives the same cells as 'weighted_prob' with the
+    probabilities of each cell.
+
+    Parameters
+    ----------
+    small_island: Map
+                Map from fixture
+    """
+    table = MigrationTable(small_island)
+    cells = np.array([6, 7, 8, 11, 13] * 20)
+    uniforms = np.random.default_rng(4).random(len(cells))
+    for name in small_island.allowed_species:
+        choices = table.choose(name, cells, uniforms)
+        expected = [
+            weighted_prob(table.move_probabilities(name, cell), uniform)
+            for cell, uniform in zip(cells, uniforms)
+        ]
+        assert choices.tolist() == expected
+        assert table.choose_one(name, 6, uniforms[0]) == expected[0]
+    assert table.choose("Herbivore", [12], [0.5]).tolist() == [-1]
+    assert not table.can_move("Herbivore", 12)
+
+
+@pytest.mark.parametrize("semantics", MigrationTable.semantics)
+def test_map_migration_semantics(small_island, semantics):
+    """
+    Tests that the animals migrate with both semantics, and stay on
+    habitable cells.
+
+    Parameters
+    ----------
+    small_island: Map
+                Map from fixture
+    semantics: str
+                Migration semantics
+    """
+    small_island.migration = semantics
+    np.random.seed(1)
+    for _ in range(5):
+        small_island.move_all_animals()
+        for population in small_island.populations.values():
+            population.has_migrated[:] = False
+    herbivores = small_island.populations["Herbivore"]
+    assert len(herbivores) == 8
+    assert herbivores.counts.reshape(4, 5)[(2, 2)] == 0
+
+
+def test_staged_moves_use_start_of_migration():
+    """
+    Tests that with snapshot semantics the moves are decided before any
+    animal moves, so every animal moves exactly one step, to a neighbour of
+    the cell it was in, and the flag for migrated animals is not used.
+    """
+    island = Map(
+        "OOOOO\nOJJJO\nOJJJO\nOOOOO",
+        params={"Herbivore": {"mu": 100}},
+        seed=2,
+    )
+    island.add_animals(
+        [
+            {"loc": (1, 1), "pop": [{"species": "Herbivore"}] * 20},
+            {"loc": (1, 2), "pop": [{"species": "Herbivore"}] * 20},
+        ]
+    )
+    herbivores = island.populations["Herbivore"]
+    before = dict(zip(herbivores.ids.tolist(), herbivores.cell.tolist()))
+
+    table = MigrationTable(island)
+    rows, destinations = island.stage_moves("Herbivore", table)
+    assert len(rows) == 40
+    assert (herbivores.cell[rows] != destinations).all()
+
+    island.move_all_animals()
+    assert len(herbivores) == 40
+    for animal_id, cell in zip(herbivores.ids, herbivores.cell):
+        assert cell in island.neighbours(before[animal_id])
+    assert not herbivores.has_migrated.any()
+
+
+def test_unknown_semantics():
+    """
+    Tests that unknown migration semantics raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        Map("OOO\nOJO\nOOO", migration="parallel")
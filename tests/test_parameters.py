@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim.parameters import (
+    AnimalParameters,
+    CarnivoreParameters,
+    LandscapeParameters,
+)
+from biosim.animals import Herbivore, Carnivore
+from biosim.cell import Jungle
+import pytest
+
+
+@pytest.fixture
+def herbivore_params():
+    """
+    Pytest fixture with the default parameters of Herbivore.
+
+    Returns
+    -------
+    AnimalParameters
+        Parameter set with the Herbivore defaults
+    """
+    return AnimalParameters(
+        {
+            "w_birth": 8.0,
+            "sigma_birth": 1.5,
+            "zeta": 3.5,
+            "lambda": 1.0,
+            "eta": 0.05,
+            "DeltaPhiMax": 0,
+        }
+    )
+
+
+def test_attribute_and_item_access(herbivore_params):
+    """
+    Tests that the parameters can be read both as attributes and with their
+    names, and that keywords get an underscore.
+
+    Parameters
+    ----------
+    herbivore_params: AnimalParameters
+                    Parameter set from fixture
+    """
+    assert herbivore_params.w_birth == herbivore_params["w_birth"] == 8.0
+    assert herbivore_params.lambda_ == herbivore_params["lambda"] == 1.0
+    assert len(herbivore_params) == 6
+    assert "lambda_" not in herbivore_params
+
+
+def test_derived_constants(herbivore_params):
+    """
+    Tests that the minimum birth weight is precomputed.
+
+    Parameters
+    ----------
+    herbivore_params: AnimalParameters
+                    Parameter set from fixture
+    """
+    assert herbivore_params.min_birth_weight == 3.5 * (8.0 + 1.5)
+
+
+def test_immutable(herbivore_params):
+    """
+    Tests that a parameter set cannot be changed, and that replacing
+    parameters gives a new set.
+
+    Parameters
+    ----------
+    herbivore_params: AnimalParameters
+                    Parameter set from fixture
+    """
+    with pytest.raises(AttributeError):
+        herbivore_params.w_birth = 10
+    with pytest.raises(TypeError):
+        herbivore_params["w_birth"] = 10
+
+    new_params = herbivore_params.replace({"w_birth": 10.0})
+    assert herbivore_params.w_birth == 8.0
+    assert new_params.w_birth == 10.0
+    assert new_params.min_birth_weight == 3.5 * (10.0 + 1.5)
+    assert isinstance(new_params, AnimalParameters)
+
+
+@pytest.mark.parametrize(
+    "new_params",
+    [{"non_exist": 1}, {"zeta": -1}, {"eta": 2}],
+)
+def test_invalid_animal_parameters(herbivore_params, new_params):
+    """
+    Tests that unknown and invalid parameters raise a ValueError.
+
+    Parameters
+    ----------
+    herbivore_params: AnimalParameters
+                    Parameter set from fixture
+    new_params: dict
+                    Invalid parameter update
+    """
+    with pytest.raises(ValueError):
+        herbivore_params.replace(new_params)
+
+
+def test_delta_phi_max():
+    """
+    Tests that 'DeltaPhiMax' may be negative for species which do not hunt,
+    and must be strictly positive for Carnivores.
+    """
+    AnimalParameters({"DeltaPhiMax": -1})
+    with pytest.raises(ValueError):
+        CarnivoreParameters({"DeltaPhiMax": 0})
+
+
+def test_landscape_parameters():
+    """
+    Tests that landscape parameters must be non-negative.
+    """
+    assert LandscapeParameters({"f_max": 800}).f_max == 800
+    with pytest.raises(ValueError):
+        LandscapeParameters({"f_max": -800})
+
+
+def test_with_parameters_leaves_class_unchanged():
+    """
+    Tests that the parameters of a subclass made for a simulation can be
+    updated without changing the parameters of the class.
+    """
+    herbivore_f = Herbivore.param.F
+    specie = Herbivore.with_parameters({"F": herbivore_f + 5})
+    specie.update_parameters({"zeta": 1.0})
+    assert specie.__name__ == "Herbivore"
+    assert specie.param.F == herbivore_f + 5
+    assert Herbivore.param.F == herbivore_f
+    assert Herbivore.param.zeta != 1.0 or specie.param is not Herbivore.param
+    assert isinstance(specie(), Herbivore)
+    assert Carnivore.with_parameters().param == Carnivore.param
+
+    jungle = Jungle.with_parameters({"f_max": 10})
+    assert jungle().current_fodder == 10
+    assert Jungle().current_fodder == Jungle.param.f_max
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim.population import Population
+from biosim.animals import Herbivore, Carnivore
+from biosim.cell import Jungle
+from biosim.map import Map
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def island_population():
+    """
+    Pytest fixture with a Herbivore population spread over three cells.
+
+    Returns
+    -------
+    Population
+        Population with 2, 0 and 3 animals in cell 0, 1 and 2.
+
+    """
+    population = Population(Herbivore, n_cells=3)
+    population.add(2, [1, 2, 3], [10, 20, 30])
+    population.add(0, [4, 5], [40, 50])
+    population.commit()
+    return population
+
+
+def test_add_animals(island_population):
+    """
+    Tests that added animals are counted per cell, and are grouped by cell
+    when the population is committed.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    assert len(island_population) == 5
+    assert list(island_population.counts) == [2, 0, 3]
+    assert list(island_population.cell) == [0, 0, 2, 2, 2]
+    assert list(island_population.age[island_population.members(2)]) == [
+        1,
+        2,
+        3,
+    ]
+
+
+def test_capacity_grows():
+    """
+    Tests that the columns grow when more animals are added than there is
+    room for.
+
+    """
+    population = Population(Carnivore, capacity=2)
+    population.add(0, np.arange(100), np.ones(100))
+    assert len(population) == 100
+    assert list(population.age) == list(range(100))
+
+
+def test_remove_is_deferred(island_population):
+    """
+    Tests that removed animals are left out of the cell members at once, and
+    deleted from the columns when committing.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    with island_population.batch():
+        island_population.remove([0, 3])
+        assert island_population.size == 5
+        assert list(island_population.members(0)) == [1]
+        assert list(island_population.members(2)) == [2, 4]
+
+    assert island_population.size == 3
+    assert list(island_population.weight) == [50, 10, 30]
+
+
+def test_move_between_cells(island_population):
+    """
+    Tests that moved animals belong to their new cell before the population
+    is committed, and are regrouped afterwards.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    with island_population.batch():
+        island_population.move([2], 1)
+        assert list(island_population.members(1)) == [2]
+        assert list(island_population.members(2)) == [3, 4]
+        assert list(island_population.counts) == [2, 1, 2]
+
+    assert list(island_population.cell) == [0, 0, 1, 2, 2]
+
+
+def test_occupied_cells_follow_changes(island_population):
+    """
+    Tests that the occupied cells are kept by the commit, and follow
+    animals moved and removed before the next commit.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    occupied = island_population.occupied
+    assert list(occupied) == [0, 2]
+    assert island_population.occupied is occupied
+    island_population.move(island_population.members(0), 1)
+    assert list(island_population.occupied) == [1, 2]
+    island_population.remove(island_population.members(2))
+    assert list(island_population.occupied) == [1]
+    island_population.commit()
+    assert list(island_population.occupied) == [1]
+
+
+def test_move_to_several_cells(island_population):
+    """
+    Tests that animals can be moved to different cells in one call, keeping
+    counts, biomass and members up to date.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    with island_population.batch():
+        island_population.move([0, 2, 3], [1, 1, 0])
+        assert list(island_population.members(1)) == [0, 2]
+        assert list(island_population.counts) == [2, 2, 1]
+        assert list(island_population.biomass) == [70, 50, 30]
+
+    assert list(island_population.cell) == [0, 0, 1, 1, 2]
+
+
+def test_move_and_commit(island_population):
+    """
+    Tests that animals moved with an immediate commit are grouped by their
+    new cells at once, without arrivals left to keep track of.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    ids = island_population.ids[[0, 2, 3]].tolist()
+    island_population.move([0, 2, 3], [1, 1, 0], commit=True)
+    assert not island_population._arrivals
+    assert list(island_population.counts) == [2, 2, 1]
+    assert list(island_population.cell) == [0, 0, 1, 1, 2]
+    assert island_population.ids[island_population.members(1)].tolist() == [
+        ids[0],
+        ids[1],
+    ]
+
+
+def test_transfer_keeps_ids(island_population):
+    """
+    Tests that an animal transferred to another population with the same
+    id counter keeps its id and attributes, and that an animal transferred
+    to a population with another counter gets a new id from it.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    other = Population(Herbivore, id_counter=island_population.id_counter)
+    animal_id = island_population.ids[0]
+    new_rows = island_population.transfer([0], other, 0)
+    island_population.commit()
+    assert len(island_population) == 4
+    assert other.ids[new_rows[0]] == animal_id
+    assert other.weight[new_rows[0]] == 40
+
+    separate = Population(Herbivore)
+    separate.add(0, [1, 2], [10, 20])
+    new_rows = island_population.transfer([0, 1], separate, 0)
+    assert list(separate.ids[new_rows]) == [2, 3]
+    assert list(separate.weight[new_rows]) == [50, 10]
+
+
+def test_ids_are_per_map():
+    """
+    Tests that the ids of the animals of a map do not depend on the maps
+    created before it.
+
+    """
+    ids = []
+    for _ in range(2):
+        island = Map("OOOO\nOJSO\nOOOO")
+        island.add_animals(
+            [
+                {
+                    "loc": (1, 1),
+                    "pop": [{"species": "Herbivore"}] * 3
+                    + [{"species": "Carnivore"}] * 2,
+                }
+            ]
+        )
+        ids.append(
+            [list(island.populations[name].ids) for name in island.populations]
+        )
+    assert ids[0] == ids[1] == [[0, 1, 2], [3, 4]]
+
+
+def test_view_follows_commit(island_population):
+    """
+    Tests that an animal view refers to the same animal after the rows have
+    been reordered.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    herb = island_population.views([4])[0]
+    assert herb.weight == 30
+    island_population.remove([0])
+    island_population.commit()
+    assert herb.weight == 30
+    herb.weight = 35
+    assert island_population.weight[herb.row] == 35
+
+
+def test_inserted_animal_is_view():
+    """
+    Tests that inserting an animal into a cell moves it into the cell's
+    population, and that the instance still refers to it.
+
+    """
+    herb = Herbivore(weight=20, age=3)
+    jungle = Jungle()
+    jungle.insert_animal([herb])
+    assert herb.population is jungle.populations["Herbivore"]
+    assert jungle.animal_classes["Herbivore"] == [herb]
+    herb.add_age()
+    assert jungle.animal_classes["Herbivore"][0].age == 4
+
+
+def test_map_cells_share_population():
+    """
+    Tests that all cells of a map store their animals in the same
+    population.
+
+    """
+    island = Map("OOOO\nOJSO\nOOOO")
+    island.add_animals(
+        [
+            {"loc": (1, 1), "pop": [{"species": "Herbivore"}] * 3},
+            {"loc": (1, 2), "pop": [{"species": "Herbivore"}] * 2},
+        ]
+    )
+    population = island.populations["Herbivore"]
+    assert len(population) == 5
+    assert island.map[(1, 1)].populations["Herbivore"] is population
+    assert island.map[(1, 2)].num_animals_per_cell() == 2
+
+
+def test_batched_fitness_is_bit_identical():
+    """
+    Tests that recomputing the fitness for a whole population in one pass
+    gives exactly the same values as the scalar fitness of each animal.
+
+    """
+    population = Population(Carnivore)
+    population.add(0, np.random.randint(0, 100, 5000), np.random.rand(5000))
+    population.add(0, 3, 0.0)
+    population.refresh_fitness()
+    scalar_fitness = [
+        Carnivore._calculate_fitness(weight, age)
+        for weight, age in zip(population.weight, population.age)
+    ]
+    assert not population.stale.any()
+    assert list(population.fitness) == scalar_fitness
+
+
+def test_refresh_only_stale_rows(island_population):
+    """
+    Tests that only animals marked as stale get their fitness recomputed.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    island_population.refresh_fitness()
+    island_population.fitness[:] = -1
+    island_population.stale[[1, 3]] = True
+    island_population.refresh_fitness()
+    assert list(island_population.fitness < 0) == [
+        True,
+        False,
+        True,
+        False,
+        True,
+    ]
+
+
+def test_biomass_follows_changes(island_population):
+    """
+    Tests that the biomass of every cell equals the summed weight of its
+    animals after adding, moving, removing and changing the weight of
+    animals.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    with island_population.batch():
+        island_population.move([0], 1)
+        island_population.remove([2])
+        island_population.set_weight([3, 4], [5, 6])
+        island_population.add(1, 0, 7)
+        assert list(island_population.biomass) == [50, 47, 11]
+
+    assert list(island_population.biomass) == [50, 47, 11]
+    island_population.remove([0])
+    assert island_population.biomass[0] == 0
+
+
+def test_restore_from_arrays(island_population):
+    """
+    Tests that a population restored from packed arrays has the same
+    animals, in the same rows and cells.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+    """
+    island_population.remove([1])
+    arrays = island_population.to_arrays()
+    restored = Population(Herbivore, n_cells=3)
+    restored.restore(arrays)
+    assert len(restored) == 4
+    assert list(restored.ids) == list(arrays["ids"])
+    assert list(restored.weight) == [40, 10, 20, 30]
+    assert list(restored.members(2)) == [1, 2, 3]
+    assert list(restored.biomass) == [40, 0, 60]
+
+
+def test_grow_older(island_population):
+    """
+    Tests that aging and weight loss update age, weight, biomass and fitness
+    in one pass, as the per animal methods would.
+
+    Parameters
+    ----------
+    island_population: Population
+                    Population from fixture
+
+    """
+    island_population.grow_older(0.5)
+    assert list(island_population.age) == [5, 6, 2, 3, 4]
+    assert list(island_population.weight) == [20, 25, 5, 10, 15]
+    assert list(island_population.biomass) == [45, 0, 30]
+    assert not island_population.stale.any()
+    for age, weight, fitness in zip(
+        island_population.age,
+        island_population.weight,
+        island_population.fitness,
+    ):
+        assert fitness == Herbivore._calculate_fitness(weight, age)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim.map import Map
+from biosim.recorder import StatsRecorder
+from biosim.simulation import BioSim
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def small_island():
+    """
+    Pytest fixture with a small island holding Herbivores and Carnivores.
+
+    Returns
+    -------
+    Map
+        Map instance with animals in cell (1, 1)
+    """
+    island = Map("OOOO\nOJSO\nOOOO")
+    island.add_animals(
+        [
+            {
+                "loc": (1, 1),
+                "pop": [
+                    {"species": "Herbivore", "age": age, "weight": 10 + age}
+                    for age in range(10)
+                ],
+            },
+            {"loc": (1, 2), "pop": [{"species": "Carnivore"}] * 2},
+        ]
+    )
+    return island
+
+
+def test_record_statistics(small_island, tmpdir):
+    """
+    Tests that the recorded statistics match the animals on the map.
+
+    Parameters
+    ----------
+    small_island: Map
+                Map from fixture
+    tmpdir: py.path.local
+                Temporary directory from pytest
+    """
+    with StatsRecorder(str(tmpdir), grid_years=2, percentiles=(50,)) as rec:
+        rec.record(0, small_island)
+        rec.record(1, small_island)
+
+    stats = StatsRecorder.load(str(tmpdir))
+    assert list(stats["year"]) == [0, 1]
+    assert list(stats["Herbivore_count"]) == [10, 10]
+    assert stats["Herbivore_age_mean"][0] == 4.5
+    assert stats["Herbivore_weight_percentiles"][0, 0] == 14.5
+    assert stats["Carnivore_count"][0] == 2
+
+    grids = StatsRecorder.load(str(tmpdir), "grids")
+    assert list(grids["year"]) == [0]
+    assert np.array_equal(grids["counts"][0], small_island.count_grid())
+
+
+def test_records_span_chunks(small_island, tmpdir):
+    """
+    Tests that records are spread over several preallocated files, and are
+    read back in order, also after recording again into the same directory.
+
+    Parameters
+    ----------
+    small_island: Map
+                Map from fixture
+    tmpdir: py.path.local
+                Temporary directory from pytest
+    """
+    with StatsRecorder(str(tmpdir), chunk_size=3) as recorder:
+        for year in range(5):
+            recorder.record(year, small_island)
+    assert len(tmpdir.listdir()) == 2
+
+    with StatsRecorder(str(tmpdir), chunk_size=3) as recorder:
+        recorder.record(5, small_island)
+
+    assert list(StatsRecorder.load(str(tmpdir))["year"]) == list(range(6))
+
+
+def test_empty_specie_gives_nan(tmpdir):
+    """
+    Tests that the statistics of a specie without animals are NaN.
+
+    Parameters
+    ----------
+    tmpdir: py.path.local
+                Temporary directory from pytest
+    """
+    with StatsRecorder(str(tmpdir)) as recorder:
+        recorder.record(0, Map("OOO\nOJO\nOOO"))
+    stats = StatsRecorder.load(str(tmpdir))
+    assert stats["Carnivore_count"][0] == 0
+    assert np.isnan(stats["Carnivore_fitness_mean"][0])
+    assert np.isnan(stats["Carnivore_fitness_percentiles"][0]).all()
+
+
+def test_simulate_with_recorder(tmpdir):
+    """
+    Tests that BioSim streams the statistics of every simulated year to
+    the recorder.
+
+    Parameters
+    ----------
+    tmpdir: py.path.local
+                Temporary directory from pytest
+    """
+    sim = BioSim(
+        "OOOO\nOJSO\nOOOO",
+        [{"loc": (1, 1), "pop": [{"species": "Herbivore"}] * 5}],
+        seed=1,
+    )
+    recorder = StatsRecorder(str(tmpdir), grid_years=5)
+    sim.simulate(10, vis_years=None, recorder=recorder)
+    recorder.close()
+
+    stats = StatsRecorder.load(str(tmpdir))
+    assert list(stats["year"]) == list(range(10))
+    assert list(stats["Herbivore_count"]) == list(
+        sim.population_history["Herbivore"]
+    )
+    assert len(StatsRecorder.load(str(tmpdir), "grids")) == 2
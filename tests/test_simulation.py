@@ -7,6 +7,10 @@ import pytest
 from biosim.simulation import BioSim
 import textwrap
 import os
+import json
+import subprocess
+import sys
+import numpy as np
 
 
 @pytest.fixture
@@ -125,3 +129,146 @@ def test_herbs_and_carns_des_sim(desert_sim):
     desert_sim.add_population(ini_herbs)
     desert_sim.add_population(ini_carns)
     desert_sim.simulate(100)
+
+
+def test_import_is_light():
+    """
+    Test that importing the simulation in a new, headless process does not
+    import the graphics and DataFrame libraries, nor numba, which is
+    imported only when the kernels are first used.
+
+    """
+    script = textwrap.dedent(
+        """\
+        import json, sys
+        import biosim.simulation
+        heavy = ["matplotlib", "pandas", "subprocess", "numba"]
+        print(json.dumps([name for name in heavy if name in sys.modules]))
+        """
+    )
+    env = dict(os.environ, MPLBACKEND="Agg")
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    assert json.loads(output) == []
+
+
+def test_headless_simulation(standard_sim):
+    """
+    Test that a headless simulation creates no figure, and records the
+    number of animals for every year.
+
+    """
+    standard_sim.simulate(10, vis_years=None)
+    history = standard_sim.population_history
+    assert standard_sim._fig is None
+    assert list(history["Year"]) == list(range(10))
+    assert history["Herbivore"][0] == 150
+    assert history["Carnivore"][0] == 40
+
+
+def test_render_after_headless(standard_sim, tmpdir):
+    """
+    Test that the images of a headless simulation are made afterwards from
+    the recorded animal distributions.
+
+    """
+    img_base = os.path.join(str(tmpdir), "headless")
+    standard_sim.simulate(10, vis_years=None, img_years=5)
+    assert standard_sim._fig is None
+    standard_sim.render(img_base)
+    assert os.path.isfile(img_base + "_00000.png")
+    assert os.path.isfile(img_base + "_00001.png")
+    assert not os.path.isfile(img_base + "_00002.png")
+
+
+def test_render_draws_population_lines(standard_sim, tmpdir):
+    """
+    Test that the population lines drawn by render hold the recorded
+    number of animals up to the last rendered year, and nothing after it.
+
+    """
+    standard_sim.simulate(10, vis_years=None, img_years=4)
+    history = standard_sim.population_history
+    standard_sim.render(os.path.join(str(tmpdir), "lines"))
+    herbs = standard_sim._herb_line.get_ydata()
+    carns = standard_sim._carn_line.get_ydata()
+    assert list(herbs[:9]) == list(history["Herbivore"][:9])
+    assert list(carns[:9]) == list(history["Carnivore"][:9])
+    assert np.isnan(herbs[9:]).all()
+
+
+def test_render_without_filename(standard_sim):
+    """
+    Test that rendering without a file name raises a RuntimeError.
+
+    """
+    standard_sim.simulate(2, vis_years=None, img_years=1)
+    with pytest.raises(RuntimeError):
+        standard_sim.render()
+
+
+def test_checkpoint_resumes_identically(standard_sim, tmpdir):
+    """
+    Test that a simulation resumed from a checkpoint continues exactly as
+    the original simulation.
+
+    """
+    path = os.path.join(str(tmpdir), "checkpoint")
+    standard_sim.simulate(5, vis_years=None)
+    standard_sim.save_checkpoint(path)
+    standard_sim.simulate(5, vis_years=None)
+
+    resumed = BioSim.from_checkpoint(path)
+    assert resumed.year == 5
+    resumed.simulate(5, vis_years=None)
+
+    assert resumed.year == standard_sim.year
+    assert (
+        resumed.num_animals_per_species == standard_sim.num_animals_per_species
+    )
+    for name, population in standard_sim._map.populations.items():
+        restored = resumed._map.populations[name]
+        assert np.array_equal(restored.weight, population.weight)
+        assert np.array_equal(restored.age, population.age)
+        assert np.array_equal(restored.cell, population.cell)
+    for key, values in standard_sim.population_history.items():
+        assert np.array_equal(resumed.population_history[key], values)
+
+
+def test_checkpoint_keeps_deaths_and_distributions(standard_sim, tmpdir):
+    """
+    Test that a checkpoint keeps the deaths of the last year and the
+    distributions recorded for rendering, and that its arrays can be
+    memory-mapped.
+
+    """
+    path = os.path.join(str(tmpdir), "checkpoint")
+    standard_sim.simulate(6, vis_years=None, img_years=3)
+    standard_sim.save_checkpoint(path)
+    resumed = BioSim.from_checkpoint(path)
+
+    assert standard_sim._map.death_grid().any()
+    assert np.array_equal(
+        resumed._map.death_grid(), standard_sim._map.death_grid()
+    )
+    for key, values in standard_sim.population_history.items():
+        assert np.array_equal(resumed.population_history[key], values)
+    assert len(resumed._recorded_distributions) == 2
+    for saved, restored in zip(
+        standard_sim._recorded_distributions, resumed._recorded_distributions
+    ):
+        assert saved[0] == restored[0]
+        assert np.array_equal(saved[1], restored[1])
+        assert np.array_equal(saved[2], restored[2])
+
+    herbivores = standard_sim._map.populations["Herbivore"]
+    weights = np.load(
+        os.path.join(path, "Herbivore_weight.npy"), mmap_mode="r"
+    )
+    assert isinstance(weights, np.memmap)
+    assert np.array_equal(weights, herbivores.to_arrays()["weight"])
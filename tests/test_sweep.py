@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Amir Arfan, Sebastian Becker"
+__email__ = "amar@nmbu.no, sebabeck@nmbu.no"
+
+from biosim.sweep import ParameterSweep
+import numpy as np
+import pytest
+
+ISLAND = "OOOOO\nOJJSO\nOOOOO"
+INI_POP = [
+    {
+        "loc": (1, 1),
+        "pop": [
+            {"species": "Herbivore", "age": 5, "weight": 20}
+            for _ in range(20)
+        ]
+        + [
+            {"species": "Carnivore", "age": 5, "weight": 20}
+            for _ in range(5)
+        ],
+    }
+]
+
+
+def test_grid_sweep_and_resume(tmpdir):
+    """
+    Tests that a grid sweep fills the result cube, and that running it
+    again only runs the points which are missing.
+
+    Parameters
+    ----------
+    tmpdir: py.path.local
+                Temporary directory from pytest
+    """
+    directory = str(tmpdir.join("grid"))
+    sweep = ParameterSweep.grid(
+        ISLAND,
+        INI_POP,
+        {("Carnivore", "F"): [10, 50], ("J", "f_max"): [800]},
+        seeds=[1, 2],
+        years=3,
+        directory=directory,
+    )
+    cube = sweep.run(workers=2)
+    assert cube.shape == (2, 1, 2, 4, 2)
+    assert (cube >= 0).all()
+    assert (cube[..., 0, :] == [20, 5]).all()
+    finished = np.array(cube)
+
+    cube[1, 0, 1] = -1
+    cube.flush()
+    resumed, description = ParameterSweep.load(directory)
+    assert (resumed[1, 0, 1] == -1).all()
+    assert description["names"] == [["Carnivore", "F"], ["J", "f_max"]]
+
+    assert np.array_equal(sweep.run(workers=1), finished)
+
+
+def test_different_sweep_in_directory(tmpdir):
+    """
+    Tests that a sweep cannot continue in a directory holding the results
+    of another sweep.
+
+    Parameters
+    ----------
+    tmpdir: py.path.local
+                Temporary directory from pytest
+    """
+    directory = str(tmpdir)
+    axes = {("Herbivore", "omega"): [0.4]}
+    ParameterSweep.grid(ISLAND, INI_POP, axes, [1], 1, directory).run(1)
+    other = ParameterSweep.grid(ISLAND, INI_POP, axes, [2], 1, directory)
+    with pytest.raises(ValueError):
+        other.run(1)
+
+
+def test_latin_hypercube_points(tmpdir):
+    """
+    Tests that every parameter of a Latin hypercube sample has exactly one
+    point in every stratum of its range.
+
+    Parameters
+    ----------
+    tmpdir: py.path.local
+                Temporary directory from pytest
+    """
+    sweep = ParameterSweep.latin_hypercube(
+        ISLAND,
+        INI_POP,
+        {("Carnivore", "DeltaPhiMax"): (5, 15), ("S", "f_max"): (0, 500)},
+        num_points=10,
+        seeds=[1],
+        years=2,
+        directory=str(tmpdir),
+        sample_seed=4,
+    )
+    assert sweep.shape == (10, 1, 3, 2)
+    strata = np.floor((sweep.points - [5, 0]) / [1, 50])
+    for column in strata.T:
+        assert sorted(column) == list(range(10))
+
+
+def test_unknown_parameter():
+    """
+    Tests that sweeping a parameter which does not exist is rejected.
+    """
+    with pytest.raises(ValueError):
+        ParameterSweep.grid(
+            ISLAND, INI_POP, {("Carnivore", "speed"): [1]}, [1], 1, "unused"
+        )